@@ -13,9 +13,10 @@ from mycloud.mycloudapi import MyCloudRequestExecutor, ObjectResourceBuilder
 @click.command(name='downsync')
 @click.argument('remote')
 @click.argument('local')
+@click.option('--jobs', nargs=1, required=False, default=1, type=int)
 @authenticated
 @inject.params(executor=MyCloudRequestExecutor)
 @async_click
-async def downsync_command(executor: MyCloudRequestExecutor, remote: str, local: str):
+async def downsync_command(executor: MyCloudRequestExecutor, remote: str, local: str, jobs: int):
     await downsync_folder(executor, ObjectResourceBuilder(
-        local, remote), BasicRemotePath(remote), ProgressTracker())
+        local, remote), BasicRemotePath(remote), ProgressTracker(), jobs=jobs)
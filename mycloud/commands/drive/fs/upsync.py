@@ -4,18 +4,28 @@ import click
 import inject
 
 from mycloud.commands.shared import async_click, authenticated
+from mycloud.constants import PART_CONCURRENCY
 from mycloud.drive.filesync import upsync_folder
 from mycloud.drive.filesync.progress import ProgressTracker
+from mycloud.drive.streamapi import align_part_size
 from mycloud.mycloudapi import MyCloudRequestExecutor, ObjectResourceBuilder
 
 
 @click.command(name='upsync')
 @click.argument('local')
 @click.argument('remote')
+@click.option('--jobs', nargs=1, required=False, default=1, type=int)
+@click.option('--part-jobs', nargs=1, required=False, default=PART_CONCURRENCY, type=int)
+@click.option('--single-pass', required=False, is_flag=True, default=False)
+@click.option('--no-manifest', required=False, is_flag=True, default=False)
+@click.option('--no-journal', required=False, is_flag=True, default=False)
+@click.option('--part-size', nargs=1, required=False, default=None, type=int)
 @authenticated
 @inject.params(executor=MyCloudRequestExecutor)
 @async_click
-async def upsync_command(executor: MyCloudRequestExecutor, local: str, remote: str):
+async def upsync_command(executor: MyCloudRequestExecutor, local: str, remote: str, jobs: int, part_jobs: int, single_pass: bool, no_manifest: bool, no_journal: bool, part_size: int):
     resource_builder = ObjectResourceBuilder(local, remote)
     local = os.path.abspath(local)
-    await upsync_folder(executor, resource_builder, local, ProgressTracker())
+    await upsync_folder(executor, resource_builder, local, ProgressTracker(),
+                        jobs=jobs, part_jobs=part_jobs, single_pass=single_pass, use_manifest=not no_manifest, use_journal=not no_journal,
+                        part_size=None if part_size is None else align_part_size(part_size))
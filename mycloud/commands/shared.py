@@ -32,5 +32,9 @@ def async_click(func):
     def wrapper(*args, **kwargs):
         loop = asyncio.get_event_loop()
         logging.debug('Running asynchronous click action...')
-        return loop.run_until_complete(func(*args, **kwargs))
+        try:
+            return loop.run_until_complete(func(*args, **kwargs))
+        finally:
+            request_executor = inject.instance(MyCloudRequestExecutor)
+            loop.run_until_complete(request_executor.close())
     return update_wrapper(wrapper, func)
@@ -1,9 +1,14 @@
 from mycloud.common.abstract_static import abstractstatic
+from mycloud.common.byte_pipe import BytePipe
+from mycloud.common.concurrency import (ByteSemaphore, raise_failed,
+                                        run_concurrently)
 from mycloud.common.exceptions import MyCloudException
 from mycloud.common.functions import get_string_generator
 from mycloud.common.operation_timeout import (TimeoutException,
                                               operation_timeout)
-from mycloud.common.sha256_file import sha256_file
+from mycloud.common.sha256_file import (cached_sha256_file, get_hash_cache,
+                                        remember_sha256_file, set_hash_cache,
+                                        sha256_file)
 from mycloud.common.urls import merge_url_query_params
 from mycloud.common.generator import to_generator
 from mycloud.common.time import parse_datetime, to_unix
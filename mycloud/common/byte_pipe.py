@@ -0,0 +1,106 @@
+import asyncio
+import threading
+
+from mycloud.constants import PIPE_BUFFER_SIZE
+
+
+class BytePipe:
+
+    def __init__(self, capacity: int = PIPE_BUFFER_SIZE):
+        if capacity <= 0:
+            raise ValueError('Pipe capacity must be positive')
+        self._capacity = capacity
+        self._buffer = bytearray()
+        self._closed = False
+        self._error = None
+        self._condition = threading.Condition()
+        self._async_waiters = []
+
+    def put(self, data: bytes):
+        with self._condition:
+            self._condition.wait_for(lambda: self._can_put(data))
+            self._put_locked(data)
+
+    async def put_async(self, data: bytes):
+        while True:
+            with self._condition:
+                if self._can_put(data):
+                    self._put_locked(data)
+                    return
+                waiter = self._add_async_waiter()
+            await waiter
+
+    def get(self, max_length: int) -> bytes:
+        with self._condition:
+            self._condition.wait_for(self._can_get)
+            return self._get_locked(max_length)
+
+    async def get_async(self, max_length: int) -> bytes:
+        while True:
+            with self._condition:
+                if self._can_get():
+                    return self._get_locked(max_length)
+                waiter = self._add_async_waiter()
+            await waiter
+
+    def read(self, length: int = -1) -> bytes:
+        # file-like read: only returns less than requested at the end
+        chunks = []
+        while length < 0 or length > 0:
+            data = self.get(length if length > 0 else self._capacity)
+            if not data:
+                break
+            chunks.append(data)
+            if length > 0:
+                length -= len(data)
+        return b''.join(chunks)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._notify_locked()
+
+    def abort(self, error: BaseException):
+        with self._condition:
+            self._error = error
+            self._notify_locked()
+
+    def _can_put(self, data: bytes):
+        if self._error is not None:
+            raise self._error
+        if self._closed:
+            raise ValueError('Cannot write to a closed pipe')
+        # a chunk larger than the whole buffer is accepted once it's empty
+        return not self._buffer or len(self._buffer) + len(data) <= self._capacity
+
+    def _can_get(self):
+        if self._error is not None:
+            raise self._error
+        return bool(self._buffer) or self._closed
+
+    def _put_locked(self, data: bytes):
+        self._buffer += data
+        self._notify_locked()
+
+    def _get_locked(self, max_length: int):
+        data = bytes(self._buffer[:max_length])
+        del self._buffer[:max_length]
+        self._notify_locked()
+        return data
+
+    def _add_async_waiter(self):
+        loop = asyncio.get_event_loop()
+        waiter = loop.create_future()
+        self._async_waiters.append((loop, waiter))
+        return waiter
+
+    def _notify_locked(self):
+        self._condition.notify_all()
+        for loop, waiter in self._async_waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+        self._async_waiters = []
+
+
+def _wake(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
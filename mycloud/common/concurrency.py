@@ -0,0 +1,77 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterable, Awaitable, Callable
+
+_END_OF_ITEMS = object()
+
+
+class ByteSemaphore:
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError('Byte capacity must be positive')
+        self._capacity = capacity
+        self._available = capacity
+        self._condition = asyncio.Condition()
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    async def acquire(self, amount: int) -> int:
+        # a single item larger than the whole budget may still run, alone
+        amount = min(max(amount, 0), self._capacity)
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._available >= amount)
+            self._available -= amount
+        return amount
+
+    async def release(self, amount: int):
+        async with self._condition:
+            self._available += amount
+            self._condition.notify_all()
+
+    @asynccontextmanager
+    async def hold(self, amount: int):
+        acquired = await self.acquire(amount)
+        try:
+            yield acquired
+        finally:
+            await self.release(acquired)
+
+
+async def run_concurrently(items: AsyncIterable,
+                           worker: Callable[[object], Awaitable],
+                           jobs: int):
+    if jobs < 1:
+        raise ValueError('At least one job is required')
+
+    queue = asyncio.Queue(maxsize=jobs * 2)
+
+    async def produce():
+        async for item in items:
+            await queue.put(item)
+        for _ in range(jobs):
+            await queue.put(_END_OF_ITEMS)
+
+    async def consume():
+        while True:
+            item = await queue.get()
+            if item is _END_OF_ITEMS:
+                return
+            await worker(item)
+
+    tasks = [asyncio.ensure_future(produce())] + \
+        [asyncio.ensure_future(consume()) for _ in range(jobs)]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+def raise_failed(tasks):
+    for task in tasks:
+        if task.done() and not task.cancelled() and task.exception() is not None:
+            raise task.exception()
@@ -0,0 +1,13 @@
+import sqlite3
+
+from mycloud.constants import DATABASE_BUSY_TIMEOUT
+
+
+def connect_database(location: str) -> sqlite3.Connection:
+    # several upsync processes may share the same database file, WAL lets
+    # readers continue while another process writes
+    connection = sqlite3.connect(
+        location, timeout=DATABASE_BUSY_TIMEOUT, check_same_thread=False)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    return connection
@@ -0,0 +1,62 @@
+import os
+import threading
+import time
+
+from mycloud.common.database import connect_database
+from mycloud.constants import HASH_CACHE_LOCATION, HASH_CACHE_MAX_AGE
+
+
+class HashCache:
+
+    def __init__(self, location: str = HASH_CACHE_LOCATION, max_age: float = HASH_CACHE_MAX_AGE):
+        self._location = location
+        self._max_age = max_age
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def get(self, path: str, stats: os.stat_result):
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(
+                'SELECT digest FROM hashes WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ?',
+                (path, stats.st_size, stats.st_mtime_ns, stats.st_ino)).fetchone()
+            if row is None:
+                return None
+            with connection:
+                connection.execute('UPDATE hashes SET last_used = ? WHERE path = ?',
+                                   (time.time(), path))
+            return row[0]
+
+    def put(self, path: str, stats: os.stat_result, digest: str):
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                # one row per path, a changed file replaces its old entry
+                connection.execute(
+                    'INSERT OR REPLACE INTO hashes (path, size, mtime_ns, inode, digest, last_used) VALUES (?, ?, ?, ?, ?, ?)',
+                    (path, stats.st_size, stats.st_mtime_ns, stats.st_ino, digest, time.time()))
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            connection = connect_database(self._location)
+            with connection:
+                connection.execute('''
+                    CREATE TABLE IF NOT EXISTS hashes (
+                        path TEXT PRIMARY KEY,
+                        size INTEGER NOT NULL,
+                        mtime_ns INTEGER NOT NULL,
+                        inode INTEGER NOT NULL,
+                        digest TEXT NOT NULL,
+                        last_used REAL NOT NULL)''')
+                # entries of files that weren't hashed for a long time are
+                # most likely gone, drop them once per process
+                connection.execute('DELETE FROM hashes WHERE last_used < ?',
+                                   (time.time() - self._max_age,))
+            self._connection = connection
+        return self._connection
@@ -1,6 +1,10 @@
+import concurrent.futures
 import threading
 
-from mycloud.constants import MAX_TIMEOUT
+from mycloud.constants import IO_WORKER_COUNT, MAX_TIMEOUT
+
+_io_executor = None
+_io_executor_lock = threading.Lock()
 
 
 class TimeoutException(Exception):
@@ -13,18 +17,37 @@ def operation_timeout(operation, **kwargs):
 
 
 def _operation_timeout(operation, timeout, values):
-    class FuncThread(threading.Thread):
+    io_executor = _get_io_executor()
+    future = io_executor.submit(operation, values)
+    try:
+        result = future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        if not future.cancel():
+            # the worker stays blocked on the stuck operation, later
+            # operations get a pool of their own
+            _replace_io_executor(io_executor)
+        raise TimeoutException
+    except Exception as ex:
+        # failed operations are reported like stuck ones, as they always were
+        raise TimeoutException from ex
+    if result is None:
+        raise TimeoutException
+    return result
 
-        def __init__(self):
-            super().__init__()
-            self.result = None
 
-        def run(self):
-            self.result = operation(values)
+def _get_io_executor():
+    global _io_executor
+    with _io_executor_lock:
+        if _io_executor is None:
+            _io_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=IO_WORKER_COUNT, thread_name_prefix='mycloud-io')
+        return _io_executor
 
-    func_thread = FuncThread()
-    func_thread.start()
-    func_thread.join(timeout)
-    if func_thread.is_alive() or func_thread.result is None:
-        raise TimeoutException
-    return func_thread.result
+
+def _replace_io_executor(stuck_executor: concurrent.futures.ThreadPoolExecutor):
+    global _io_executor
+    with _io_executor_lock:
+        if _io_executor is stuck_executor:
+            _io_executor = None
+    # idle workers exit, the stuck one once its operation returns
+    stuck_executor.shutdown(wait=False)
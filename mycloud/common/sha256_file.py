@@ -3,32 +3,49 @@ import logging
 import os
 
 from mycloud.common import operation_timeout
+from mycloud.common.hash_cache import HashCache
 from mycloud.constants import CHUNK_SIZE
 
 CACHED_HASHES = {}
+PRINT_EVERY = max(1, 64 * 1024 * 1024 // CHUNK_SIZE)
+
+_persistent_hashes = None
+
+
+def get_hash_cache() -> HashCache:
+    # resolved on use, so the location can be replaced before any hashing
+    global _persistent_hashes
+    if _persistent_hashes is None:
+        _persistent_hashes = HashCache()
+    return _persistent_hashes
+
+
+def set_hash_cache(cache: HashCache):
+    global _persistent_hashes
+    _persistent_hashes = cache
 
 
 def sha256_file(local_file: str):
     def read_file(params):
         return params['file'].read(params['length'])
+    local_file = os.path.abspath(local_file)
+    stats = operation_timeout(lambda x: os.stat(x['file']), file=local_file)
+    cached = _get_cached_hash(local_file, stats)
+    if cached is not None:
+        return cached
     sha = hashlib.sha256()
-    time = operation_timeout(lambda x: os.path.getmtime(
-        x['file']), file=local_file)
-    if local_file in CACHED_HASHES and CACHED_HASHES[local_file]['time'] >= time:
-        return CACHED_HASHES[local_file]['hash']
     stream = operation_timeout(lambda x: open(
         x['file'], 'rb'), file=local_file)
     file_buffer = operation_timeout(
         read_file, file=stream, length=CHUNK_SIZE)
     read_length = 0
-    file_size = operation_timeout(
-        lambda x: os.stat(x['file']).st_size, file=local_file)
+    file_size = stats.st_size
     percentage = None
-    while any(file_buffer):
+    while file_buffer:
         sha.update(file_buffer)
         file_buffer = operation_timeout(
             read_file, file=stream, length=CHUNK_SIZE)
-        if (read_length / CHUNK_SIZE) % 1000 == 0:
+        if (read_length // CHUNK_SIZE) % PRINT_EVERY == 0:
             percentage = '{0:.2f}'.format((read_length / file_size) * 100)
             print('Hashing file {}: {}% complete...'.format(
                 local_file, percentage), end='\r')
@@ -37,8 +54,38 @@ def sha256_file(local_file: str):
         local_file, percentage), end='\n')
     stream.close()
     digested = sha.hexdigest()
+    remember_sha256_file(local_file, stats, digested)
+    return digested
+
+
+def cached_sha256_file(local_file: str):
+    local_file = os.path.abspath(local_file)
+    stats = operation_timeout(lambda x: os.stat(x['file']), file=local_file)
+    return _get_cached_hash(local_file, stats)
+
+
+def remember_sha256_file(local_file: str, stats: os.stat_result, digested: str):
+    local_file = os.path.abspath(local_file)
     CACHED_HASHES[local_file] = {
         'hash': digested,
-        'time': time
+        'stats': stats
     }
+    get_hash_cache().put(local_file, stats, digested)
+
+
+def _get_cached_hash(local_file: str, stats: os.stat_result):
+    if local_file in CACHED_HASHES and _same_file_state(CACHED_HASHES[local_file]['stats'], stats):
+        return CACHED_HASHES[local_file]['hash']
+    digested = get_hash_cache().get(local_file, stats)
+    if digested is not None:
+        logging.debug(f'Using persisted hash of {local_file}')
+        CACHED_HASHES[local_file] = {
+            'hash': digested,
+            'stats': stats
+        }
     return digested
+
+
+def _same_file_state(left: os.stat_result, right: os.stat_result):
+    return (left.st_size, left.st_mtime_ns, left.st_ino) == \
+        (right.st_size, right.st_mtime_ns, right.st_ino)
@@ -2,6 +2,21 @@ import os
 
 import appdirs
 
+AES_BLOCK_SIZE = 16
+# plaintext size of the independently authenticated records of AES-GCM parts
+GCM_RECORD_SIZE = 64 * 1024
+GCM_WORKER_COUNT = os.cpu_count() or 1
+DEFAULT_CIPHER = 'cbc'
+
+
+def _get_block_size_setting(variable: str, default: int) -> int:
+    value = int(os.getenv(variable, default))
+    if value <= 0 or value % AES_BLOCK_SIZE != 0:
+        raise ValueError(
+            f'{variable} must be a positive multiple of {AES_BLOCK_SIZE}')
+    return value
+
+
 DATA_DIR = appdirs.user_data_dir('mycloud')
 TOKEN_DIR = os.path.join(DATA_DIR, 'tokens')
 
@@ -9,12 +24,25 @@ if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
 
 SERVICE_NAME = 'myCloud'
+# part size of versions that don't record a chunk_size, and the largest
+# part written
 MY_CLOUD_BIG_FILE_CHUNK_SIZE = 1024 * 1024 * 1024
-CHUNK_SIZE = 1024
+MIN_PART_SIZE = 16 * 1024 * 1024
+# transfer time a failed part may cost at the measured bandwidth
+PART_TARGET_DURATION = 60
+# CHUNK_SIZE is the block size of local reads and stream transforms,
+# NETWORK_CHUNK_SIZE the size requested from response bodies
+CHUNK_SIZE = _get_block_size_setting('MYCLOUD_CHUNK_SIZE', 4 * 1024 * 1024)
+NETWORK_CHUNK_SIZE = _get_block_size_setting(
+    'MYCLOUD_NETWORK_CHUNK_SIZE', 1024 * 1024)
+# bytes buffered between a writer thread and an upload running on a loop
+PIPE_BUFFER_SIZE = _get_block_size_setting(
+    'MYCLOUD_PIPE_BUFFER_SIZE', 16 * 1024 * 1024)
 BASE_DIR = '/Drive/'
 PARTIAL_EXTENSION = '.partial'
+DOWNLOAD_PROGRESS_EXTENSION = '.mycloud-progress'
 START_NUMBER_LENGTH = 8
-RETRY_COUNT = 3
+RETRY_COUNT = 5
 SAVE_FREQUENCY = 10
 USE_TOKEN_CACHE = True
 TOKEN_CACHE_FOLDER = TOKEN_DIR
@@ -22,12 +50,50 @@ TOKEN_CACHE_FOLDER = TOKEN_DIR
 AUTHENTICATION_INFO_LOCATION = os.path.join(DATA_DIR, 'auth.json')
 
 WEBDAV_CONFIG_LOCATION = os.path.join(DATA_DIR, 'webdav.json')
+WEBDAV_METADATA_CACHE_SIZE = 10000
+WEBDAV_METADATA_CACHE_TTL = 30
+WEBDAV_METADATA_CACHE_STALE_TTL = 300
+WEBDAV_METADATA_CACHE_NEGATIVE_TTL = 5
+
+HASH_CACHE_LOCATION = os.path.join(DATA_DIR, 'hashes.sqlite')
+HASH_CACHE_MAX_AGE = 30 * 24 * 60 * 60
+DATABASE_BUSY_TIMEOUT = 60
+UPLOAD_MANIFEST_LOCATION = os.path.join(DATA_DIR, 'manifest.sqlite')
+UPLOAD_MANIFEST_REVALIDATE_AFTER = 7 * 24 * 60 * 60
+UPLOAD_JOURNAL_LOCATION = os.path.join(DATA_DIR, 'journal.sqlite')
 
 VERSION_HASH_LENGTH = 10
+STAGING_VERSION_PREFIX = 'staging-'
 METADATA_FILE_NAME = 'mycloud_metadata.json'
 CACHED_TOKEN_IDENTIFIER = 'CACHED'
 WAIT_TIME_MULTIPLIER = 1.1
 MAX_TIMEOUT = 15
+IO_WORKER_COUNT = 16
+
+PART_CONCURRENCY = 4
+TREE_WALK_CONCURRENCY = 8
+COPY_CONCURRENCY = 8
+DELETE_CONCURRENCY = 16
+DELETE_PROGRESS_INTERVAL = 1000
+UPSYNC_MAX_INFLIGHT_BYTES = 512 * 1024 * 1024
+
+HTTP_CONNECTION_LIMIT = 100
+HTTP_CONNECTION_LIMIT_PER_HOST = 32
+HTTP_DNS_CACHE_TTL = 300
+HTTP_KEEPALIVE_TIMEOUT = 60
+# in-flight request limits, adjusted to the observed latency and throttling
+METADATA_CONCURRENCY_INITIAL = 16
+METADATA_CONCURRENCY_MAX = 64
+DATA_CONCURRENCY_INITIAL = 8
+DATA_CONCURRENCY_MAX = HTTP_CONNECTION_LIMIT_PER_HOST
+CONCURRENCY_DECREASE_FACTOR = 0.7
+CONCURRENCY_LATENCY_TOLERANCE = 2.0
+# 500 is left out, the storage also answers permanent failures with it
+RETRYABLE_STATUS_CODES = (429, 502, 503, 504)
+RETRY_MAX_DELAY = 60
+# every retry spends a token, every successful request earns part of one
+RETRY_BUDGET_SIZE = 100
+RETRY_BUDGET_REFILL = 0.1
 
 REPLACEMENT_TABLE = [
     {
@@ -2,3 +2,4 @@ from mycloud.drive.drive_client import DriveClient, NO_ENTRY, ROOT_ENTRY, EntryS
 from mycloud.drive.exceptions import DriveNotFoundException, DriveFailedToDeleteException
 from mycloud.drive.fs_drive_client import FsDriveClient
 from mycloud.drive.common import ls_files_recursively
+from mycloud.drive.tree_walker import TreeWalker
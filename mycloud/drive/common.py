@@ -1,14 +1,15 @@
 from typing import AsyncIterator
+from mycloud.constants import TREE_WALK_CONCURRENCY
 from mycloud.drive.drive_client import DriveClient
+from mycloud.drive.tree_walker import TreeWalker
 from mycloud.mycloudapi.requests.drive import FileEntry
 
 
 # methods / helpers, that are not relevant for the core DriveClient, but depend on it
 
-async def ls_files_recursively(client: DriveClient, remote: str) -> AsyncIterator[FileEntry]:
-    metadata = await client.ls(remote)
-    for file in metadata.files:
-        yield file
-    for directory in metadata.dirs:
-        async for item in ls_files_recursively(client, remote):
+async def ls_files_recursively(client: DriveClient, remote: str, jobs: int = TREE_WALK_CONCURRENCY) -> AsyncIterator[FileEntry]:
+    walker = TreeWalker(client.ls_or_none, jobs)
+    async for item in walker.walk(remote):
+        if isinstance(item, FileEntry):
             yield item
+
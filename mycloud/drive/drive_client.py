@@ -1,20 +1,26 @@
+import io
 import logging
 import asyncio
 import os
 import inject
 from enum import Enum
-from typing import List, AsyncIterator
+from typing import List, AsyncIterator, Tuple
 from datetime import datetime
 from collections import deque
-from threading import Thread
-from dataclasses import dataclass
-from mycloud.constants import CHUNK_SIZE
-from mycloud.mycloudapi.helper import generator_to_stream
+from dataclasses import dataclass, field
+from itertools import groupby
+from mycloud.common import BytePipe, run_concurrently
+from mycloud.constants import (COPY_CONCURRENCY, DELETE_CONCURRENCY,
+                               DELETE_PROGRESS_INTERVAL, NETWORK_CHUNK_SIZE,
+                               PIPE_BUFFER_SIZE, RETRY_COUNT,
+                               WAIT_TIME_MULTIPLIER)
+from mycloud.drive.tree_walker import TreeWalker
 from mycloud.drive.exceptions import (DriveFailedToDeleteException,
                                       DriveNotFoundException)
 from mycloud.mycloudapi import (MyCloudRequestExecutor, MyCloudResponse,
                                 ObjectResourceBuilder)
-from mycloud.mycloudapi.requests.drive import (DeleteObjectRequest,
+from mycloud.mycloudapi.requests.drive import (CopyRequest,
+                                               DeleteObjectRequest,
                                                GetObjectRequest,
                                                MetadataRequest,
                                                PutObjectRequest,
@@ -26,8 +32,9 @@ from mycloud.mycloudapi.requests.drive import (DeleteObjectRequest,
 
 class ReadStream:
 
-    def __init__(self, content):
-        self._content = content
+    def __init__(self, response: MyCloudResponse):
+        self._response = response
+        self._content = response.result.content
         self._loop = asyncio.get_event_loop()
 
     def read(self, length):
@@ -39,60 +46,162 @@ class ReadStream:
         return await self._content.read(length)
 
     def close(self):
-        pass
+        self._loop.call_soon_threadsafe(self._finish)
+
+    def _finish(self):
+        # a body that wasn't read to its end can't be reused
+        if self._content.at_eof():
+            self._response.release()
+        else:
+            self._response.close()
+
+
+class RangedReadStream:
+
+    def __init__(self, request_executor: MyCloudRequestExecutor, segments: List[Tuple[str, int]]):
+        self._request_executor = request_executor
+        self._segments = segments
+        self._length = sum(length for _, length in segments)
+        self._position = 0
+        self._response = None
+        self._segment_remaining = 0
+        self._loop = asyncio.get_event_loop()
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._length
+        if offset < 0:
+            raise ValueError('Cannot seek before the start of the stream')
+        if offset != self._position:
+            self._run_sync(self._close_response())
+            self._position = offset
+        return self._position
+
+    def read(self, length=-1):
+        return self._run_sync(self.read_async(length))
+
+    async def read_async(self, length=-1):
+        if length is None or length < 0:
+            length = self._length - self._position
+        chunks = []
+        while length > 0 and self._position < self._length:
+            if self._response is None:
+                await self._open_at(self._position)
+            data = await self._response.result.content.read(min(length, self._segment_remaining))
+            if not data:
+                raise IOError('Object ended before its expected length')
+            chunks.append(data)
+            self._position += len(data)
+            self._segment_remaining -= len(data)
+            length -= len(data)
+            if self._segment_remaining == 0:
+                await self._close_response()
+        return b''.join(chunks)
+
+    def close(self):
+        self._run_sync(self._close_response())
+
+    async def _open_at(self, position: int):
+        start = 0
+        for path, length in self._segments:
+            if position < start + length:
+                offset = position - start
+                break
+            start += length
+        get = GetObjectRequest(path, is_dir=False,
+                               byte_range=(offset, length - 1))
+        resp = await self._request_executor.execute(get)
+        DriveClient._raise_404(resp)
+        if resp.result.status != 206:
+            # the range was ignored, skip to the requested offset
+            skipped = 0
+            while skipped < offset:
+                data = await resp.result.content.read(min(NETWORK_CHUNK_SIZE, offset - skipped))
+                if not data:
+                    raise IOError('Object ended before the requested offset')
+                skipped += len(data)
+        self._response = resp
+        self._segment_remaining = length - offset
+
+    async def _close_response(self):
+        if self._response is None:
+            return
+        if self._segment_remaining > 0:
+            # the rest of the body isn't needed, don't reuse the connection
+            self._response.close()
+        else:
+            self._response.release()
+        self._response = None
+
+    def _run_sync(self, task):
+        return asyncio.run_coroutine_threadsafe(task, self._loop).result()
 
 
 class WriteStream:
 
-    def __init__(self, exec_stream):
+    def __init__(self, exec_stream, buffer_size: int = PIPE_BUFFER_SIZE):
         self._loop = asyncio.get_event_loop()
         self._exec = exec_stream
-        # TODO: queue size should depend on size of individual items?
-        self._queue = asyncio.Queue(maxsize=1)
-        self._closed = False
-        self._thread = None
+        self._pipe = BytePipe(buffer_size)
+        self._upload = None
 
     def writelines(self, generator):
-        stream = generator_to_stream(generator)
-        asyncio.run_coroutine_threadsafe(
-            self._exec(stream), self._loop).result()
+        try:
+            for data in generator:
+                self.write(data)
+        except BaseException as ex:
+            self._pipe.abort(ex)
+            raise
 
     def write(self, bytes):
-        self._put_queue(bytes)
         self._start()
+        self._pipe.put(bytes)
 
     async def write_async(self, bytes):
-        await self._put_queue_async(bytes)
         self._start()
+        await self._pipe.put_async(bytes)
 
     def close(self):
-        self._closed = True
-        if self._thread:
-            self._thread.join()
-        del self._queue
-
-    async def _put_queue_async(self, item):
-        await self._queue.put(item)
+        self._start()
+        self._pipe.close()
+        self._upload.result()
 
-    def _put_queue(self, item):
-        asyncio.run_coroutine_threadsafe(
-            self._queue.put(item), self._loop).result()
+    async def close_async(self):
+        self._start()
+        self._pipe.close()
+        await asyncio.wrap_future(self._upload)
 
     def _start(self):
-        if self._thread is not None:
+        if self._upload is not None:
             return
 
-        def r():
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(self._exec(self._generator()))
-        self._thread = Thread(target=r)
-        self._thread.start()
+        # the upload always runs on the loop the stream was opened on, no
+        # matter which thread writes to it
+        self._upload = asyncio.run_coroutine_threadsafe(
+            self._exec(self._generator()), self._loop)
+        self._upload.add_done_callback(self._upload_done)
+
+    def _upload_done(self, upload):
+        if upload.cancelled():
+            self._pipe.abort(asyncio.CancelledError())
+        elif upload.exception() is not None:
+            # unblocks writers waiting for buffer space
+            self._pipe.abort(upload.exception())
 
     async def _generator(self):
-        while not self._closed or not self._queue.empty():
-            if not self._queue.empty():  # TODO: should be done with asyncio
-                yield self._queue.get_nowait()
+        while True:
+            data = await self._pipe.get_async(NETWORK_CHUNK_SIZE)
+            if not data:
+                break
+            yield data
 
 
 class EntryType(Enum):
@@ -110,6 +219,17 @@ class EntryStats:
     modification_time: datetime
 
 
+@dataclass
+class DeleteReport:
+    deleted_files: int = 0
+    deleted_dirs: int = 0
+    failed: List[str] = field(default_factory=list)
+
+    @property
+    def deleted(self):
+        return self.deleted_files + self.deleted_dirs
+
+
 NO_ENTRY = EntryStats(EntryType.Enoent, '', '', datetime.min, datetime.min)
 ROOT_ENTRY = EntryStats(EntryType.Dir, '/', '/', datetime.min, datetime.min)
 
@@ -119,9 +239,17 @@ class DriveClient:
     request_executor: MyCloudRequestExecutor = inject.attr(
         MyCloudRequestExecutor)
 
+    _server_side_copy = True
+
     async def ls(self, remote: str) -> MyCloudMetadata:
         return await self._get_directory_metadata_internal(remote)
 
+    async def ls_or_none(self, remote: str) -> MyCloudMetadata:
+        try:
+            return await self.ls(remote)
+        except DriveNotFoundException:
+            return None
+
     async def stat(self, path: str):
         normed = os.path.normpath(path)
         if normed == '/':
@@ -160,7 +288,10 @@ class DriveClient:
         get = GetObjectRequest(path, is_dir=False)
         resp = await self.request_executor.execute(get)
         DriveClient._raise_404(resp)
-        return ReadStream(resp.result.content)
+        return ReadStream(resp)
+
+    async def open_read_ranged(self, segments: List[Tuple[str, int]]):
+        return RangedReadStream(self.request_executor, segments)
 
     async def open_write(self, path: str):
         def exec_stream(g):
@@ -179,21 +310,61 @@ class DriveClient:
 
     async def move(self, from_path, to_path):
         stat = await self.stat(from_path)
+        if stat.entry_type == EntryType.Enoent:
+            raise DriveNotFoundException
         rename_request = RenameRequest(
-            from_path, to_path, stat.is_file)
+            from_path, to_path, stat.entry_type == EntryType.File)
         await self.request_executor.execute(rename_request)
 
     async def copy(self, from_path, to_path):
-        # assume it's a file for now?
-        read_stream = await self.open_read(from_path)
-        write_stream = await self.open_write(to_path)
-        while True:
-            read = await read_stream.read_async(CHUNK_SIZE)
-            if not read:
-                break
-            await write_stream.write_async(read)
-        read_stream.close()
-        write_stream.close()
+        stat = await self.stat(from_path)
+        if stat.entry_type == EntryType.Enoent:
+            raise DriveNotFoundException
+        is_file = stat.entry_type == EntryType.File
+        if self._server_side_copy:
+            copy_request = CopyRequest(from_path, to_path, is_file)
+            resp = await self.request_executor.execute(copy_request)
+            if resp.success:
+                return
+            if resp.result.status in (404, 405, 501):
+                # the source exists, so the copy command itself is missing
+                logging.info('Server-side copy is not available, streaming copies...')
+                self._server_side_copy = False
+
+        if is_file:
+            await self._copy_file_streamed(from_path, to_path)
+        else:
+            await self._copy_directory_streamed(from_path, to_path)
+
+    async def _copy_file_streamed(self, from_path: str, to_path: str):
+        get = GetObjectRequest(from_path, is_dir=False, hold_slot=False)
+        resp = await self.request_executor.execute(get)
+        DriveClient._raise_404(resp)
+
+        async def body():
+            # the download is handed to the upload as it arrives
+            async for chunk in resp.result.content.iter_chunked(NETWORK_CHUNK_SIZE):
+                yield chunk
+        put_request = PutObjectRequest(to_path, body(), is_dir=False)
+        try:
+            await self.request_executor.execute(put_request)
+        finally:
+            resp.release()
+
+    async def _copy_directory_streamed(self, from_path: str, to_path: str):
+        source_base = from_path.rstrip('/')
+        destination_base = to_path.rstrip('/')
+        await self.mkdirs(destination_base + '/')
+
+        async def copy_entry(entry):
+            destination = destination_base + entry.path[len(source_base):]
+            if isinstance(entry, DirEntry):
+                await self.mkdirs(destination)
+            else:
+                await self._copy_file_streamed(entry.path, destination)
+
+        walker = TreeWalker(self.ls_or_none)
+        await run_concurrently(walker.walk(source_base + '/'), copy_entry, COPY_CONCURRENCY)
 
     async def delete(self, path: str):
         stat = await self.stat(path)
@@ -206,11 +377,77 @@ class DriveClient:
             if not is_dir:
                 raise  # probably an unrecoverable error, if it's not a directory
 
-            metadata = await self._get_directory_metadata_internal(path)
-            for remote_file in metadata.files:
-                await self._delete_internal(remote_file.path, False)
-            for directory in metadata.dirs:
-                await self._delete_internal(directory.path, True)
+            report = await self._delete_tree(path)
+            logging.info(
+                f'Deleted {report.deleted_files} files and {report.deleted_dirs} directories in {path}')
+            if report.failed:
+                raise DriveFailedToDeleteException(
+                    f'Failed to delete {len(report.failed)} entries in {path}')
+
+    async def _delete_tree(self, root: str) -> DeleteReport:
+        report = DeleteReport()
+        directories = [(0, root)]
+        # directories above a failed entry can't become empty anymore
+        blocked = set()
+
+        def block_parents(path: str):
+            parent = os.path.dirname(path.rstrip('/'))
+            while parent not in blocked and parent != os.path.dirname(parent):
+                blocked.add(parent)
+                parent = os.path.dirname(parent)
+
+        def record(path: str, deleted: bool, is_dir: bool):
+            if not deleted:
+                report.failed.append(path)
+                block_parents(path)
+                return
+            if is_dir:
+                report.deleted_dirs += 1
+            else:
+                report.deleted_files += 1
+            if report.deleted % DELETE_PROGRESS_INTERVAL == 0:
+                logging.info(f'Deleted {report.deleted} entries in {root}...')
+
+        async def files():
+            async for depth, metadata in TreeWalker(self.ls_or_none).walk_listings(root):
+                directories.extend((depth + 1, directory.path)
+                                   for directory in metadata.dirs)
+                for file in metadata.files:
+                    yield file.path
+
+        async def delete_file(path: str):
+            record(path, await self._try_delete(path, False), False)
+
+        async def delete_directory(path: str):
+            if path.rstrip('/') in blocked:
+                report.failed.append(path)
+                block_parents(path)
+                return
+            deleted = await self._try_delete(path, True, attempts=RETRY_COUNT)
+            record(path, deleted, True)
+
+        await run_concurrently(files(), delete_file, DELETE_CONCURRENCY)
+
+        # siblings are deleted in parallel, but every level has to be gone
+        # before the one above it can be deleted
+        directories.sort(key=lambda entry: entry[0], reverse=True)
+        for _, level in groupby(directories, key=lambda entry: entry[0]):
+            paths = [path for _, path in level]
+            await run_concurrently(_iterate(paths), delete_directory, DELETE_CONCURRENCY)
+        return report
+
+    async def _try_delete(self, path: str, is_dir, attempts: int = 1):
+        for attempt in range(attempts):
+            if attempt > 0:
+                await asyncio.sleep(WAIT_TIME_MULTIPLIER ** attempt)
+            try:
+                await self._delete_single_internal(path, is_dir)
+                return True
+            except DriveNotFoundException:
+                return True  # already gone
+            except DriveFailedToDeleteException:
+                pass
+        return False
 
     async def _delete_single_internal(self, path: str, is_dir):
         delete_request = DeleteObjectRequest(path, is_dir)
@@ -231,3 +468,8 @@ class DriveClient:
     def _raise_404(response: MyCloudResponse):
         if response.result.status == 404:
             raise DriveNotFoundException
+
+
+async def _iterate(items):
+    for item in items:
+        yield item
@@ -1,3 +1,5 @@
 from mycloud.drive.filesync.downsync import downsync_file, downsync_folder
+from mycloud.drive.filesync.journal import JournalPart, UploadJournal
+from mycloud.drive.filesync.manifest import ManifestEntry, UploadManifest
 from mycloud.drive.filesync.tree import RelativeFileTree
 from mycloud.drive.filesync.upsync import upsync_file, upsync_folder
@@ -1,27 +1,30 @@
+import json
 import logging
 import os
-import tempfile
 import traceback
 
-from mycloud.common import TimeoutException, operation_timeout
-from mycloud.constants import (CHUNK_SIZE,
+from mycloud.common import (TimeoutException, operation_timeout,
+                            run_concurrently)
+from mycloud.constants import (DOWNLOAD_PROGRESS_EXTENSION,
                                MY_CLOUD_BIG_FILE_CHUNK_SIZE)
 from mycloud.drive.filesync.progress import ProgressTracker
 from mycloud.drive.filesystem import (BasicStringVersion, FileManager, FileMetadata,
                                       TranslatablePath, Version)
 from mycloud.mycloudapi import MyCloudRequestExecutor, ObjectResourceBuilder
 from mycloud.drive.streamapi import DefaultDownStream, ProgressReporter
-from mycloud.drive.streamapi.transforms import AES256CryptoTransform
+from mycloud.drive.streamapi.transforms import build_transforms
 
 
 async def downsync_folder(request_executor: MyCloudRequestExecutor,
                           resource_builder: ObjectResourceBuilder,
                           remote_directory: TranslatablePath,
                           progress_tracker: ProgressTracker,
-                          decryption_pwd: str = None):
+                          decryption_pwd: str = None,
+                          jobs: int = 1):
     # No transforms needed just to read directory
     file_manager = FileManager(request_executor, [], ProgressReporter())
-    async for file in file_manager.read_directory(remote_directory, recursive=True):
+
+    async def _downsync(file: TranslatablePath):
         try:
             await downsync_file(request_executor, resource_builder,
                                 file, progress_tracker, decryption_pwd)
@@ -35,6 +38,11 @@ async def downsync_folder(request_executor: MyCloudRequestExecutor,
                 str(ex)))
             traceback.print_exc()
 
+    # discovery runs as the producer, so listing overlaps with the downloads
+    discovered_files = file_manager.read_directory(
+        remote_directory, recursive=True, deep=True)
+    await run_concurrently(discovered_files, _downsync, jobs)
+
 
 async def downsync_file(request_executor: MyCloudRequestExecutor,
                         resource_builder: ObjectResourceBuilder,
@@ -44,21 +52,32 @@ async def downsync_file(request_executor: MyCloudRequestExecutor,
     if progress_tracker.skip_file(remote_file.calculate_remote()):
         return
 
-    transforms = [] if decryption_pwd is None else [
-        AES256CryptoTransform(decryption_pwd)]
-    del decryption_pwd
-    file_manager = FileManager(
-        request_executor, transforms, ProgressReporter())
-
     remote_base_path = remote_file.calculate_remote()
     logging.info('Downsyncing file {}...'.format(remote_base_path))
-    metadata: FileMetadata = await file_manager.read_file_metadata(remote_file)
+    metadata_reader = FileManager(request_executor, [], ProgressReporter())
+    metadata: FileMetadata = await metadata_reader.read_file_metadata(remote_file)
     latest_version: Version = metadata.get_latest_version()
+    # every version is read with the transforms it was written with
+    transforms = build_transforms(latest_version.transforms, decryption_pwd)
+    del decryption_pwd
+    file_manager = FileManager(
+        request_executor, transforms, ProgressReporter())
     basic_version = BasicStringVersion(latest_version.get_identifier())
     local_file = resource_builder.build_local_file(remote_base_path)
 
     file_dir = os.path.dirname(local_file)
-    if not os.path.isdir(file_dir):
+    chunk_size = latest_version.get_property(
+        'chunk_size') or MY_CLOUD_BIG_FILE_CHUNK_SIZE
+    progress = _read_progress(local_file)
+    if progress is not None:
+        if progress.get('version') == latest_version.get_identifier() and \
+                progress.get('chunk_size') == chunk_size and isinstance(progress.get('parts'), int):
+            # the file was preallocated, its length says nothing about progress
+            skip, started_partial, partial_index = False, progress['parts'] > 0, progress['parts']
+        else:
+            # written for another version of the file, none of it can be kept
+            skip, started_partial, partial_index = False, False, 0
+    elif not os.path.isdir(file_dir):
         os.makedirs(file_dir)
         skip, started_partial, partial_index = False, False, 0
     else:
@@ -69,37 +88,102 @@ async def downsync_file(request_executor: MyCloudRequestExecutor,
         return
 
     if started_partial:
-        # Delete file content after partial_index * MY_CLOUD_BIG_FILE_CHUNK_SIZE -> then append
-        chunk_size = latest_version.get_property(
-            'chunk_size') or MY_CLOUD_BIG_FILE_CHUNK_SIZE
-        delete_bytes_after = partial_index * chunk_size
-        file_length = operation_timeout(lambda x: os.stat(
-            x['local_file']).st_size, local_file=local_file)
-        if file_length != delete_bytes_after:
-            file_handle, temp_path = tempfile.mkstemp()
-            if chunk_size % CHUNK_SIZE != 0:
-                raise ValueError(
-                    'Chunk size in myCloud must be a multiple of encryption chunk length')
-
-            read_stream = operation_timeout(lambda x: open(
-                x['local_file'], 'rb'), local_file=local_file)
-            with os.fdopen(file_handle, 'wb') as file_stream:
-                read_length = 0
-                while read_length != delete_bytes_after:
-                    read_values = read_stream.read(CHUNK_SIZE)
-                    file_stream.write(read_values)
-                    read_length += CHUNK_SIZE
-            read_stream.close()
-            os.remove(local_file)
-
-            os.rename(temp_path, local_file)
-
+        resume_at = partial_index * chunk_size
+        # not opened in append mode, which would rule out positional writes
         local_stream = operation_timeout(lambda x: open(
-            x['local_file'], 'ab'), local_file=local_file)
+            x['local_file'], 'r+b'), local_file=local_file)
+        if progress is None:
+            # drop the part that was cut off, in place
+            operation_timeout(lambda x: x['stream'].truncate(
+                x['length']), stream=local_stream, length=resume_at)
+        operation_timeout(lambda x: x['stream'].seek(
+            x['pos']), stream=local_stream, pos=resume_at)
     else:
         local_stream = operation_timeout(lambda x: open(
             x['local_file'], 'wb'), local_file=local_file)
 
+    _preallocate(local_stream, latest_version.get_property('size'))
+
+    def save_progress(completed: int):
+        _write_progress(local_file, {
+            'version': latest_version.get_identifier(),
+            'chunk_size': chunk_size,
+            'parts': completed
+        })
+
+    save_progress(partial_index)
+    completed_parts = set()
+    contiguous_parts = partial_index
+
+    def part_listener(index: int):
+        nonlocal contiguous_parts
+        completed_parts.add(index)
+        if index != contiguous_parts:
+            return
+        while contiguous_parts in completed_parts:
+            completed_parts.remove(contiguous_parts)
+            contiguous_parts += 1
+        save_progress(contiguous_parts)
+
     downstream = DefaultDownStream(local_stream, partial_index)
-    await file_manager.read_file(downstream, remote_file, basic_version)
-    local_stream.close()
+    try:
+        await file_manager.read_file(downstream, remote_file, basic_version, part_listener)
+    finally:
+        downstream.close()
+    # the recorded size may be larger than what was uploaded, e.g. for a file
+    # appended to while it was read, the preallocated rest is cut off
+    _truncate(local_file, downstream.get_end())
+    _remove_progress(local_file)
+
+
+def _preallocate(local_stream, size: int):
+    if not size or not hasattr(os, 'posix_fallocate'):
+        return
+    try:
+        # reserves the space up front, so the file isn't fragmented and a
+        # full disk fails the download right away
+        os.posix_fallocate(local_stream.fileno(), 0, size)
+    except OSError as ex:
+        logging.debug(f'Could not preallocate {size} bytes: {ex}')
+
+
+def _truncate(local_file: str, length: int):
+    def truncate(values):
+        with open(values['local_file'], 'r+b') as local_stream:
+            local_stream.seek(0, os.SEEK_END)
+            if local_stream.tell() > values['length']:
+                local_stream.truncate(values['length'])
+            return True
+    operation_timeout(truncate, local_file=local_file, length=length)
+
+
+def _get_progress_path(local_file: str):
+    return local_file + DOWNLOAD_PROGRESS_EXTENSION
+
+
+def _read_progress(local_file: str):
+    try:
+        with open(_get_progress_path(local_file), 'r') as progress_file:
+            content = progress_file.read()
+    except FileNotFoundError:
+        return None
+    try:
+        progress = json.loads(content)
+    except ValueError:
+        return {}
+    return progress if isinstance(progress, dict) else {}
+
+
+def _write_progress(local_file: str, progress: dict):
+    # written to a temporary file and renamed, a crash leaves either value
+    progress_path = _get_progress_path(local_file)
+    with open(progress_path + '.tmp', 'w') as progress_file:
+        json.dump(progress, progress_file)
+    os.replace(progress_path + '.tmp', progress_path)
+
+
+def _remove_progress(local_file: str):
+    try:
+        os.remove(_get_progress_path(local_file))
+    except FileNotFoundError:
+        pass
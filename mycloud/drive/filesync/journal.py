@@ -0,0 +1,98 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from mycloud.common.database import connect_database
+from mycloud.constants import UPLOAD_JOURNAL_LOCATION
+
+
+@dataclass
+class JournalPart:
+    index: int
+    path: str
+    length: int
+    etag: Optional[str]
+
+
+class UploadJournal:
+
+    def __init__(self, location: str = UPLOAD_JOURNAL_LOCATION):
+        self._location = location
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def begin(self, remote: str, version: str):
+        # parts of another version of the file can't be continued anymore
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute('DELETE FROM parts WHERE remote = ? AND version != ?',
+                                   (remote, version))
+
+    def acknowledge(self, remote: str, version: str, part_size: int, part: JournalPart):
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO parts (remote, version, part_index, part_size, path, length, etag, acknowledged_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (remote, version, part.index, part_size, part.path, part.length, part.etag, time.time()))
+
+    def get_part_size(self, remote: str, version: str) -> Optional[int]:
+        # a resumed upload has to keep cutting parts at the same offsets
+        with self._lock:
+            row = self._connect().execute(
+                'SELECT part_size FROM parts WHERE remote = ? AND version = ? LIMIT 1',
+                (remote, version)).fetchone()
+        return None if row is None else row[0]
+
+    def get_parts(self, remote: str, version: str) -> List[JournalPart]:
+        with self._lock:
+            rows = self._connect().execute(
+                'SELECT part_index, path, length, etag FROM parts WHERE remote = ? AND version = ? ORDER BY part_index',
+                (remote, version)).fetchall()
+        # parts are uploaded concurrently, only the gapless start counts
+        parts = []
+        for row in rows:
+            if row[0] != len(parts):
+                break
+            parts.append(JournalPart(row[0], row[1], row[2], row[3]))
+        return parts
+
+    def discard(self, remote: str, version: str, from_index: int = 0):
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute('DELETE FROM parts WHERE remote = ? AND version = ? AND part_index >= ?',
+                                   (remote, version, from_index))
+
+    def complete(self, remote: str):
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    'DELETE FROM parts WHERE remote = ?', (remote,))
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            connection = connect_database(self._location)
+            with connection:
+                connection.execute('''
+                    CREATE TABLE IF NOT EXISTS parts (
+                        remote TEXT NOT NULL,
+                        version TEXT NOT NULL,
+                        part_index INTEGER NOT NULL,
+                        part_size INTEGER NOT NULL,
+                        path TEXT NOT NULL,
+                        length INTEGER NOT NULL,
+                        etag TEXT,
+                        acknowledged_at REAL NOT NULL,
+                        PRIMARY KEY (remote, version, part_index))''')
+            self._connection = connection
+        return self._connection
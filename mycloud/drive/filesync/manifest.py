@@ -0,0 +1,94 @@
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import List
+
+from mycloud.common.database import connect_database
+from mycloud.constants import (UPLOAD_MANIFEST_LOCATION,
+                               UPLOAD_MANIFEST_REVALIDATE_AFTER)
+
+
+@dataclass
+class ManifestEntry:
+    remote: str
+    local: str
+    size: int
+    mtime_ns: int
+    version: str
+    # the transforms the file was uploaded with, e.g. its cipher
+    transforms: List[str]
+    verified_at: float
+
+
+class UploadManifest:
+
+    def __init__(self,
+                 location: str = UPLOAD_MANIFEST_LOCATION,
+                 revalidate_after: float = UPLOAD_MANIFEST_REVALIDATE_AFTER):
+        self._location = location
+        self._revalidate_after = revalidate_after
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def get(self, remote: str):
+        with self._lock:
+            row = self._connect().execute(
+                'SELECT remote, local, size, mtime_ns, version, transforms, verified_at FROM uploads WHERE remote = ?',
+                (remote,)).fetchone()
+        if row is None:
+            return None
+        return ManifestEntry(row[0], row[1], row[2], row[3], row[4], json.loads(row[5]), row[6])
+
+    def put(self, remote: str, local: str, stats: os.stat_result, version: str, transforms: List[str]):
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO uploads (remote, local, size, mtime_ns, version, transforms, verified_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (remote, local, stats.st_size, stats.st_mtime_ns, version, json.dumps(transforms), time.time()))
+
+    def mark_verified(self, remote: str):
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute('UPDATE uploads SET verified_at = ? WHERE remote = ?',
+                                   (time.time(), remote))
+
+    def remove(self, remote: str):
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    'DELETE FROM uploads WHERE remote = ?', (remote,))
+
+    def is_unchanged(self, entry: ManifestEntry, stats: os.stat_result, transforms: List[str]):
+        # a file uploaded with another cipher has to be uploaded again
+        return (entry.size, entry.mtime_ns, entry.transforms) == \
+            (stats.st_size, stats.st_mtime_ns, transforms)
+
+    def needs_revalidation(self, entry: ManifestEntry):
+        return time.time() - entry.verified_at > self._revalidate_after
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            connection = connect_database(self._location)
+            with connection:
+                connection.execute('''
+                    CREATE TABLE IF NOT EXISTS uploads (
+                        remote TEXT PRIMARY KEY,
+                        local TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        mtime_ns INTEGER NOT NULL,
+                        version TEXT NOT NULL,
+                        transforms TEXT NOT NULL,
+                        verified_at REAL NOT NULL)''')
+            self._connection = connection
+        return self._connection
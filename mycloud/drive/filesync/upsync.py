@@ -1,16 +1,24 @@
+import asyncio
 import logging
 import os
+import time
+from typing import List
 
-from mycloud.common import TimeoutException, operation_timeout
-from mycloud.constants import MY_CLOUD_BIG_FILE_CHUNK_SIZE
+from mycloud.common import (ByteSemaphore, TimeoutException,
+                            cached_sha256_file, operation_timeout,
+                            remember_sha256_file, run_concurrently)
+from mycloud.constants import (CHUNK_SIZE, DEFAULT_CIPHER, PART_CONCURRENCY,
+                               UPSYNC_MAX_INFLIGHT_BYTES)
+from mycloud.drive.filesync.journal import JournalPart, UploadJournal
+from mycloud.drive.filesync.manifest import UploadManifest
 from mycloud.drive.filesync.progress import ProgressTracker
 from mycloud.drive.filesystem import (FileManager, HashCalculatedVersion,
                                       LocalTranslatablePath)
 from mycloud.mycloudapi import MyCloudRequestExecutor, ObjectResourceBuilder
-from mycloud.drive.streamapi import DefaultUpStream, ProgressReporter
-from mycloud.drive.streamapi.transforms import AES256CryptoTransform
-
-# _mtime_cache = {}
+from mycloud.drive.streamapi import (BandwidthMeter, DefaultUpStream,
+                                     HashingUpStream, ProgressReporter,
+                                     choose_part_size)
+from mycloud.drive.streamapi.transforms import build_cipher_transform
 
 
 async def upsync_folder(request_executor: MyCloudRequestExecutor,
@@ -18,23 +26,42 @@ async def upsync_folder(request_executor: MyCloudRequestExecutor,
                         local_directory: str,
                         progress_tracker: ProgressTracker,
                         encryption_pwd: str = None,
-                        skip_by_date=True):
-    # global _mtime_cache
-    # skip_by_date: Use ctime of mycloud_metadata.json
-    for root, _, files in os.walk(local_directory, topdown=True):
-        # remote_root = resource_builder._build_remote_directory(root)
-        # if not _cache_contains(remote_root):
-        #     _fill_mtime(request_executor, remote_root)
-        for file in files:
-            local_file = os.path.join(root, file)
-            try:
+                        skip_by_date=True,
+                        jobs: int = 1,
+                        max_inflight_bytes: int = UPSYNC_MAX_INFLIGHT_BYTES,
+                        part_jobs: int = PART_CONCURRENCY,
+                        single_pass=False,
+                        use_manifest=True,
+                        use_journal=True,
+                        part_size: int = None,
+                        cipher: str = DEFAULT_CIPHER):
+    byte_budget = ByteSemaphore(max_inflight_bytes)
+    bandwidth_meter = BandwidthMeter()
+    manifest = UploadManifest() if use_manifest else None
+    journal = UploadJournal() if use_journal else None
+
+    async def _upsync(local_file: str):
+        try:
+            file_size = operation_timeout(
+                lambda x: os.path.getsize(x['path']), path=local_file)
+            async with byte_budget.hold(_estimate_buffered_bytes(file_size, part_jobs)):
                 await upsync_file(request_executor, resource_builder,
-                                  local_file, progress_tracker, encryption_pwd, skip_by_date)
-            except TimeoutException:
-                logging.error('Failed to access file {} within the given time'.format(
-                    local_file))
-            except ValueError as ex:
-                logging.error(str(ex))
+                                  local_file, progress_tracker, encryption_pwd, skip_by_date,
+                                  part_jobs, single_pass, manifest, journal,
+                                  part_size, bandwidth_meter, cipher)
+        except TimeoutException:
+            logging.error('Failed to access file {} within the given time'.format(
+                local_file))
+        except ValueError as ex:
+            logging.error(str(ex))
+
+    try:
+        await run_concurrently(_walk_local_files(local_directory), _upsync, jobs)
+    finally:
+        if manifest is not None:
+            manifest.close()
+        if journal is not None:
+            journal.close()
 
 
 async def upsync_file(request_executor: MyCloudRequestExecutor,
@@ -42,71 +69,224 @@ async def upsync_file(request_executor: MyCloudRequestExecutor,
                       local_file: str,
                       progress_tracker: ProgressTracker,
                       encryption_pwd: str = None,
-                      skip_by_date=True):
-    # global _mtime_cache
+                      skip_by_date=True,
+                      part_jobs: int = PART_CONCURRENCY,
+                      single_pass=False,
+                      manifest: UploadManifest = None,
+                      journal: UploadJournal = None,
+                      part_size: int = None,
+                      bandwidth_meter: BandwidthMeter = None,
+                      cipher: str = DEFAULT_CIPHER):
     if progress_tracker.skip_file(local_file):
         logging.info('Skipping file {}'.format(local_file))
         return
 
-    # remote_path = resource_builder.build_remote_file(local_file)
-    # local_mtime = operation_timeout(
-    #     lambda x: os.path.getmtime(x['path']), path=local_file)
-    # if skip_by_date and _mtime_cache[remote_path] >= local_mtime:
-    #     log('Skipping file becuase of mtime {}'.format(remote_path))
-    #     return
-
     transforms = [] if encryption_pwd is None else [
-        AES256CryptoTransform(encryption_pwd)]
+        build_cipher_transform(cipher, encryption_pwd)]
     del encryption_pwd
+    transform_names = [transform.get_name() for transform in transforms]
     file_manager = FileManager(
-        request_executor, transforms, ProgressReporter())
+        request_executor, transforms, ProgressReporter(), part_jobs)
+    stats = operation_timeout(lambda x: os.stat(x['path']), path=local_file)
+    remote_file = resource_builder.build_remote_file(local_file)
+    if manifest is not None and await _is_uploaded(file_manager, manifest, resource_builder, local_file, stats, transform_names):
+        logging.info('Skipping unchanged file {}'.format(local_file))
+        return
+
+    metadata = None
+    if single_pass and cached_sha256_file(local_file) is None:
+        metadata = await file_manager.read_file_metadata(
+            LocalTranslatablePath(resource_builder, local_file))
+        if not _may_be_uploaded(metadata, stats):
+            version = await _upsync_file_single_pass(
+                file_manager, resource_builder, local_file, stats,
+                part_size or _choose_part_size(stats, part_jobs, bandwidth_meter))
+            if manifest is not None:
+                manifest.put(remote_file, local_file, stats,
+                             version.get_identifier(), transform_names)
+            return
+        # only the hash tells whether the stored version is this file
+        logging.info('Hashing {} to compare it with its uploaded versions'.format(local_file))
+
     calculatable_version = HashCalculatedVersion(local_file)
     translatable_path = LocalTranslatablePath(
         resource_builder, local_file, calculatable_version)
-    started_partial_upload, index = await file_manager.started_partial_upload(
-        translatable_path, calculatable_version)
+    version_identifier = calculatable_version.calculate_version()
+    if metadata is None:
+        metadata = await file_manager.read_file_metadata(translatable_path)
+    if metadata is not None and metadata.contains_version(version_identifier):
+        # uploaded before, possibly from another machine
+        logging.info('File {} is already uploaded'.format(local_file))
+        if manifest is not None:
+            manifest.put(remote_file, local_file, stats,
+                         version_identifier, transform_names)
+        return
+
+    part_listener = None
+    if journal is None:
+        uploaded_parts, file_part_size = await _listed_parts(
+            file_manager, translatable_path, calculatable_version, transforms,
+            part_size or _choose_part_size(stats, part_jobs, bandwidth_meter))
+    else:
+        # parts written with other transforms can't be continued
+        journal_version = ':'.join([version_identifier] + transform_names)
+        uploaded_parts = await _journaled_parts(
+            file_manager, journal, remote_file, journal_version)
+        file_part_size = journal.get_part_size(remote_file, journal_version) or \
+            part_size or _choose_part_size(stats, part_jobs, bandwidth_meter)
+
+        def part_listener(index, part_file, length, etag):
+            journal.acknowledge(remote_file, journal_version, file_part_size,
+                                JournalPart(index, part_file, length, etag))
+
+    index = len(uploaded_parts)
     local_stream = operation_timeout(
         lambda x: open(x['path'], 'rb'), path=local_file)
-    if started_partial_upload:
-        stream_position = index * MY_CLOUD_BIG_FILE_CHUNK_SIZE
+    if index > 0:
+        logging.info('Resuming upload of {} at part {}'.format(local_file, index))
+        stream_position = index * file_part_size
         operation_timeout(lambda x: x['stream'].seek(
             x['pos']), stream=local_stream, pos=stream_position)
     cloud_stream = DefaultUpStream(local_stream, index)
-    await file_manager.write_file(
-        cloud_stream, translatable_path, calculatable_version)
-
-
-# def _fill_mtime(request_executor: MyCloudRequestExecutor, directory: str):
-#     # global _mtime_cache
-#     directory_list_request = DirectoryListRequest(directory,
-#                                                   ListType.File,
-#                                                   ignore_not_found=True,
-#                                                   ignore_internal_server_error=True)
-#     response = request_executor.execute_request(directory_list_request)
-#     if response.status_code == 404:
-#         return
-
-#     is_timeout = DirectoryListRequest.is_timeout(response)
-#     if is_timeout:
-#         return
-
-#     files = directory_list_request.format_response(response)
-#     for file in files:
-#         file_path = file['Path']
-#         if os.path.basename(file_path) == METADATA_FILE_NAME:
-#             ticks = file['ModificationTimeTicks']
-#             unix_time = to_unix_timestamp(ticks)
-#             dir_path = os.path.dirname(file_path)
-#             _mtime_cache[dir_path] = unix_time
-
-
-# def _cache_contains(dir: str):
-#     global _mtime_cache
-#     for key in _mtime_cache:
-#         if dir in key:
-#             return True
-#     return False
-
-
-# def _clear_mtime_cache(current_path: str):
-#     pass
+    started = time.monotonic()
+    version = await file_manager.write_file(
+        cloud_stream, translatable_path, calculatable_version, uploaded_parts, part_listener,
+        file_part_size)
+    if bandwidth_meter is not None:
+        bandwidth_meter.record(stats.st_size - index * file_part_size,
+                               time.monotonic() - started)
+    if journal is not None:
+        journal.complete(remote_file)
+    if manifest is not None:
+        manifest.put(remote_file, local_file, stats,
+                     version.get_identifier(), transform_names)
+
+
+def _choose_part_size(stats: os.stat_result, part_jobs: int, bandwidth_meter: BandwidthMeter = None):
+    bytes_per_second = None if bandwidth_meter is None else bandwidth_meter.bytes_per_second
+    return choose_part_size(stats.st_size, bytes_per_second, part_jobs)
+
+
+async def _listed_parts(file_manager: FileManager,
+                        translatable_path: LocalTranslatablePath,
+                        calculatable_version: HashCalculatedVersion,
+                        transforms,
+                        part_size: int):
+    parts = await file_manager.started_partial_upload(
+        translatable_path, calculatable_version)
+    if not parts:
+        return [], part_size
+
+    # the parts may have been cut at another size, e.g. by another
+    # --part-size, and can only be continued at that size
+    listed_part_size = _get_original_length(transforms, parts[0].length)
+    if listed_part_size is None or listed_part_size < 1 or \
+            any(part.length != _get_transformed_length(transforms, listed_part_size) for part in parts):
+        logging.info('Uploaded parts of {} have inconsistent lengths, uploading it again'.format(
+            translatable_path.calculate_remote()))
+        return [], part_size
+    return [part.path for part in parts], listed_part_size
+
+
+def _get_transformed_length(transforms, length: int):
+    for transform in transforms:
+        if length is None:
+            return None
+        length = transform.get_transformed_length(length)
+    return length
+
+
+def _get_original_length(transforms, length: int):
+    for transform in reversed(transforms):
+        if length is None:
+            return None
+        length = transform.get_original_length(length)
+    return length
+
+
+async def _journaled_parts(file_manager: FileManager,
+                           journal: UploadJournal,
+                           remote_file: str,
+                           version_identifier: str):
+    journal.begin(remote_file, version_identifier)
+    parts = journal.get_parts(remote_file, version_identifier)
+    if not parts:
+        return []
+
+    # the last acknowledged part is the one most likely to be damaged
+    last = parts[-1]
+    length = await file_manager.get_part_length(last.path)
+    if length != last.length:
+        logging.info('Part {} has length {} instead of {}, uploading it again'.format(
+            last.path, length, last.length))
+        journal.discard(remote_file, version_identifier, last.index)
+        parts = parts[:-1]
+    return [part.path for part in parts]
+
+
+async def _is_uploaded(file_manager: FileManager,
+                       manifest: UploadManifest,
+                       resource_builder: ObjectResourceBuilder,
+                       local_file: str,
+                       stats: os.stat_result,
+                       transform_names: List[str]):
+    remote_file = resource_builder.build_remote_file(local_file)
+    entry = manifest.get(remote_file)
+    if entry is None or not manifest.is_unchanged(entry, stats, transform_names):
+        return False
+    if not manifest.needs_revalidation(entry):
+        return True
+
+    translatable_path = LocalTranslatablePath(resource_builder, local_file)
+    metadata = await file_manager.read_file_metadata(translatable_path)
+    if metadata is not None and metadata.contains_version(entry.version):
+        manifest.mark_verified(remote_file)
+        return True
+    manifest.remove(remote_file)
+    return False
+
+
+def _may_be_uploaded(metadata, stats: os.stat_result):
+    if metadata is None:
+        return False
+    # versions committed without a size can't be ruled out
+    return any(version.get_property('size') in (None, stats.st_size)
+               for version in metadata.versions.values())
+
+
+async def _upsync_file_single_pass(file_manager: FileManager,
+                                   resource_builder: ObjectResourceBuilder,
+                                   local_file: str,
+                                   stats: os.stat_result,
+                                   part_size: int):
+    translatable_path = LocalTranslatablePath(resource_builder, local_file)
+    local_stream = operation_timeout(
+        lambda x: open(x['path'], 'rb'), path=local_file)
+    cloud_stream = HashingUpStream(local_stream)
+    try:
+        return await file_manager.write_file_single_pass(cloud_stream, translatable_path, part_size)
+    finally:
+        if cloud_stream.is_finished():
+            # hashed while uploading, a later normal upsync won't read it again
+            remember_sha256_file(
+                local_file, stats, cloud_stream.hexdigest())
+
+
+def _estimate_buffered_bytes(file_size: int, part_jobs: int):
+    # files are streamed, every concurrent part holds a read chunk and its
+    # transformed copy, independent of the size of the file
+    return min(file_size, 2 * CHUNK_SIZE * max(part_jobs, 1))
+
+
+async def _walk_local_files(local_directory: str):
+    loop = asyncio.get_event_loop()
+    walker = os.walk(local_directory, topdown=True)
+    while True:
+        # directories are listed on a worker thread, not on the loop
+        entry = await loop.run_in_executor(None, next, walker, None)
+        if entry is None:
+            return
+        root, _, files = entry
+        for file in files:
+            yield os.path.join(root, file)
+
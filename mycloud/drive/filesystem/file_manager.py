@@ -1,38 +1,52 @@
 import logging
 import os
-from collections import defaultdict
+import uuid
 from pathlib import Path
+from typing import Callable, List, Optional
 
-from mycloud.common import is_int, operation_timeout
-from mycloud.constants import METADATA_FILE_NAME, MY_CLOUD_BIG_FILE_CHUNK_SIZE
+from mycloud.common import is_int, operation_timeout, unsanitize_path
+from mycloud.constants import (METADATA_FILE_NAME, MY_CLOUD_BIG_FILE_CHUNK_SIZE,
+                               PART_CONCURRENCY, STAGING_VERSION_PREFIX,
+                               VERSION_HASH_LENGTH)
 from mycloud.drive.filesystem.file_metadata import FileMetadata, Version
-from mycloud.drive.filesystem.file_version import (CalculatableVersion,
+from mycloud.drive.filesystem.file_version import (BasicStringVersion,
+                                                   CalculatableVersion,
                                                    HashCalculatedVersion)
 from mycloud.drive.filesystem.metadata_manager import MetadataManager
 from mycloud.drive.filesystem.translatable_path import (BasicRemotePath,
                                                         TranslatablePath)
 from mycloud.drive.filesystem.versioned_stream_accessor import \
     VersionedCloudStreamAccessor
+from mycloud.drive.tree_walker import TreeWalker
 from mycloud.mycloudapi import MyCloudRequestExecutor
-from mycloud.mycloudapi.requests.drive import (DirectoryListRequest, ListType,
-                                               MetadataRequest)
+from mycloud.mycloudapi.requests.drive import (DeleteObjectRequest,
+                                               DirectoryListRequest, FileEntry,
+                                               GetObjectRequest, ListType,
+                                               MetadataRequest, MyCloudMetadata,
+                                               RenameRequest)
 from mycloud.drive.streamapi import (CloudStream, DownStream, DownStreamExecutor,
-                                     ProgressReporter, UpStream, UpStreamExecutor)
+                                     HashingUpStream, PartListener,
+                                     ProgressReporter, UpStream,
+                                     UpStreamExecutor)
 
 
 class FileManager:
 
-    def __init__(self, request_executor: MyCloudRequestExecutor, transforms, reporter: ProgressReporter):
+    def __init__(self,
+                 request_executor: MyCloudRequestExecutor,
+                 transforms,
+                 reporter: ProgressReporter,
+                 part_concurrency: int = PART_CONCURRENCY):
         self._request_executor = request_executor
         self._transforms = transforms
+        self._part_concurrency = part_concurrency
         self._metadata_manager = MetadataManager(request_executor)
         self._reporter = ProgressReporter() if reporter is None else reporter
 
     async def read_directory(self,
                              translatable_path: TranslatablePath,
                              recursive=False,
-                             deep=False,
-                             _second=False):
+                             deep=False):
         logging.debug(f'Reading directory...')
         data = None
         if deep:
@@ -45,22 +59,47 @@ class FileManager:
         else:
             logging.debug('Using metadata request...')
             data = self._read_directory_using_metadata_request(
-                translatable_path, recursive, False)
+                translatable_path, recursive)
         async for item in data:
             yield item
 
     async def started_partial_upload(self,
                                      translatable_path: TranslatablePath,
-                                     calculatable_version: CalculatableVersion):
+                                     calculatable_version: CalculatableVersion) -> List[FileEntry]:
         versioned_stream_accessor = VersionedCloudStreamAccessor(
             translatable_path, calculatable_version, None)
         path = versioned_stream_accessor.get_base_path()
         metadata_request = MetadataRequest(path)
         response = await self._request_executor.execute(metadata_request)
-        if response.result.status == 404:
-            return False, 0
-        (_, files) = await response.formatted()
-        return True, len(files)
+        metadata = await response.formatted()
+        if metadata is None:
+            return []
+        parts = []
+        for file in sorted(metadata.files, key=lambda file: file.name):
+            index = Path(file.name).stem
+            if not is_int(index) or int(index) != len(parts):
+                break
+            parts.append(file)
+        # the listing can't tell whether the last part was cut off
+        return parts[:-1]
+
+    async def get_part_length(self, part_file: str) -> Optional[int]:
+        # a single byte is enough to learn the full length of the part
+        get_request = GetObjectRequest(part_file, byte_range=(0, 0))
+        response = await self._request_executor.execute(get_request)
+        result = response.result
+        try:
+            if result.status == 404:
+                return None
+            content_range = result.headers.get('Content-Range')
+            if content_range is not None and '/' in content_range:
+                total = content_range.rsplit('/', 1)[1]
+                return int(total) if is_int(total) else None
+            if result.status == 200 and 'Content-Length' in result.headers:
+                return int(result.headers['Content-Length'])
+            return None
+        finally:
+            response.close()
 
     async def started_partial_download(self,
                                        translatable_path: TranslatablePath,
@@ -78,11 +117,12 @@ class FileManager:
         directory = os.path.dirname(parts[0])
         metadata_request = MetadataRequest(directory)
         response = await self._request_executor.execute(metadata_request)
-        (dirs, files) = await response.formatted()
-        if any(dirs):
+        listed = await response.formatted()
+        if any(listed.dirs):
             raise ValueError(
                 'Cannot have directories in directory of partial files')
-        file_lengths = [file['Length'] for file in files]
+        files = listed.files
+        file_lengths = [file.length for file in files]
         summed_up_size = sum(file_lengths)
         if file_length >= summed_up_size:
             return True, False, 0
@@ -110,17 +150,22 @@ class FileManager:
     async def read_file(self,
                         downstream: DownStream,
                         translatable_path: TranslatablePath,
-                        calculatable_version: CalculatableVersion):
+                        calculatable_version: CalculatableVersion,
+                        part_listener: Callable[[int], None] = None):
         metadata = await self._metadata_manager.get_metadata(translatable_path)
         calculated_version = calculatable_version.calculate_version()
         if not metadata.contains_version(calculated_version):
             raise ValueError('Version does not exist for given file')
 
+        version = metadata.get_version(calculated_version)
         versioned_stream_accessor = self._prepare_versioned_stream(
             translatable_path, calculatable_version, downstream)
+        if version.get_property('binding') is not None:
+            # parts encrypted before they were moved to the version
+            versioned_stream_accessor.bind_to(version.get_property('binding'))
         downstreamer = DownStreamExecutor(
-            self._request_executor, self._reporter)
-        await downstreamer.download_stream(versioned_stream_accessor)
+            self._request_executor, self._reporter, self._part_concurrency, part_listener)
+        await downstreamer.download_stream(versioned_stream_accessor, version.get_parts())
 
     async def read_file_metadata(self,
                                  translatable_path: TranslatablePath):
@@ -130,7 +175,10 @@ class FileManager:
     async def write_file(self,
                          upstream: UpStream,
                          translatable_path: TranslatablePath,
-                         calculatable_version: CalculatableVersion):
+                         calculatable_version: CalculatableVersion,
+                         uploaded_parts: List[str] = None,
+                         part_listener: PartListener = None,
+                         part_size: int = MY_CLOUD_BIG_FILE_CHUNK_SIZE):
         existing_metadata = await self._metadata_manager.get_metadata(
             translatable_path)
         existing_metadata = existing_metadata if existing_metadata is not None else FileMetadata()
@@ -145,35 +193,103 @@ class FileManager:
         remote_base_path = translatable_path.calculate_remote()
         version = Version(version_identifier, remote_base_path)
 
-        if upstream.continued_append_starting_index > 0:
-            versioned_base_path = versioned_stream_accessor.get_base_path()
-            list_directory_request = MetadataRequest(versioned_base_path)
-            listed_directory = await self._request_executor.execute(
-                list_directory_request)
-            (dirs, files) = await listed_directory.formatted()
-            if any(dirs):
-                raise ValueError(
-                    'A versioned directory with partial files cannot contain subdirectories')
-            if len(files) != upstream.continued_append_starting_index:
-                raise ValueError('Must append at correct position')
-            for file in files:
-                file_name = os.path.basename(file['Path'])
-                path = Path(file_name).with_suffix('').stem
-                if not is_int(path):
-                    raise ValueError('Non-integer indexed part file found')
-                version.add_part_file(file['Path'])
-
-        upstreamer = UpStreamExecutor(self._request_executor, self._reporter)
+        uploaded_parts = uploaded_parts or []
+        if len(uploaded_parts) != upstream.continued_append_starting_index:
+            raise ValueError('Must append at correct position')
+        for part_file in uploaded_parts:
+            version.add_part_file(part_file)
+
+        upstreamer = UpStreamExecutor(
+            self._request_executor, self._reporter, self._part_concurrency, part_listener, part_size)
         await upstreamer.upload_stream(versioned_stream_accessor)
 
+        await self._commit_version(translatable_path, existing_metadata, version,
+                                   versioned_stream_accessor.get_accessed_file_parts(), part_size)
+        return version
+
+    async def write_file_single_pass(self,
+                                     upstream: HashingUpStream,
+                                     translatable_path: TranslatablePath,
+                                     part_size: int = MY_CLOUD_BIG_FILE_CHUNK_SIZE):
+        staging_version = BasicStringVersion(
+            STAGING_VERSION_PREFIX + uuid.uuid4().hex[:VERSION_HASH_LENGTH])
+        staging_stream_accessor = self._prepare_versioned_stream(
+            translatable_path, staging_version, upstream)
+        upstreamer = UpStreamExecutor(
+            self._request_executor, self._reporter, self._part_concurrency, part_size=part_size)
+        staging_path = staging_stream_accessor.get_base_path()
+        try:
+            await upstreamer.upload_stream(staging_stream_accessor)
+
+            digested = upstream.hexdigest()
+            version_identifier = digested[:VERSION_HASH_LENGTH]
+            existing_metadata = await self._metadata_manager.get_metadata(
+                translatable_path)
+            existing_metadata = existing_metadata if existing_metadata is not None else FileMetadata()
+            if existing_metadata.contains_version(version_identifier):
+                # unchanged content saved again, the stored version is kept
+                await self._discard_staging(staging_stream_accessor)
+                return existing_metadata.get_version(version_identifier)
+
+            final_stream_accessor = VersionedCloudStreamAccessor(
+                translatable_path, BasicStringVersion(version_identifier), None)
+            final_path = final_stream_accessor.get_base_path()
+            rename_request = RenameRequest(staging_path, final_path, is_file=False)
+            response = await self._request_executor.execute(rename_request)
+            if not response.success:
+                raise ValueError(
+                    f'Failed to move staged upload {staging_path} to {final_path}')
+        except BaseException:
+            # staging versions are random, their parts can never be resumed
+            await self._discard_staging(staging_stream_accessor)
+            raise
+
+        staged_parts = staging_stream_accessor.get_accessed_file_parts()
+        for index in range(len(staged_parts)):
+            final_stream_accessor.get_part_file(index)
+
+        version = Version(version_identifier,
+                          translatable_path.calculate_remote())
+        version.add_property('hash', digested)
+        version.add_property('size', upstream.bytes_read)
+        if self._transforms:
+            # the parts stay bound to the staging version they were written to
+            version.add_property('binding', staging_version.calculate_version())
+        await self._commit_version(translatable_path, existing_metadata, version,
+                                   final_stream_accessor.get_accessed_file_parts(), part_size)
+        return version
+
+    async def _discard_staging(self, staging_stream_accessor: VersionedCloudStreamAccessor):
+        staging_path = staging_stream_accessor.get_base_path()
+        try:
+            response = await self._request_executor.execute(
+                DeleteObjectRequest(staging_path, is_dir=True))
+            if response.success or response.result.status == 404:
+                return
+            # directories with content can't always be deleted at once
+            for part_file in staging_stream_accessor.get_accessed_file_parts():
+                await self._request_executor.execute(DeleteObjectRequest(part_file))
+            await self._request_executor.execute(
+                DeleteObjectRequest(staging_path, is_dir=True))
+        except Exception as ex:
+            logging.warning(
+                f'Failed to remove staged upload {staging_path}: {ex}')
+
+    async def _commit_version(self,
+                              translatable_path: TranslatablePath,
+                              existing_metadata: FileMetadata,
+                              version: Version,
+                              part_files,
+                              part_size: int):
         for transform in self._transforms:
             version.add_transform(transform.get_name())
         remote_properties = translatable_path.calculate_properties()
 
         for key in remote_properties:
             version.add_property(key, remote_properties[key])
+        version.add_property('chunk_size', part_size)
 
-        for accessed in versioned_stream_accessor.get_accessed_file_parts():
+        for accessed in part_files:
             version.add_part_file(accessed)
         existing_metadata.update_version(version)
 
@@ -187,62 +303,86 @@ class FileManager:
             versioned_cloud_stream_accessor.add_transform(transform)
         return versioned_cloud_stream_accessor
 
-    async def _read_directory_using_metadata_request(self, translatable_path: TranslatablePath, recursive: bool, _second: bool):
-        base = translatable_path.calculate_remote()
-        metadata_request = MetadataRequest(base)
-        response = await self._request_executor.execute(metadata_request)
-        logging.debug(f'Got response for path {base}')
-        if response.result.status == 404:
-            return
-        (dirs, files) = await response.formatted()
-        if len(files) == 1 and files[0]['Name'] == METADATA_FILE_NAME:
-            yield translatable_path
+    async def _read_directory_using_metadata_request(self, translatable_path: TranslatablePath, recursive: bool):
+        # non-recursive reads still look one level down, to find the files
+        # directly inside the listed directory
+        walker = TreeWalker(self._list_metadata,
+                            max_depth=None if recursive else 1,
+                            expand=lambda metadata: not FileManager.is_versioned_file(metadata))
+        async for depth, metadata in walker.walk_listings(translatable_path.calculate_remote()):
+            if FileManager.is_versioned_file(metadata):
+                yield translatable_path if depth == 0 else BasicRemotePath(metadata.path)
 
-        async def loop_dirs(rec, sec):
-            for directory in dirs:
-                remote_path = BasicRemotePath(directory['Path'])
-                data = self._read_directory_using_metadata_request(
-                    remote_path, recursive=rec, _second=sec)
-                async for item in data:
-                    yield item
+    async def _list_metadata(self, path: str):
+        metadata_request = MetadataRequest(path)
+        response = await self._request_executor.execute(metadata_request)
+        logging.debug(f'Got response for path {path}')
+        return await response.formatted()
 
-        items = loop_dirs(True, False) if recursive else await loop_dirs(False, True)
-        async for item in items:
-            yield item
+    @staticmethod
+    def is_versioned_file(metadata: MyCloudMetadata):
+        # the remaining directories only hold versions of this file
+        return len(metadata.files) == 1 and metadata.files[0].name == METADATA_FILE_NAME
 
     async def _read_directory_using_directory_list_request(self, translatable_path: TranslatablePath):
         remote_path = translatable_path.calculate_remote()
-        directory_list_command = DirectoryListRequest(
+        directory_list_request = DirectoryListRequest(
             remote_path, ListType.File)
         response = await self._request_executor.execute(
-            directory_list_command)
+            directory_list_request)
         if response.result.status == 404:
             return
 
-        if DirectoryListRequest.is_timeout(response):
-            metadata_request = MetadataRequest(remote_path)
-            metadata_response = await self._request_executor.execute(
-                metadata_request)
-            (dirs, files) = await metadata_response.formatted()
-            if len(files) == 1 and os.path.basename(files[0]) == METADATA_FILE_NAME:
-                yield files[0]['Path']
-                return
+        if response.result.status != 200:
+            if await DirectoryListRequest.is_timeout(response.result):
+                logging.debug(
+                    f'Listing {remote_path} timed out, listing subdirectories separately...')
+            else:
+                logging.warning(
+                    f'Listing {remote_path} failed with status {response.result.status}, listing subdirectories separately...')
+            data = self._read_subdirectories_using_directory_list_request(
+                translatable_path)
+            async for item in data:
+                yield item
+            return
 
-            for directory in dirs:
-                dir_path = BasicRemotePath(directory['Path'])
-                items = await self._read_directory_using_directory_list_request(dir_path)
-                for item in items:
-                    yield item
-        else:
-            files = await response.formatted()
-            # TODO: use less memory and make proper use of `files` generator
-            directory_file_count = defaultdict(int)
-            for file in files:
-                directory = os.path.dirname(file['Path'])
-                directory_file_count[directory] += 1
-
-            for file in files:
-                file_name = os.path.basename(file['Path'])
-                dir_name = os.path.dirname(file['Path'])
-                if file_name == METADATA_FILE_NAME and directory_file_count[dir_name] == 1:
-                    yield file['Path']
+        # the files of a directory are listed together, a directory is
+        # complete as soon as the listing moves on, so versioned files are
+        # yielded while the rest of the tree is still being listed
+        finished_directories = set()
+        directory, file_count, has_metadata = None, 0, False
+        items = await response.formatted()
+        async for item in items:
+            item_directory = os.path.dirname(item['Path'])
+            if item_directory != directory:
+                if directory is not None:
+                    finished_directories.add(directory)
+                    if has_metadata and file_count == 1:
+                        yield BasicRemotePath(unsanitize_path(directory))
+                if item_directory in finished_directories:
+                    logging.warning(
+                        f'Listing of {remote_path} returned {item_directory} twice, it may be misdetected')
+                directory, file_count, has_metadata = item_directory, 0, False
+            file_count += 1
+            if os.path.basename(item['Path']) == METADATA_FILE_NAME:
+                has_metadata = True
+
+        if directory is not None and has_metadata and file_count == 1:
+            yield BasicRemotePath(unsanitize_path(directory))
+
+    async def _read_subdirectories_using_directory_list_request(self, translatable_path: TranslatablePath):
+        metadata_request = MetadataRequest(translatable_path.calculate_remote())
+        response = await self._request_executor.execute(metadata_request)
+        metadata: MyCloudMetadata = await response.formatted()
+        if metadata is None:
+            return
+
+        if FileManager.is_versioned_file(metadata):
+            yield translatable_path
+            return
+
+        for directory in metadata.dirs:
+            data = self._read_directory_using_directory_list_request(
+                BasicRemotePath(directory.path))
+            async for item in data:
+                yield item
@@ -22,8 +22,8 @@ class MetadataManager:
     async def update_metadata(self, path: TranslatablePath, metadata: FileMetadata):
         metadata_path = MetadataManager._get_metadata_path(path)
         json_representation = FileMetadata.to_json(metadata)
-        byte_generator = get_string_generator(json_representation)
-        put_request = PutObjectRequest(metadata_path, byte_generator)
+        put_request = PutObjectRequest(
+            metadata_path, lambda: get_string_generator(json_representation))
         _ = await self._request_executor.execute(put_request)
 
     @staticmethod
@@ -2,7 +2,6 @@ import os
 from abc import ABC, abstractmethod
 
 from mycloud.common import operation_timeout
-from mycloud.constants import MY_CLOUD_BIG_FILE_CHUNK_SIZE
 from mycloud.drive.filesystem.file_version import HashCalculatedVersion
 from mycloud.mycloudapi import ObjectResourceBuilder
 
@@ -45,7 +44,6 @@ class LocalTranslatablePath(TranslatablePath):
         dictionary['local'] = self._local_file
         dictionary['remote_base'] = self._resource_builder.mycloud_dir
         dictionary['local_base'] = self._resource_builder.base_dir
-        dictionary['chunk_size'] = MY_CLOUD_BIG_FILE_CHUNK_SIZE
         dictionary['size'] = operation_timeout(
             lambda x: os.stat(x['path']).st_size, path=self._local_file)
         dictionary['ctime'] = operation_timeout(
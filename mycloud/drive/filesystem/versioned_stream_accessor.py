@@ -11,6 +11,7 @@ class VersionedCloudStreamAccessor(CloudStreamAccessor):
         self._version = version
         self._base_path = path
         self._current_version_file_parts = []
+        self.bind_to(version.calculate_version())
 
     def get_base_path(self):
         versioned_object_resource = ObjectResourceBuilder.combine_cloud_path(
@@ -5,15 +5,13 @@ from pathlib import Path
 
 import inject
 
+from mycloud.constants import CHUNK_SIZE
 from mycloud.drive.drive_client import DriveClient, EntryType
 from mycloud.drive.common import ls_files_recursively
 from mycloud.drive.exceptions import DriveNotFoundException
 from mycloud.mycloudapi import ObjectResourceBuilder
 
 
-CHUNK_SIZE = 4096
-
-
 class FsDriveClient:
 
     client: DriveClient = inject.attr(DriveClient)
@@ -47,7 +45,7 @@ class FsDriveClient:
 
         async for file in ls_files_recursively(self.client, remote):
             local_path = builder.build_local_file(file.path)
-            await self.download(file.path, local_path)
+            await self.download_file(file.path, local_path)
 
     async def upload(self, local: str, remote: str):
         if os.path.isdir(local):
@@ -69,7 +67,7 @@ class FsDriveClient:
                 break
             await stream.write_async(chunk)
         local_stream.close()
-        stream.close()
+        await stream.close_async()
 
     async def upload_directory(self, local: str, remote: str):
         if not os.path.isdir(local):
@@ -1,7 +1,10 @@
 from mycloud.drive.streamapi.down import DownStreamExecutor
+from mycloud.drive.streamapi.part_size import (BandwidthMeter, align_part_size,
+                                               choose_part_size)
 from mycloud.drive.streamapi.progress_report import ProgressReport, ProgressReporter
 from mycloud.drive.streamapi.stream_accessor import CloudStreamAccessor
 from mycloud.drive.streamapi.stream_object import (CloudStream, DefaultDownStream,
                                                    DefaultUpStream, DownStream,
-                                                   StreamDirection, UpStream)
-from mycloud.drive.streamapi.up import UpStreamExecutor
+                                                   HashingUpStream, StreamDirection,
+                                                   UpStream)
+from mycloud.drive.streamapi.up import PartListener, UpStreamExecutor
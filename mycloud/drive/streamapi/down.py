@@ -1,6 +1,9 @@
+import asyncio
 import time
+from typing import Callable, List
 
-from mycloud.constants import CHUNK_SIZE
+from mycloud.common import raise_failed
+from mycloud.constants import CHUNK_SIZE, NETWORK_CHUNK_SIZE, PART_CONCURRENCY
 from mycloud.mycloudapi import MyCloudRequestExecutor
 from mycloud.mycloudapi.requests.drive import GetObjectRequest
 from mycloud.drive.streamapi.stream_object import StreamDirection
@@ -10,58 +13,156 @@ from mycloud.drive.streamapi.stream_accessor import CloudStreamAccessor
 
 class DownStreamExecutor:
 
-    def __init__(self, request_executor: MyCloudRequestExecutor, progress_reporter: ProgressReporter = None):
+    def __init__(self,
+                 request_executor: MyCloudRequestExecutor,
+                 progress_reporter: ProgressReporter = None,
+                 part_concurrency: int = PART_CONCURRENCY,
+                 part_listener: Callable[[int], None] = None):
+        if part_concurrency < 1:
+            raise ValueError('Part concurrency must be at least one')
         self.request_executor = request_executor
         self.progress_reporter = progress_reporter
+        self.part_concurrency = part_concurrency
+        self.part_listener = part_listener
+        self._tmp_total_read = 0
+        self._tmp_iteration = 0
+        self._tmp_start_time = None
 
-    async def download_stream(self, stream_accessor: CloudStreamAccessor):
-        tmp_total_read = 0
-        tmp_iteration = 0
-        tmp_start_time = time.time()
+    async def download_stream(self, stream_accessor: CloudStreamAccessor, part_files: List[str] = None):
+        self._tmp_total_read = 0
+        self._tmp_iteration = 0
+        self._tmp_start_time = time.time()
 
         file_stream = stream_accessor.get_stream()
         if file_stream.stream_direction != StreamDirection.Down:
             raise ValueError('Invalid stream direction')
 
         current_part_index = file_stream.continued_append_starting_index or 0
+        remaining_parts = part_files[current_part_index:] if part_files else []
+        if self.part_concurrency > 1 and len(remaining_parts) > 1 and file_stream.supports_positional_write():
+            await self._download_parts_concurrently(stream_accessor, remaining_parts, current_part_index)
+        else:
+            await self._download_parts_sequentially(stream_accessor, current_part_index, part_files)
+
+        file_stream.close()
+
+    async def _download_parts_sequentially(self, stream_accessor: CloudStreamAccessor, current_part_index: int, part_files: List[str] = None):
+        file_stream = stream_accessor.get_stream()
         while not file_stream.is_finished():
             for transform in stream_accessor.get_transforms():
                 transform.reset_state()
+                transform.bind(stream_accessor.get_part_binding(current_part_index))
             resource_url = stream_accessor.get_part_file(current_part_index)
             get_request = GetObjectRequest(resource_url)
             response = await self.request_executor.execute(get_request)
             if response.result.status == 404:
+                # a missing part that is listed in the version isn't the end,
+                # the preallocated rest of the file would stay zeroed
+                if part_files and current_part_index < len(part_files):
+                    raise ValueError(f'Part {resource_url} does not exist')
                 file_stream.finished()
                 break
 
-            def _transform_chunk(current_chunk, is_last):
-                nonlocal tmp_total_read
-                nonlocal tmp_iteration
-                nonlocal tmp_start_time
-                for transform in stream_accessor.get_transforms():
-                    current_chunk = transform.down_transform(
-                        current_chunk, last=is_last)
-                file_stream.write(current_chunk)
+            await self._transfer_part(response, resource_url, stream_accessor.get_transforms(), file_stream.write)
+            self._part_done(current_part_index)
+            current_part_index += 1
 
-                tmp_total_read += len(current_chunk)
-                tmp_bps = tmp_total_read / (time.time() - tmp_start_time)
-                tmp_iteration += 10
+    async def _download_parts_concurrently(self, stream_accessor: CloudStreamAccessor, part_files: List[str], first_part_index: int):
+        file_stream = stream_accessor.get_stream()
+        base_offset = file_stream.get_position()
+        # the first part tells where all following parts start, which also
+        # keeps files uploaded with a different part layout readable
+        part_stride = await self._download_part_at(
+            stream_accessor, first_part_index, part_files[0], base_offset)
+        self._part_done(first_part_index)
+        slots = asyncio.Semaphore(self.part_concurrency)
 
-                if self.progress_reporter is not None:
-                    self.progress_reporter.report_progress(ProgressReport(
-                        resource_url, tmp_bps, tmp_iteration, tmp_total_read))
+        async def _download_part(index: int, resource_url: str):
+            try:
+                length = await self._download_part_at(
+                    stream_accessor, first_part_index + index, resource_url, base_offset + index * part_stride)
+                if length != part_stride and index != len(part_files) - 1:
+                    raise ValueError(
+                        f'Part {resource_url} has unexpected length {length}')
+                self._part_done(first_part_index + index)
+            finally:
+                slots.release()
 
-            previous_chunk = None
+        tasks = []
+        try:
+            for index in range(1, len(part_files)):
+                await slots.acquire()
+                raise_failed(tasks)
+                tasks.append(asyncio.ensure_future(
+                    _download_part(index, part_files[index])))
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
 
-            async for chunk in response.result.content.iter_chunked(CHUNK_SIZE):
-                if previous_chunk is None:
-                    previous_chunk = chunk
-                    continue
+        file_stream.finished()
 
-                _transform_chunk(previous_chunk, is_last=False)
-                previous_chunk = chunk
+    async def _download_part_at(self, stream_accessor: CloudStreamAccessor, index: int, resource_url: str, offset: int):
+        file_stream = stream_accessor.get_stream()
+        transforms = [transform.clone()
+                      for transform in stream_accessor.get_transforms()]
+        for transform in transforms:
+            transform.bind(stream_accessor.get_part_binding(index))
+        get_request = GetObjectRequest(resource_url)
+        response = await self.request_executor.execute(get_request)
+        if response.result.status == 404:
+            raise ValueError(f'Part {resource_url} does not exist')
 
-            _transform_chunk(previous_chunk, is_last=True)
-            current_part_index += 1
+        position = offset
 
-        file_stream.close()
+        def _write(chunk):
+            nonlocal position
+            file_stream.write_at(position, chunk)
+            position += len(chunk)
+
+        await self._transfer_part(response, resource_url, transforms, _write)
+        return position - offset
+
+    def _part_done(self, index: int):
+        if self.part_listener is not None:
+            self.part_listener(index)
+
+    async def _transfer_part(self, response, resource_url: str, transforms, write):
+        def _transform_chunk(current_chunk, is_last):
+            for transform in transforms:
+                current_chunk = transform.down_transform(
+                    current_chunk, last=is_last)
+            write(current_chunk)
+
+            self._tmp_total_read += len(current_chunk)
+            tmp_bps = self._tmp_total_read / \
+                (time.time() - self._tmp_start_time)
+            self._tmp_iteration += 10
+
+            if self.progress_reporter is not None:
+                self.progress_reporter.report_progress(ProgressReport(
+                    resource_url, tmp_bps, self._tmp_iteration, self._tmp_total_read))
+
+        # network chunks have arbitrary sizes, transforms get whole blocks of
+        # CHUNK_SIZE and the remainder is held back for the final call. The
+        # block buffer is reused, whatever is written is written right away.
+        block = memoryview(bytearray(CHUNK_SIZE))
+        filled = 0
+
+        try:
+            async for chunk in response.result.content.iter_chunked(NETWORK_CHUNK_SIZE):
+                chunk = memoryview(chunk)
+                while len(chunk) > 0:
+                    if filled == CHUNK_SIZE:
+                        # only a full block followed by more data isn't the last
+                        _transform_chunk(block, is_last=False)
+                        filled = 0
+                    taken = min(len(chunk), CHUNK_SIZE - filled)
+                    block[filled:filled + taken] = chunk[:taken]
+                    filled += taken
+                    chunk = chunk[taken:]
+        finally:
+            response.release()
+
+        _transform_chunk(block[:filled], is_last=True)
@@ -0,0 +1,48 @@
+import threading
+
+from mycloud.constants import (CHUNK_SIZE, MIN_PART_SIZE,
+                               MY_CLOUD_BIG_FILE_CHUNK_SIZE, PART_CONCURRENCY,
+                               PART_TARGET_DURATION)
+
+_BANDWIDTH_SMOOTHING = 0.3
+
+
+class BandwidthMeter:
+
+    def __init__(self):
+        self._bytes_per_second = None
+        self._lock = threading.Lock()
+
+    @property
+    def bytes_per_second(self):
+        return self._bytes_per_second
+
+    def record(self, transferred: int, seconds: float):
+        if transferred <= 0 or seconds <= 0:
+            return
+        measured = transferred / seconds
+        with self._lock:
+            if self._bytes_per_second is None:
+                self._bytes_per_second = measured
+            else:
+                self._bytes_per_second += _BANDWIDTH_SMOOTHING * \
+                    (measured - self._bytes_per_second)
+
+
+def choose_part_size(file_size: int,
+                     bytes_per_second: float = None,
+                     part_concurrency: int = PART_CONCURRENCY) -> int:
+    # enough parts to keep every part job busy
+    part_size = -(-file_size // part_concurrency)
+    if bytes_per_second:
+        # a failed part is retried from its start, keep that cheap
+        part_size = min(part_size, bytes_per_second * PART_TARGET_DURATION)
+    part_size = max(MIN_PART_SIZE, min(MY_CLOUD_BIG_FILE_CHUNK_SIZE, part_size))
+    return align_part_size(part_size)
+
+
+def align_part_size(part_size: int) -> int:
+    # transforms work on whole chunks, so parts have to consist of them
+    if part_size <= 0:
+        raise ValueError('Part size must be positive')
+    return -(-int(part_size) // CHUNK_SIZE) * CHUNK_SIZE
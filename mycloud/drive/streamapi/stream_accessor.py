@@ -10,6 +10,7 @@ class CloudStreamAccessor:
         self._object_resource = object_resource
         self._cloud_stream = cloud_stream
         self._transforms = []
+        self._binding = None
 
     def get_stream(self):
         return self._cloud_stream
@@ -23,6 +24,13 @@ class CloudStreamAccessor:
     def get_base_path(self):
         return self._object_resource
 
+    def bind_to(self, identifier: str):
+        # parts are bound to the identifier and their index
+        self._binding = identifier
+
+    def get_part_binding(self, index: int):
+        return '{}/{}'.format(self._binding or '', index).encode()
+
     def get_part_file(self, index: int):
         formatted_part_index = format(
             index, '0{}d'.format(START_NUMBER_LENGTH))
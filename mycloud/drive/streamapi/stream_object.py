@@ -1,3 +1,6 @@
+import hashlib
+import os
+import stat
 from abc import ABC, abstractmethod
 from enum import Enum
 
@@ -36,6 +39,21 @@ class UpStream(CloudStream):
     def read(self, length: int):
         raise NotImplementedError()
 
+    def supports_positional_read(self):
+        return False
+
+    def read_at(self, offset: int, length: int):
+        raise NotImplementedError()
+
+    def supports_async_read(self):
+        return False
+
+    async def read_async(self, length: int):
+        raise NotImplementedError()
+
+    def get_length(self):
+        return None
+
 
 class DownStream(CloudStream):
 
@@ -46,17 +64,55 @@ class DownStream(CloudStream):
     def write(self, data):
         raise NotImplementedError()
 
+    def supports_positional_write(self):
+        return False
+
+    def write_at(self, offset: int, data):
+        raise NotImplementedError()
+
+    def get_position(self):
+        return None
+
 
 class DefaultDownStream(DownStream):
 
     def __init__(self, stream, continued_append_starting_index: int = 0):
         super().__init__(continued_append_starting_index)
         self._stream = stream
+        self._positional_end = 0
+        self._end = None
 
     def write(self, data):
         self._stream.write(data)
 
+    def supports_positional_write(self):
+        # pwrite ignores the offset for files opened in append mode
+        return hasattr(os, 'pwrite') and \
+            _get_file_descriptor(self._stream) is not None and \
+            'a' not in getattr(self._stream, 'mode', 'a')
+
+    def write_at(self, offset: int, data):
+        file_descriptor = _get_file_descriptor(self._stream)
+        view = memoryview(data)
+        while len(view) > 0:
+            written = os.pwrite(file_descriptor, view, offset)
+            view = view[written:]
+            offset += written
+        self._positional_end = max(self._positional_end, offset)
+
+    def get_position(self):
+        self._stream.flush()
+        return self._stream.tell()
+
+    def get_end(self):
+        # the end of what was written, in order or at positions
+        if self._end is None:
+            return max(self._positional_end, self._stream.tell())
+        return self._end
+
     def close(self):
+        if self._end is None and not getattr(self._stream, 'closed', False):
+            self._end = self.get_end()
         self._stream.close()
 
 
@@ -69,5 +125,64 @@ class DefaultUpStream(UpStream):
     def read(self, length: int):
         return self._stream.read(length)
 
+    def supports_positional_read(self):
+        return hasattr(os, 'pread') and self.get_length() is not None
+
+    def read_at(self, offset: int, length: int):
+        return os.pread(_get_file_descriptor(self._stream), length, offset)
+
+    def get_length(self):
+        file_descriptor = _get_file_descriptor(self._stream)
+        if file_descriptor is None:
+            return None
+        stats = os.fstat(file_descriptor)
+        return stats.st_size if stat.S_ISREG(stats.st_mode) else None
+
     def close(self):
         self._stream.close()
+
+
+class HashingUpStream(DefaultUpStream):
+
+    def __init__(self, stream):
+        super().__init__(stream, 0)
+        self._sha = hashlib.sha256()
+        self.bytes_read = 0
+
+    def read(self, length: int):
+        read_bytes = super().read(length)
+        self._sha.update(read_bytes)
+        self.bytes_read += len(read_bytes)
+        return read_bytes
+
+    def supports_positional_read(self):
+        # the digest is only correct if the file is read front to back
+        return False
+
+    def supports_async_read(self):
+        # e.g. a BytePipe filled by another thread
+        return hasattr(self._stream, 'get_async')
+
+    async def read_async(self, length: int):
+        # like read, only returns less than requested at the end
+        read_bytes = bytearray()
+        while len(read_bytes) < length:
+            data = await self._stream.get_async(length - len(read_bytes))
+            if not data:
+                break
+            read_bytes += data
+        self._sha.update(read_bytes)
+        self.bytes_read += len(read_bytes)
+        return bytes(read_bytes)
+
+    def hexdigest(self):
+        if not self.is_finished():
+            raise ValueError('Stream has not been read completely')
+        return self._sha.hexdigest()
+
+
+def _get_file_descriptor(stream):
+    try:
+        return stream.fileno()
+    except (AttributeError, OSError):
+        return None
@@ -1,2 +1,6 @@
+from mycloud.drive.streamapi.transforms.aes_gcm_transform import \
+    AES256GCMTransform
 from mycloud.drive.streamapi.transforms.aes_transform import AES256CryptoTransform
 from mycloud.drive.streamapi.transforms.stream_transform import StreamTransform
+from mycloud.drive.streamapi.transforms.transform_registry import (
+    CIPHERS, build_cipher_transform, build_transforms)
@@ -0,0 +1,199 @@
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+from Crypto import Random
+from Crypto.Cipher import AES
+
+from mycloud.constants import GCM_RECORD_SIZE, GCM_WORKER_COUNT
+from mycloud.drive.streamapi.transforms.aes_transform import derive_key
+from mycloud.drive.streamapi.transforms.stream_transform import StreamTransform
+
+# random nonce prefix of the part and the plaintext size of its records
+_HEADER = struct.Struct('>8sI')
+_COUNTER = struct.Struct('>I')
+_TAG_SIZE = 16
+_FINAL_RECORD = b'\x01'
+_RECORD = b'\x00'
+
+# the cipher releases the GIL, records of a chunk are sealed on several cores
+_record_pool = ThreadPoolExecutor(GCM_WORKER_COUNT)
+
+
+class AES256GCMTransform(StreamTransform):
+    """
+    Splits every part into records that are encrypted and authenticated on
+    their own, so they can be processed in parallel and read from any
+    record. The last record is bound to its position, which makes a
+    truncated part fail to decrypt, and every record to the context the
+    part is bound to, which makes a swapped part fail.
+    """
+
+    TRANSFORM_NAME = 'aes256_gcm_transform'
+
+    def __init__(self, password: str, record_size: int = GCM_RECORD_SIZE):
+        if record_size < 1:
+            raise ValueError('Record size must be positive')
+        super().__init__(self.TRANSFORM_NAME)
+        self._key = derive_key(password)
+        self._record_size = record_size
+        self._context = b''
+        self.reset_state()
+
+    def bind(self, context: bytes):
+        self._context = bytes(context)
+
+    def reset_state(self):
+        self._nonce_prefix = None
+        self._stream_record_size = None
+        self._header = bytearray()
+        self._record_index = 0
+        # records that are not complete yet
+        self._pending = bytearray()
+        self._finished_last = False
+
+    def get_header_size(self):
+        return _HEADER.size
+
+    def get_record_offset(self, record_index: int):
+        return _HEADER.size + record_index * (self._record_size + _TAG_SIZE)
+
+    def seek(self, header: bytes, record_index: int):
+        # continues decrypting at a record, e.g. after a ranged read starting
+        # at get_record_offset(record_index)
+        self.reset_state()
+        self._read_header(memoryview(header), last=False)
+        self._record_index = record_index
+
+    def get_transformed_length(self, length: int):
+        records, remainder = divmod(length, self._record_size)
+        return _HEADER.size + records * (self._record_size + _TAG_SIZE) + remainder + _TAG_SIZE
+
+    def get_original_length(self, transformed_length: int):
+        sealed = transformed_length - _HEADER.size - _TAG_SIZE
+        if sealed < 0:
+            return None
+        records, remainder = divmod(sealed, self._record_size + _TAG_SIZE)
+        if remainder >= self._record_size:
+            return None
+        return records * self._record_size + remainder
+
+    def up_transform(self, byte_sequence: bytes, last: bool = False):
+        if self._finished_last:
+            return bytes([])
+
+        header = b''
+        if self._nonce_prefix is None:
+            self._nonce_prefix = Random.new().read(_HEADER.size - _COUNTER.size)
+            self._stream_record_size = self._record_size
+            header = _HEADER.pack(self._nonce_prefix, self._record_size)
+
+        records = self._take_records(
+            memoryview(byte_sequence), self._stream_record_size)
+        if last:
+            # always written, possibly empty, so the end can be authenticated
+            records.append(bytes(self._pending))
+            self._pending = bytearray()
+            self._finished_last = True
+
+        output = bytearray(len(header) + sum(len(record) + _TAG_SIZE for record in records))
+        with memoryview(output) as view:
+            view[:len(header)] = header
+            self._process(self._seal, records, _TAG_SIZE, view[len(header):], last)
+        return output
+
+    def down_transform(self, byte_sequence: bytes, last: bool = False):
+        if self._finished_last:
+            return bytes([])
+
+        data = self._read_header(memoryview(byte_sequence), last)
+        if self._nonce_prefix is None:
+            return bytearray()
+
+        # complete records are never the final one, it's always shorter
+        records = self._take_records(
+            data, self._stream_record_size + _TAG_SIZE)
+        if last:
+            if len(self._pending) < _TAG_SIZE:
+                raise ValueError('Encrypted data is truncated')
+            records.append(bytes(self._pending))
+            self._pending = bytearray()
+            self._finished_last = True
+
+        output = bytearray(sum(len(record) - _TAG_SIZE for record in records))
+        with memoryview(output) as view:
+            self._process(self._open, records, -_TAG_SIZE, view, last)
+        return output
+
+    def _read_header(self, data: memoryview, last: bool):
+        if self._nonce_prefix is not None:
+            return data
+        taken = _HEADER.size - len(self._header)
+        self._header += data[:taken]
+        if len(self._header) < _HEADER.size:
+            if last:
+                raise ValueError('Encrypted data is too short')
+            return data[:0]
+        self._nonce_prefix, self._stream_record_size = _HEADER.unpack(self._header)
+        if self._stream_record_size < 1:
+            raise ValueError('Encrypted data has an invalid record size')
+        return data[taken:]
+
+    def _take_records(self, data: memoryview, record_size: int):
+        records = []
+        if self._pending:
+            taken = record_size - len(self._pending)
+            self._pending += data[:taken]
+            data = data[taken:]
+            if len(self._pending) < record_size:
+                return records
+            records.append(bytes(self._pending))
+            self._pending = bytearray()
+
+        aligned = len(data) - len(data) % record_size
+        records.extend(data[offset:offset + record_size]
+                       for offset in range(0, aligned, record_size))
+        self._pending += data[aligned:]
+        return records
+
+    def _process(self, operation, records, size_change: int, output: memoryview, last: bool):
+        tasks = []
+        offset = 0
+        for position, record in enumerate(records):
+            length = len(record) + size_change
+            final = last and position == len(records) - 1
+            tasks.append((self._record_index, record,
+                          output[offset:offset + length], final))
+            self._record_index += 1
+            offset += length
+
+        if len(tasks) < 2 or GCM_WORKER_COUNT < 2:
+            for task in tasks:
+                operation(*task)
+            return
+        groups = [tasks[start::GCM_WORKER_COUNT]
+                  for start in range(min(GCM_WORKER_COUNT, len(tasks)))]
+        # consumed to raise the errors of the workers
+        list(_record_pool.map(
+            lambda group: [operation(*task) for task in group], groups))
+
+    def _seal(self, record_index: int, record, output: memoryview, final: bool):
+        cipher = self._get_cipher(record_index, final)
+        if record:
+            cipher.encrypt(record, output=output[:len(record)])
+        output[len(record):] = cipher.digest()
+
+    def _open(self, record_index: int, record, output: memoryview, final: bool):
+        cipher = self._get_cipher(record_index, final)
+        body_length = len(record) - _TAG_SIZE
+        if body_length:
+            cipher.decrypt(record[:body_length], output=output)
+        cipher.verify(record[body_length:])
+
+    def _get_cipher(self, record_index: int, final: bool):
+        if record_index >= 2 ** (8 * _COUNTER.size):
+            raise ValueError('Too many records in a single part')
+        nonce = self._nonce_prefix + _COUNTER.pack(record_index)
+        cipher = AES.new(self._key, AES.MODE_GCM,
+                         nonce=nonce, mac_len=_TAG_SIZE)
+        cipher.update((_FINAL_RECORD if final else _RECORD) + self._context)
+        return cipher
@@ -1,7 +1,7 @@
 from Crypto import Random
 from Crypto.Cipher import AES
 from Crypto.Hash import SHA256
-from Crypto.Util.py3compat import bchr, bord
+from Crypto.Util.py3compat import bchr
 
 from mycloud.drive.streamapi.transforms.stream_transform import StreamTransform
 
@@ -12,52 +12,119 @@ def derive_key(password: str):
 
 class AES256CryptoTransform(StreamTransform):
 
+    TRANSFORM_NAME = 'aes256_transform'
+
     def __init__(self, password: str):
-        super().__init__('aes256_transform')
+        super().__init__(self.TRANSFORM_NAME)
         self._key = derive_key(password)
-        self._first = True
-        self._finished_last = False
-        self._aes = None
+        self.reset_state()
 
     def reset_state(self):
-        self._first = True
-        self._finished_last = False
         self._aes = None
+        self._initialization_vector = bytearray()
+        # input that doesn't fill a block yet, or the held back final block
+        self._pending = bytearray()
+        self._finished_last = False
+
+    def get_transformed_length(self, length: int):
+        # IV in front, padding adds up to a whole block
+        return AES.block_size + (length // AES.block_size + 1) * AES.block_size
+
+    def get_original_length(self, transformed_length: int):
+        if transformed_length % AES.block_size != 0 or transformed_length < 2 * AES.block_size:
+            return None
+        return transformed_length - 2 * AES.block_size
 
     def up_transform(self, byte_sequence: bytes, last: bool = False):
         if self._finished_last:
             return bytes([])
 
-        # Add padding for message length
+        header = b''
+        if self._aes is None:
+            header = Random.new().read(AES.block_size)
+            self._aes = AES.new(self._key, AES.MODE_CBC, header)
+
+        block, body = self._take_blocks(memoryview(byte_sequence), hold_back=False)
+        final = None
         if last:
-            padding = AES.block_size - len(byte_sequence) % AES.block_size
-            byte_sequence += bchr(padding) * padding
+            # Add padding for message length
+            padding = AES.block_size - len(self._pending)
+            final = bytes(self._pending) + bchr(padding) * padding
+            self._pending = bytearray()
             self._finished_last = True
 
-        if self._first:
-            self._first = False
-            initialization_vector = Random.new().read(AES.block_size)
-            self._aes = AES.new(self._key, AES.MODE_CBC, initialization_vector)
-            return initialization_vector + self._aes.encrypt(byte_sequence)
-
-        return self._aes.encrypt(byte_sequence)
+        output = _allocate(header, block, body, final)
+        with memoryview(output) as view:
+            view[:len(header)] = header
+            offset = len(header)
+            for segment in (block, body, final):
+                if segment:
+                    self._aes.encrypt(segment, output=view[offset:offset + len(segment)])
+                    offset += len(segment)
+        return output
 
     def down_transform(self, byte_sequence: bytes, last: bool = False):
         if self._finished_last:
             return bytes([])
 
-        first = self._first
-        if first:
-            initialization_vector = byte_sequence[:AES.block_size]
-            self._aes = AES.new(self._key, AES.MODE_CBC, initialization_vector)
-            self._first = False
-        decrypted_data = self._aes.decrypt(
-            byte_sequence[AES.block_size:]) if first else self._aes.decrypt(byte_sequence)
+        data = memoryview(byte_sequence)
+        if self._aes is None:
+            taken = AES.block_size - len(self._initialization_vector)
+            self._initialization_vector += data[:taken]
+            data = data[taken:]
+            if len(self._initialization_vector) < AES.block_size:
+                if last:
+                    raise ValueError('Encrypted data is too short')
+                return bytearray()
+            self._aes = AES.new(self._key, AES.MODE_CBC,
+                                bytes(self._initialization_vector))
+
+        # the final block carries the padding, it's only decrypted once it
+        # is known to be the last one
+        block, body = self._take_blocks(data, hold_back=not last)
+        if last and self._pending:
+            raise ValueError('Encrypted data is not a multiple of the block size')
+
+        output = _allocate(b'', block, body)
+        with memoryview(output) as view:
+            offset = 0
+            for segment in (block, body):
+                if segment:
+                    self._aes.decrypt(segment, output=view[offset:offset + len(segment)])
+                    offset += len(segment)
+
         # Cut padding
         if last:
-            padding = bord(decrypted_data[-1])
-            if decrypted_data[-padding:] != bchr(padding) * padding:
+            padding = output[-1] if output else 0
+            if not 0 < padding <= AES.block_size or output[-padding:] != bchr(padding) * padding:
                 raise ValueError('PKCS#7 padding is incorrect')
+            del output[-padding:]
             self._finished_last = True
-            return decrypted_data[:-padding]
-        return decrypted_data
+        return output
+
+    def _take_blocks(self, data: memoryview, hold_back: bool):
+        # returns a block completed from the carried bytes and the block
+        # aligned part of data, which is used without copying it
+        block = None
+        if self._pending:
+            taken = AES.block_size - len(self._pending)
+            self._pending += data[:taken]
+            data = data[taken:]
+            if len(self._pending) < AES.block_size:
+                return None, data
+            block = bytes(self._pending)
+            self._pending = bytearray()
+
+        aligned = len(data) - len(data) % AES.block_size
+        if hold_back and aligned == len(data):
+            if aligned > 0:
+                aligned -= AES.block_size
+            elif block is not None:
+                self._pending = bytearray(block)
+                return None, data
+        self._pending += data[aligned:]
+        return block, data[:aligned]
+
+
+def _allocate(header: bytes, *segments):
+    return bytearray(len(header) + sum(len(segment) for segment in segments if segment))
@@ -1,3 +1,4 @@
+import copy
 from abc import ABC, abstractmethod
 
 
@@ -12,6 +13,37 @@ class StreamTransform(ABC):
     def get_name(self):
         return self._name
 
+    def clone(self):
+        """
+        Returns an independent transform with fresh state, e.g. to transform
+        several parts of a file at the same time.
+        """
+        cloned = copy.copy(self)
+        cloned.reset_state()
+        return cloned
+
+    def get_transformed_length(self, length: int):
+        """
+        Returns the length up_transform makes of length bytes, None if it
+        isn't known.
+        """
+        return None
+
+    def get_original_length(self, transformed_length: int):
+        """
+        Returns the length of block aligned input that up_transform turns
+        into transformed_length bytes, None if there is none or it isn't
+        known.
+        """
+        return None
+
+    def bind(self, context: bytes):
+        """
+        Ties the data transformed next to context, e.g. the part of the file
+        it is stored in. Transforms that don't authenticate ignore it.
+        """
+        pass
+
     @abstractmethod
     def reset_state(self):
         raise NotImplementedError()
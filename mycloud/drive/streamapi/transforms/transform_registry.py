@@ -0,0 +1,33 @@
+from typing import List
+
+from mycloud.drive.streamapi.transforms.aes_gcm_transform import \
+    AES256GCMTransform
+from mycloud.drive.streamapi.transforms.aes_transform import \
+    AES256CryptoTransform
+from mycloud.drive.streamapi.transforms.stream_transform import StreamTransform
+
+CIPHERS = {
+    'cbc': AES256CryptoTransform,
+    'gcm': AES256GCMTransform
+}
+
+# versions only record the names of their transforms
+_TRANSFORMS = {transform.TRANSFORM_NAME: transform for transform in CIPHERS.values()}
+
+
+def build_cipher_transform(cipher: str, password: str) -> StreamTransform:
+    if cipher not in CIPHERS:
+        raise ValueError('Unknown cipher {}, expected one of {}'.format(
+            cipher, ', '.join(CIPHERS)))
+    return CIPHERS[cipher](password)
+
+
+def build_transforms(names: List[str], password: str = None) -> List[StreamTransform]:
+    transforms = []
+    for name in names:
+        if name not in _TRANSFORMS:
+            raise ValueError('Unknown transform {}'.format(name))
+        if password is None:
+            raise ValueError('A password is required to read {} data'.format(name))
+        transforms.append(_TRANSFORMS[name](password))
+    return transforms
@@ -1,8 +1,11 @@
+import asyncio
 import time
+from typing import Callable, Optional
 
-from mycloud.common import operation_timeout
-from mycloud.constants import (CHUNK_SIZE,
-                               MY_CLOUD_BIG_FILE_CHUNK_SIZE)
+from mycloud.common import TimeoutException, operation_timeout, raise_failed
+from mycloud.constants import (CHUNK_SIZE, MAX_TIMEOUT,
+                               MY_CLOUD_BIG_FILE_CHUNK_SIZE,
+                               PART_CONCURRENCY)
 from mycloud.mycloudapi import MyCloudRequestExecutor
 from mycloud.mycloudapi.requests.drive import PutObjectRequest
 from mycloud.drive.streamapi import StreamDirection, UpStream
@@ -10,16 +13,31 @@ from mycloud.drive.streamapi.progress_report import ProgressReport, ProgressRepo
 from mycloud.drive.streamapi.stream_accessor import CloudStreamAccessor
 
 
+# called with the part index, part file, uploaded length and ETag
+PartListener = Callable[[int, str, int, Optional[str]], None]
+
+
 class UpStreamExecutor:
 
-    def __init__(self, request_executor: MyCloudRequestExecutor, progress_reporter: ProgressReporter = None):
+    def __init__(self,
+                 request_executor: MyCloudRequestExecutor,
+                 progress_reporter: ProgressReporter = None,
+                 part_concurrency: int = PART_CONCURRENCY,
+                 part_listener: PartListener = None,
+                 part_size: int = MY_CLOUD_BIG_FILE_CHUNK_SIZE):
+        if part_concurrency < 1:
+            raise ValueError('Part concurrency must be at least one')
+        if part_size < 1:
+            raise ValueError('Part size must be positive')
         self.request_executor = request_executor
         self.progress_reporter = progress_reporter
+        self.part_concurrency = part_concurrency
+        self.part_size = part_size
+        self.part_listener = part_listener
         self._tmp_total_read = 0
         self._tmp_bps = 0
         self._tmp_iteration = 0
         self._tmp_start_time = None
-        self._tmp_current_object_resource = 0
 
     async def upload_stream(self, stream_accessor: CloudStreamAccessor):
         self._tmp_total_read = 0
@@ -34,61 +52,168 @@ class UpStreamExecutor:
         current_part_index = file_stream.continued_append_starting_index or 0
         if current_part_index < 0:
             raise ValueError('Part index cannot be negative')
+
+        if self.part_concurrency > 1 and file_stream.supports_positional_read():
+            await self._upload_parts_concurrently(stream_accessor, current_part_index)
+        else:
+            await self._upload_parts_sequentially(stream_accessor, current_part_index)
+
+        file_stream.close()
+
+    async def _upload_parts_sequentially(self, stream_accessor: CloudStreamAccessor, current_part_index: int):
+        file_stream = stream_accessor.get_stream()
         while not file_stream.is_finished():
             for transform in stream_accessor.get_transforms():
                 transform.reset_state()
-            generator = self._get_generator(
-                file_stream, MY_CLOUD_BIG_FILE_CHUNK_SIZE, applied_transforms=stream_accessor.get_transforms())
+                transform.bind(stream_accessor.get_part_binding(current_part_index))
             upload_to = stream_accessor.get_part_file(current_part_index)
-            self._tmp_current_object_resource = upload_to
-            part_put_request = PutObjectRequest(upload_to, generator)
-            _ = await self.request_executor.execute(part_put_request)
+            if file_stream.supports_async_read():
+                generator = self._get_async_generator(
+                    file_stream, upload_to, self.part_size, applied_transforms=stream_accessor.get_transforms())
+            else:
+                generator = self._get_generator(
+                    file_stream, upload_to, self.part_size, applied_transforms=stream_accessor.get_transforms())
+            await self._put_part(current_part_index, upload_to, generator)
             current_part_index += 1
 
-        file_stream.close()
-
-    def _get_generator(self, stream: UpStream, max_length=None, applied_transforms=None):
+    async def _upload_parts_concurrently(self, stream_accessor: CloudStreamAccessor, first_part_index: int):
+        file_stream = stream_accessor.get_stream()
+        part_size = self.part_size
+        # an empty file is still stored as a single (empty) part
+        part_count = max(1, -(-file_stream.get_length() // part_size))
+        slots = asyncio.Semaphore(self.part_concurrency)
+
+        async def _upload_part(index: int, upload_to: str):
+            def generator():
+                # a retried part is read again with fresh transform state
+                transforms = [transform.clone()
+                              for transform in stream_accessor.get_transforms()]
+                for transform in transforms:
+                    transform.bind(stream_accessor.get_part_binding(index))
+                return self._get_positional_generator(
+                    file_stream, upload_to, index * part_size, part_size, transforms)
+
+            try:
+                await self._put_part(index, upload_to, generator)
+            finally:
+                slots.release()
+
+        tasks = []
+        try:
+            for index in range(first_part_index, part_count):
+                await slots.acquire()
+                raise_failed(tasks)
+                # parts are registered in index order, independent of upload order
+                upload_to = stream_accessor.get_part_file(index)
+                tasks.append(asyncio.ensure_future(
+                    _upload_part(index, upload_to)))
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        file_stream.finished()
+
+    async def _put_part(self, index: int, upload_to: str, generator):
+        sent = 0
+
+        def counted():
+            nonlocal sent
+            sent = 0
+            for chunk in generator() if callable(generator) else generator:
+                sent += len(chunk)
+                yield chunk
+
+        async def counted_async():
+            nonlocal sent
+            async for chunk in generator:
+                sent += len(chunk)
+                yield chunk
+
+        # a body factory stays one, so the part can still be retried
+        if hasattr(generator, '__aiter__'):
+            body = counted_async()
+        else:
+            body = counted if callable(generator) else counted()
+        response = await self.request_executor.execute(PutObjectRequest(upload_to, body))
+        if not 200 <= response.result.status < 300:
+            raise ValueError(
+                f'Failed to upload part {upload_to} (status {response.result.status})')
+        if self.part_listener is not None:
+            self.part_listener(index, upload_to, sent,
+                               response.result.headers.get('ETag'))
+
+    def _get_generator(self, stream: UpStream, object_resource: str, max_length: int, applied_transforms=None):
         total_read = 0
-        break_execution = False
-        stream_finished = False
 
         while True:
-            read_bytes = None
-            if break_execution:
-                read_bytes = bytes([])
-            else:
-                read_bytes = UpStreamExecutor._safe_file_stream_read(
-                    stream, CHUNK_SIZE)
+            read_length = min(CHUNK_SIZE, max_length - total_read)
+            read_bytes = UpStreamExecutor._safe_file_stream_read(
+                stream, read_length)
+            total_read += len(read_bytes)
+
+            stream_finished = len(read_bytes) < read_length
+            last = stream_finished or total_read >= max_length
+            yield self._transform_chunk(read_bytes, last, object_resource, applied_transforms)
 
-            if (len(read_bytes) < CHUNK_SIZE or read_bytes == b'' or read_bytes is None) and not break_execution:
-                stream_finished = True
+            if stream_finished:
+                stream.finished()
+            if last:
+                break
 
-            if applied_transforms is not None:
-                for transform in applied_transforms:
-                    read_bytes = transform.up_transform(
-                        read_bytes, last=stream_finished or break_execution)
+    async def _get_async_generator(self, stream: UpStream, object_resource: str, max_length: int, applied_transforms=None):
+        # same parts as _get_generator, without blocking the loop on reads
+        total_read = 0
+
+        while True:
+            read_length = min(CHUNK_SIZE, max_length - total_read)
+            try:
+                read_bytes = await asyncio.wait_for(stream.read_async(read_length), MAX_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise TimeoutException
+            total_read += len(read_bytes)
 
-            yield read_bytes
+            stream_finished = len(read_bytes) < read_length
+            last = stream_finished or total_read >= max_length
+            yield self._transform_chunk(read_bytes, last, object_resource, applied_transforms)
 
             if stream_finished:
                 stream.finished()
+            if last:
                 break
 
-            if break_execution:
+    def _get_positional_generator(self, stream: UpStream, object_resource: str, offset: int, max_length: int, applied_transforms=None):
+        position = offset
+        end = offset + max_length
+
+        while True:
+            read_length = min(CHUNK_SIZE, end - position)
+            read_bytes = UpStreamExecutor._safe_positional_read(
+                stream, position, read_length)
+            position += len(read_bytes)
+
+            last = len(read_bytes) < read_length or position >= end
+            yield self._transform_chunk(read_bytes, last, object_resource, applied_transforms)
+
+            if last:
                 break
 
-            total_read += len(read_bytes)
-            if total_read > max_length if max_length is not None else False:
-                break_execution = True
+    def _transform_chunk(self, read_bytes: bytes, last: bool, object_resource: str, applied_transforms):
+        read_length = len(read_bytes)
+        if applied_transforms is not None:
+            for transform in applied_transforms:
+                read_bytes = transform.up_transform(read_bytes, last=last)
 
-            self._tmp_total_read += len(read_bytes)
-            self._tmp_iteration += 1
-            self._tmp_bps = self._tmp_total_read / \
-                (time.time() - self._tmp_start_time)
+        self._tmp_total_read += read_length
+        self._tmp_iteration += 1
+        self._tmp_bps = self._tmp_total_read / \
+            (time.time() - self._tmp_start_time)
 
-            if self.progress_reporter is not None:
-                self.progress_reporter.report_progress(ProgressReport(
-                    self._tmp_current_object_resource, self._tmp_bps, self._tmp_iteration, self._tmp_total_read))
+        if self.progress_reporter is not None:
+            self.progress_reporter.report_progress(ProgressReport(
+                object_resource, self._tmp_bps, self._tmp_iteration, self._tmp_total_read))
+        return read_bytes
 
     @staticmethod
     def _safe_file_stream_read(file_stream, length=None):
@@ -97,3 +222,8 @@ class UpStreamExecutor:
                 return values['stream'].read()
             return values['stream'].read(values['len'])
         return operation_timeout(read_safe, stream=file_stream, len=length)
+
+    @staticmethod
+    def _safe_positional_read(file_stream: UpStream, offset: int, length: int):
+        return operation_timeout(lambda x: x['stream'].read_at(x['offset'], x['len']),
+                                 stream=file_stream, offset=offset, len=length)
@@ -0,0 +1,72 @@
+import asyncio
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Optional, Tuple, Union
+
+from mycloud.constants import TREE_WALK_CONCURRENCY
+from mycloud.mycloudapi.requests.drive import (DirEntry, FileEntry,
+                                               MyCloudMetadata)
+
+Lister = Callable[[str], Awaitable[Optional[MyCloudMetadata]]]
+
+
+class TreeWalker:
+
+    def __init__(self,
+                 lister: Lister,
+                 jobs: int = TREE_WALK_CONCURRENCY,
+                 max_depth: int = None,
+                 prefix: str = None,
+                 expand: Callable[[MyCloudMetadata], bool] = None):
+        if jobs < 1:
+            raise ValueError('At least one job is required')
+        self._lister = lister
+        self._jobs = jobs
+        self._max_depth = max_depth
+        self._prefix = prefix
+        self._expand = expand
+
+    async def walk(self, root: str) -> AsyncIterator[Union[FileEntry, DirEntry]]:
+        async for _, metadata in self.walk_listings(root):
+            for directory in metadata.dirs:
+                if self._matches_prefix(directory.path):
+                    yield directory
+            for file in metadata.files:
+                if self._matches_prefix(file.path):
+                    yield file
+
+    async def walk_listings(self, root: str) -> AsyncIterator[Tuple[int, MyCloudMetadata]]:
+        pending = deque([(root, 0)])
+        running = {}
+        try:
+            while pending or running:
+                while pending and len(running) < self._jobs:
+                    path, depth = pending.popleft()
+                    running[asyncio.ensure_future(self._lister(path))] = depth
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    depth = running.pop(task)
+                    metadata = task.result()
+                    # directories may vanish while the tree is walked
+                    if metadata is None:
+                        continue
+                    if self._should_descend(metadata, depth):
+                        pending.extend((directory.path, depth + 1)
+                                       for directory in metadata.dirs
+                                       if self._leads_to_prefix(directory.path))
+                    yield depth, metadata
+        finally:
+            for task in running:
+                task.cancel()
+
+    def _should_descend(self, metadata: MyCloudMetadata, depth: int):
+        if self._max_depth is not None and depth >= self._max_depth:
+            return False
+        return self._expand is None or self._expand(metadata)
+
+    def _matches_prefix(self, path: str):
+        return self._prefix is None or path.startswith(self._prefix)
+
+    def _leads_to_prefix(self, path: str):
+        if self._prefix is None:
+            return True
+        return path.startswith(self._prefix) or self._prefix.startswith(path)
@@ -1,3 +1,6 @@
+from mycloud.mycloudapi.concurrency_controller import (AdaptiveLimiter,
+                                                      ConcurrencyController)
 from mycloud.mycloudapi.object_resource_builder import ObjectResourceBuilder
 from mycloud.mycloudapi.request_executor import MyCloudRequestExecutor
 from mycloud.mycloudapi.response import MyCloudResponse
+from mycloud.mycloudapi.retry_policy import RetryBudget, RetryPolicy
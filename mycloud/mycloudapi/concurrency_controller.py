@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, Dict
+
+from mycloud.constants import (CONCURRENCY_DECREASE_FACTOR,
+                               CONCURRENCY_LATENCY_TOLERANCE,
+                               DATA_CONCURRENCY_INITIAL, DATA_CONCURRENCY_MAX,
+                               METADATA_CONCURRENCY_INITIAL,
+                               METADATA_CONCURRENCY_MAX)
+from mycloud.mycloudapi.requests import TrafficClass
+
+_LATENCY_SMOOTHING = 0.2
+
+
+class AdaptiveLimiter:
+
+    def __init__(self,
+                 initial: int,
+                 maximum: int,
+                 minimum: int = 1,
+                 decrease_factor: float = CONCURRENCY_DECREASE_FACTOR,
+                 latency_tolerance: float = CONCURRENCY_LATENCY_TOLERANCE,
+                 clock: Callable[[], float] = time.monotonic):
+        if not 1 <= minimum <= initial <= maximum:
+            raise ValueError('Limits must satisfy 1 <= minimum <= initial <= maximum')
+        self._limit = float(initial)
+        self._minimum = minimum
+        self._maximum = maximum
+        self._decrease_factor = decrease_factor
+        self._latency_tolerance = latency_tolerance
+        self._clock = clock
+        self._in_flight = 0
+        self._latency = None
+        self._min_latency = None
+        self._last_decrease = None
+        # the executor is shared by several loops, so is the limit
+        self._lock = threading.Lock()
+        self._async_waiters = []
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def acquire(self):
+        while True:
+            with self._lock:
+                if self._in_flight < self.limit:
+                    self._in_flight += 1
+                    return
+                loop = asyncio.get_event_loop()
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            await waiter
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+            self._notify_locked()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def record_success(self, latency: float):
+        with self._lock:
+            if self._latency is None:
+                self._latency = latency
+            else:
+                self._latency += _LATENCY_SMOOTHING * (latency - self._latency)
+            if self._min_latency is None or latency < self._min_latency:
+                self._min_latency = latency
+            # growing latency means queues are building up, hold the limit
+            if self._latency > self._min_latency * self._latency_tolerance:
+                return
+            # additive increase: about one more request per full window
+            self._limit = min(self._maximum, self._limit + 1 / self._limit)
+            self._notify_locked()
+
+    def record_throttled(self):
+        with self._lock:
+            now = self._clock()
+            # rejections of requests sent in the same round trip are a
+            # single signal, only back off once for them
+            if self._last_decrease is not None and now - self._last_decrease < (self._latency or 0):
+                return
+            self._last_decrease = now
+            self._limit = max(self._minimum, self._limit * self._decrease_factor)
+
+    def _notify_locked(self):
+        for loop, waiter in self._async_waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+        self._async_waiters = []
+
+
+class ConcurrencyController:
+
+    def __init__(self, limiters: Dict[TrafficClass, AdaptiveLimiter] = None):
+        self._limiters = limiters or {
+            TrafficClass.Metadata: AdaptiveLimiter(METADATA_CONCURRENCY_INITIAL, METADATA_CONCURRENCY_MAX),
+            TrafficClass.Data: AdaptiveLimiter(DATA_CONCURRENCY_INITIAL, DATA_CONCURRENCY_MAX)
+        }
+
+    def get_limiter(self, traffic_class: TrafficClass) -> AdaptiveLimiter:
+        return self._limiters[traffic_class]
+
+
+def _wake(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
@@ -1,5 +1,8 @@
 import base64
+import codecs
 import io
+import json
+from typing import AsyncIterable
 
 
 def get_object_id(string: str):
@@ -25,3 +28,55 @@ def generator_to_stream(generator, buffer_size=io.DEFAULT_BUFFER_SIZE):
             except StopIteration:
                 return 0
     return io.BufferedReader(GeneratorStream())
+
+
+async def generator_to_async(generator):
+    # aiohttp only streams async iterables, chunks are produced on the loop
+    for chunk in generator:
+        yield chunk
+
+
+async def iterate_json_array(chunks: AsyncIterable[bytes]):
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    position = 0
+    started = False
+    finished = False
+    chunk_iterator = chunks.__aiter__()
+
+    while not finished:
+        try:
+            chunk = await chunk_iterator.__anext__()
+            buffer = buffer[position:] + text_decoder.decode(chunk)
+        except StopAsyncIteration:
+            buffer = buffer[position:] + text_decoder.decode(b'', final=True)
+            finished = True
+        position = 0
+
+        while True:
+            while position < len(buffer) and (buffer[position].isspace() or buffer[position] == ','):
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != '[':
+                    raise ValueError('Expected a JSON array')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if finished:
+                    raise
+                break
+            # a number at the very end of the buffer might still go on
+            if end == len(buffer) and not finished:
+                break
+            position = end
+            yield item
+
+    raise ValueError('Unterminated JSON array')
@@ -1,25 +1,106 @@
 import io
+import time
 import logging
-from time import sleep
+from threading import Lock
 
 import asyncio
 import aiohttp
 
 from mycloud import __version__
 from mycloud.common import merge_url_query_params
-from mycloud.constants import WAIT_TIME_MULTIPLIER
+from mycloud.constants import (HTTP_CONNECTION_LIMIT,
+                               HTTP_CONNECTION_LIMIT_PER_HOST,
+                               HTTP_DNS_CACHE_TTL, HTTP_KEEPALIVE_TIMEOUT,
+                               NETWORK_CHUNK_SIZE)
 from mycloud.mycloudapi.auth import AuthMode, MyCloudAuthenticator
+from mycloud.mycloudapi.concurrency_controller import (AdaptiveLimiter,
+                                                       ConcurrencyController)
 from mycloud.mycloudapi.requests import ContentType, Method, MyCloudRequest
 from mycloud.mycloudapi.response import MyCloudResponse
-from mycloud.mycloudapi.helper import generator_to_stream
+from mycloud.mycloudapi.retry_policy import RetryPolicy
+from mycloud.mycloudapi.helper import generator_to_async
 
 
 class MyCloudRequestExecutor:
 
-    def __init__(self, mycloud_authenticator: MyCloudAuthenticator):
+    def __init__(self,
+                 mycloud_authenticator: MyCloudAuthenticator,
+                 connection_limit: int = HTTP_CONNECTION_LIMIT,
+                 connection_limit_per_host: int = HTTP_CONNECTION_LIMIT_PER_HOST,
+                 dns_cache_ttl: int = HTTP_DNS_CACHE_TTL,
+                 keepalive_timeout: float = HTTP_KEEPALIVE_TIMEOUT,
+                 retry_policy: RetryPolicy = None,
+                 concurrency_controller: ConcurrencyController = None):
         self.authenticator = mycloud_authenticator
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.concurrency_controller = concurrency_controller or ConcurrencyController()
+        self._connection_limit = connection_limit
+        self._connection_limit_per_host = connection_limit_per_host
+        self._dns_cache_ttl = dns_cache_ttl
+        self._keepalive_timeout = keepalive_timeout
+        # aiohttp sessions are bound to the loop they were created on,
+        # so each loop (e.g. the WebDAV worker loop) gets its own pool
+        self._sessions = dict()
+        self._sessions_lock = Lock()
 
     async def execute(self, request: MyCloudRequest) -> MyCloudResponse:
+        attempt = 0
+        while True:
+            try:
+                response, on_release = await self._send_limited(request)
+            except aiohttp.client_exceptions.ClientConnectionError:
+                if not self.retry_policy.allow_retry(request, attempt):
+                    raise
+                delay = self.retry_policy.get_delay(attempt)
+                logging.info(f'Connection Error. Retrying in {delay:.1f}s...')
+            else:
+                logging.debug(f'Received status code {response.status}')
+                delay = self._get_retry_delay(request, response, attempt)
+                if delay is None:
+                    if response.status < 400:
+                        self.retry_policy.record_success()
+                    mycloud_response = MyCloudResponse(
+                        request, response, on_release)
+                    logging.debug(
+                        f'Returning MyCloudResponse {mycloud_response}')
+                    return mycloud_response
+                response.release()
+                if on_release is not None:
+                    on_release()
+                logging.info(
+                    f'Retrying request {request} after status {response.status} in {delay:.1f}s')
+
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def _send_limited(self, request: MyCloudRequest):
+        limiter = self.concurrency_controller.get_limiter(
+            request.get_traffic_class())
+        await limiter.acquire()
+        started = time.monotonic()
+        try:
+            response = await self._send(request)
+        except aiohttp.client_exceptions.ClientConnectionError:
+            limiter.record_throttled()
+            limiter.release()
+            raise
+        except BaseException:
+            limiter.release()
+            raise
+        if self.retry_policy.is_retryable_status(response.status):
+            limiter.record_throttled()
+        elif request.holds_slot_for_body() and response.status < 300:
+            # the slot is held until the body is read or released, so the
+            # limit applies to the transfers themselves
+            on_release = _release_after_body(limiter, started, response.content_length)
+            response.content.on_eof(on_release)
+            return response, on_release
+        else:
+            limiter.record_success(time.monotonic() - started)
+        limiter.release()
+        return response, None
+
+    async def _send(self, request: MyCloudRequest) -> aiohttp.ClientResponse:
         auth_token = await self.authenticator.get_token()
 
         logging.info(f'Executing request {request}')
@@ -27,54 +108,66 @@ class MyCloudRequestExecutor:
         headers = MyCloudRequestExecutor._get_headers(
             request.get_content_type(), auth_token, request.get_additional_headers())
 
-        session = aiohttp.ClientSession(
-            headers=headers, timeout=aiohttp.ClientTimeout(total=None))
+        session = self._get_session()
         request_url = MyCloudRequestExecutor._get_request_url(
             request, auth_token)
 
         method = request.get_method()
-        response: aiohttp.ClientResponse = None
-
-        try:
-            if method == Method.GET:
-                response = await MyCloudRequestExecutor._execute_get(session, request, request_url)
-            elif method == Method.PUT:
-                response = await MyCloudRequestExecutor._execute_put(session, request, request_url)
-            elif method == Method.DELETE:
-                response = await MyCloudRequestExecutor._execute_delete(session, request_url)
-            else:
-                raise ValueError(f'Request contains invalid method {method}')
-        except aiohttp.client_exceptions.ClientConnectionError:
-            logging.info(f'Connection Error. Retrying...')
-            return await self.execute(request)
-
-        logging.debug(f'Received status code {response.status}')
-
-        if self._check_retry(response):
-            logging.info(f'Retrying request at {request_url}')
-            return await self.execute(request)
-
-        mycloud_response = MyCloudResponse(request, response)
-        logging.debug(f'Returning MyCloudResponse {mycloud_response}')
-        return mycloud_response
+        if method == Method.GET:
+            response = await MyCloudRequestExecutor._execute_get(session, request, request_url, headers)
+        elif method == Method.PUT:
+            response = await MyCloudRequestExecutor._execute_put(session, request, request_url, headers)
+        elif method == Method.DELETE:
+            response = await MyCloudRequestExecutor._execute_delete(session, request_url, headers)
+        else:
+            raise ValueError(f'Request contains invalid method {method}')
+        if method != Method.GET:
+            # bodies of non-GET responses are small, reading them eagerly
+            # hands the connection back to the pool right away
+            await response.read()
+        return response
+
+    async def close(self):
+        loop = asyncio.get_event_loop()
+        with self._sessions_lock:
+            session = self._sessions.pop(loop, None)
+        if session is not None and not session.closed:
+            await session.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_event_loop()
+        with self._sessions_lock:
+            session = self._sessions.get(loop)
+            if session is None or session.closed:
+                connector = aiohttp.TCPConnector(
+                    limit=self._connection_limit,
+                    limit_per_host=self._connection_limit_per_host,
+                    ttl_dns_cache=self._dns_cache_ttl,
+                    keepalive_timeout=self._keepalive_timeout)
+                session = aiohttp.ClientSession(
+                    connector=connector, timeout=aiohttp.ClientTimeout(total=None))
+                self._sessions[loop] = session
+            return session
 
     @staticmethod
-    async def _execute_get(session: aiohttp.ClientSession, request: MyCloudRequest, request_url: str):
+    async def _execute_get(session: aiohttp.ClientSession, request: MyCloudRequest, request_url: str, headers: dict):
         if request.get_data_generator() is not None:
             raise ValueError('Cannot use data generator with GET request')
-        return await session.get(request_url)
+        return await session.get(request_url, headers=headers)
 
     @staticmethod
-    async def _execute_put(session: aiohttp.ClientSession, request: MyCloudRequest, request_url: str):
+    async def _execute_put(session: aiohttp.ClientSession, request: MyCloudRequest, request_url: str, headers: dict):
         generator = request.get_data_generator()
         if generator:
             logging.debug(f'Executing put request with generator...')
-            return await session.put(request_url, data=generator)
-        return await session.put(request_url)
+            if not hasattr(generator, '__aiter__'):
+                generator = generator_to_async(generator)
+            return await session.put(request_url, data=generator, headers=headers)
+        return await session.put(request_url, headers=headers)
 
     @staticmethod
-    async def _execute_delete(session: aiohttp.ClientSession, request_url: str):
-        return await session.delete(request_url)
+    async def _execute_delete(session: aiohttp.ClientSession, request_url: str, headers: dict):
+        return await session.delete(request_url, headers=headers)
 
     @staticmethod
     def _get_request_url(request: MyCloudRequest, auth_token: str) -> str:
@@ -97,13 +190,34 @@ class MyCloudRequestExecutor:
 
         return headers
 
-    def _check_retry(self, response):
-        retry = False
+    def _get_retry_delay(self, request: MyCloudRequest, response, attempt: int):
         if response.status == 401:
             if self.authenticator.auth_mode == AuthMode.Token:
                 raise ValueError('Bearer token is invalid')
 
             self.authenticator.invalidate_token()
-            retry = True
-
-        return retry
+            # a fresh token is all it takes, no need to back off
+            return 0 if self.retry_policy.allow_retry(request, attempt) else None
+
+        if not self.retry_policy.is_retryable_status(response.status):
+            return None
+        if not self.retry_policy.allow_retry(request, attempt):
+            return None
+        retry_after = RetryPolicy.parse_retry_after(
+            response.headers.get('Retry-After'))
+        return self.retry_policy.get_delay(attempt, retry_after)
+
+
+def _release_after_body(limiter: AdaptiveLimiter, started: float, content_length: int = None):
+    released = False
+
+    def on_release():
+        nonlocal released
+        if released:
+            return
+        released = True
+        # bodies have all sizes, the time per network chunk is comparable
+        chunks = max(1, (content_length or 0) / NETWORK_CHUNK_SIZE)
+        limiter.record_success((time.monotonic() - started) / chunks)
+        limiter.release()
+    return on_release
@@ -1 +1 @@
-from mycloud.mycloudapi.requests.request import MyCloudRequest, Method, ContentType
+from mycloud.mycloudapi.requests.request import MyCloudRequest, Method, ContentType, TrafficClass
@@ -1,4 +1,5 @@
 from mycloud.mycloudapi.requests.drive.change_request import ChangeRequest
+from mycloud.mycloudapi.requests.drive.copy_request import CopyRequest
 from mycloud.mycloudapi.requests.drive.directory_list_request import (
     DirectoryListRequest, ListType)
 from mycloud.mycloudapi.requests.drive.metadata_request import MetadataRequest, MyCloudMetadata, FileEntry, DirEntry
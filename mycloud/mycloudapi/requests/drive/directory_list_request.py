@@ -3,7 +3,8 @@ from enum import Enum
 from time import time
 
 from mycloud.common import sanitize_path
-from mycloud.mycloudapi.helper import get_object_id
+from mycloud.constants import NETWORK_CHUNK_SIZE
+from mycloud.mycloudapi.helper import get_object_id, iterate_json_array
 from mycloud.mycloudapi.requests import Method, MyCloudRequest
 
 REQUEST_URL = 'https://storage.prod.mdl.swisscom.ch/sync/list?p={}&$type={}&nocache={}'
@@ -41,31 +42,31 @@ class DirectoryListRequest(MyCloudRequest):
         unix_time = int(time())
         return REQUEST_URL.format(resource, list_type, unix_time)
 
-    async def format_response(self, response):
-        if response.status_code == 404:
-            if not self._ignore_404:
-                raise ConnectionError('404')
-            return []
-        text = await response.text()
-        return DirectoryListRequest._json_generator(text)
+    @staticmethod
+    async def format_response(response):
+        if response.status == 404:
+            # a missing directory has nothing to list
+            return _no_chunks()
+        # the listing of a large tree is huge, items are parsed as they arrive
+        return iterate_json_array(response.content.iter_chunked(NETWORK_CHUNK_SIZE))
 
     @staticmethod
-    def is_timeout(response):
-        if response is None:
+    async def is_timeout(response):
+        if response is None or response.status != 500:
             return False
         timeout = 'Operation exceeded time limit.'
         error_key = 'error'
-        if timeout not in response.text:
+        text = await response.text()
+        if timeout not in text:
             return False
 
-        error_dic = json.loads(response.text)
-        if response.status_code != 500 or error_key not in error_dic:
+        try:
+            error_dic = json.loads(text)
+        except ValueError:
             return False
+        return isinstance(error_dic, dict) and error_key in error_dic and timeout in error_dic[error_key]
 
-        return timeout in error_dic[error_key]
 
-    @staticmethod
-    def _json_generator(string: str):
-        loaded = json.loads(string)
-        for item in loaded:
-            yield item
+async def _no_chunks():
+    return
+    yield
@@ -1,8 +1,10 @@
 from abc import abstractmethod
+from typing import Optional, Tuple
 
 from mycloud.common import sanitize_path
 from mycloud.mycloudapi.helper import get_object_id
-from mycloud.mycloudapi.requests import ContentType, Method, MyCloudRequest
+from mycloud.mycloudapi.requests import (ContentType, Method, MyCloudRequest,
+                                        TrafficClass)
 
 REQUEST_URL = 'https://storage.prod.mdl.swisscom.ch/object?p='
 
@@ -23,28 +25,57 @@ class ObjectRequest(MyCloudRequest):
 
 class PutObjectRequest(ObjectRequest):
 
-    def __init__(self, object_resource: str, generator, is_dir):
+    def __init__(self, object_resource: str, generator, is_dir=False):
         super().__init__(object_resource, is_dir)
+        # either a generator, which can only be sent once, or a function
+        # creating a fresh generator for every attempt
         self.generator = generator
 
     def get_method(self):
         return Method.PUT
 
     def get_data_generator(self):
+        if callable(self.generator):
+            return self.generator()
         return self.generator
 
+    def is_rewindable(self):
+        return self.generator is None or callable(self.generator)
+
     def get_content_type(self):
         return ContentType.APPLICATION_OCTET_STREAM
 
+    def get_traffic_class(self):
+        return TrafficClass.Data
+
 
 class GetObjectRequest(ObjectRequest):
 
-    def __init__(self, object_resource: str, is_dir=False):
+    def __init__(self, object_resource: str, is_dir=False, byte_range: Tuple[int, Optional[int]] = None,
+                 hold_slot: bool = True):
         super().__init__(object_resource, is_dir)
+        self.byte_range = byte_range
+        # a body that feeds another data request must not hold a slot, that
+        # request needs one of its own
+        self.hold_slot = hold_slot
 
     def get_method(self):
         return Method.GET
 
+    def get_traffic_class(self):
+        return TrafficClass.Data
+
+    def holds_slot_for_body(self):
+        return self.hold_slot
+
+    def get_additional_headers(self):
+        if self.byte_range is None:
+            return dict()
+        start, end = self.byte_range
+        return {
+            'Range': 'bytes={}-{}'.format(start, '' if end is None else end)
+        }
+
     def is_query_parameter_access_token(self):
         return True
 
@@ -28,3 +28,7 @@ class RenameRequest(MyCloudRequest):
 
         req_json = json.dumps(req)
         return get_string_generator(req_json)
+
+    @staticmethod
+    def is_success(resp):
+        return resp.status in (200, 204)
@@ -20,6 +20,9 @@ class AddPhotoRequest(MyCloudRequest):
     def get_data_generator(self):
         return self._generator
 
+    def is_rewindable(self):
+        return self._generator is None
+
     def get_additional_headers(self):
         disposition_str = 'attachment'
         if self._filename is not None:
@@ -15,6 +15,11 @@ class Method(Enum):
     DELETE = 2
 
 
+class TrafficClass(Enum):
+    Metadata = 0
+    Data = 1
+
+
 class MyCloudRequest(ABC):
 
     @abstractmethod
@@ -34,6 +39,18 @@ class MyCloudRequest(ABC):
     def get_data_generator(self):
         return None
 
+    def is_rewindable(self):
+        # requests without a body or with a body created on every call of
+        # get_data_generator can be sent again
+        return True
+
+    def get_traffic_class(self):
+        return TrafficClass.Metadata
+
+    def holds_slot_for_body(self):
+        # the concurrency slot is kept until the response body is done
+        return False
+
     def get_content_type(self):
         return ContentType.APPLICATION_JSON
 
@@ -1,16 +1,34 @@
+from typing import Callable
+
 from mycloud.mycloudapi.requests.request import MyCloudRequest
 
 
 class MyCloudResponse:
 
-    def __init__(self, request: MyCloudRequest, result):
+    def __init__(self, request: MyCloudRequest, result, on_release: Callable[[], None] = None):
         self.request = request
         self._result = result
+        self._on_release = on_release
 
     @property
     def result(self):
         return self._result
 
+    def release(self):
+        # the connection goes back to the pool once the body was read
+        self._result.release()
+        self._released()
+
+    def close(self):
+        # drops the connection, the unread rest of the body isn't needed
+        self._result.close()
+        self._released()
+
+    def _released(self):
+        on_release, self._on_release = self._on_release, None
+        if on_release is not None:
+            on_release()
+
     @property
     def success(self):
         if 'is_success' not in dir(type(self.request)):
@@ -0,0 +1,94 @@
+import random
+import time
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from threading import Lock
+from typing import Callable, Iterable, Optional
+
+from mycloud.constants import (RETRY_BUDGET_REFILL, RETRY_BUDGET_SIZE,
+                               RETRY_COUNT, RETRY_MAX_DELAY,
+                               RETRYABLE_STATUS_CODES, WAIT_TIME_MULTIPLIER)
+
+
+class RetryBudget:
+
+    def __init__(self, size: float = RETRY_BUDGET_SIZE, refill: float = RETRY_BUDGET_REFILL):
+        if size < 1:
+            raise ValueError('Retry budget must allow at least one retry')
+        self._size = size
+        self._refill = refill
+        self._tokens = size
+        # shared by the requests of all loops
+        self._lock = Lock()
+
+    @property
+    def tokens(self):
+        return self._tokens
+
+    def try_withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self._size, self._tokens + self._refill)
+
+
+class RetryPolicy:
+
+    def __init__(self,
+                 retries: int = RETRY_COUNT,
+                 base_delay: float = WAIT_TIME_MULTIPLIER,
+                 max_delay: float = RETRY_MAX_DELAY,
+                 budget: RetryBudget = None,
+                 retryable_statuses: Iterable[int] = RETRYABLE_STATUS_CODES,
+                 jitter: Callable[[], float] = random.random):
+        if retries < 0:
+            raise ValueError('Retry count cannot be negative')
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget or RetryBudget()
+        self.retryable_statuses = set(retryable_statuses)
+        self._jitter = jitter
+
+    def is_retryable_status(self, status: int) -> bool:
+        return status in self.retryable_statuses
+
+    def allow_retry(self, request, attempt: int) -> bool:
+        if attempt >= self.retries:
+            return False
+        # a consumed upload body cannot be sent again
+        if not request.is_rewindable():
+            return False
+        return self.budget.try_withdraw()
+
+    def get_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        backoff = min(self.max_delay, self.base_delay * 2 ** attempt)
+        # full jitter keeps concurrent requests from retrying in lockstep
+        delay = backoff * self._jitter()
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def record_success(self):
+        self.budget.deposit()
+
+    @staticmethod
+    def parse_retry_after(value: Optional[str]) -> Optional[float]:
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, retry_at.timestamp() - time.time())
@@ -2,7 +2,7 @@ import sys
 
 from hurry.filesize import size
 
-from mycloud.drive import DriveClient
+from mycloud.drive import DriveClient, ls_files_recursively
 
 
 async def calculate_size(client: DriveClient, directory: str):
@@ -11,7 +11,7 @@ async def calculate_size(client: DriveClient, directory: str):
     summed_up = 0
     longest_string = 0
     file_count = 0
-    async for file in client.list_files(directory):
+    async for file in ls_files_recursively(client, directory):
         file_count += 1
         original_out.write(str(' ' * longest_string) + '\r')
         to_print = 'Bytes: {} | Size (readable): {} | Count: {}'.format(
@@ -20,6 +20,6 @@ async def calculate_size(client: DriveClient, directory: str):
             longest_string = len(to_print)
 
         original_out.write(to_print)
-        summed_up += int(file['Length'])
+        summed_up += int(file.length)
 
     sys.stdout = original_out
@@ -1,12 +1,41 @@
 import inject
 import asyncio
+import logging
 import os
 import threading
-from typing import Dict
 from enum import Enum
 from wsgidav.util import get_uri_parent
+from mycloud.common import BytePipe
 from mycloud.mycloudapi.requests.drive import MyCloudMetadata, FileEntry, DirEntry, PutObjectRequest
 from mycloud.drive import DriveClient, DriveNotFoundException, EntryType, EntryStats
+from mycloud.drive.filesystem import BasicRemotePath, FileManager
+from mycloud.drive.streamapi import HashingUpStream, ProgressReporter
+from mycloud.webdav.metadata_cache import MetadataCache
+
+
+class VersionedFileWriter:
+    def __init__(self, client, path):
+        self._client = client
+        self._path = path
+
+    def writelines(self, stream):
+        # the body is read on the server thread, the upload consumes it on
+        # the client loop
+        pipe = BytePipe()
+        upload = asyncio.run_coroutine_threadsafe(
+            self._client._write_versioned(self._path, pipe), self._client._loop)
+        upload.add_done_callback(lambda done: _abort_on_failure(done, pipe))
+        try:
+            for data in stream:
+                pipe.put(data)
+        except BaseException as ex:
+            pipe.abort(ex)
+            raise
+        pipe.close()
+        upload.result()
+
+    def close(self):
+        pass
 
 
 class WriterWithCallback:
@@ -22,6 +51,11 @@ class WriterWithCallback:
         self._callback()
 
 
+def _abort_on_failure(upload, pipe: BytePipe):
+    if not upload.cancelled() and upload.exception() is not None:
+        pipe.abort(upload.exception())
+
+
 def thread_runner(loop: asyncio.AbstractEventLoop):
     asyncio.set_event_loop(loop)
     loop.run_forever()
@@ -29,7 +63,6 @@ def thread_runner(loop: asyncio.AbstractEventLoop):
 
 class MyCloudDavClient:
 
-    metadata_cache: Dict[str, MyCloudMetadata] = dict()
     drive_client: DriveClient = inject.attr(DriveClient)
 
     file_creation_in_cache = False
@@ -40,6 +73,16 @@ class MyCloudDavClient:
         self._thread = threading.Thread(
             target=thread_runner, args=(self._loop,))
         self._thread.start()
+        self.metadata_cache = MetadataCache(
+            lambda path: self.drive_client.ls(path), self._loop)
+        self.version_cache = MetadataCache(
+            self._read_latest_version, self._loop)
+
+    def close(self):
+        logging.info(f'Metadata cache statistics: {self.metadata_cache.stats()}')
+        self._run_sync(self.drive_client.request_executor.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
 
     def _run_sync(self, task):
         return asyncio.run_coroutine_threadsafe(task, self._loop).result()
@@ -58,7 +101,7 @@ class MyCloudDavClient:
             if contains(metadata.files):
                 return EntryType.File
             if contains(metadata.dirs):
-                return EntryType.Dir
+                return EntryType.File if self.is_versioned_file(normed) else EntryType.Dir
             return EntryType.Enoent
         except DriveNotFoundException:
             return EntryType.Enoent
@@ -73,6 +116,30 @@ class MyCloudDavClient:
     def open_read(self, path):
         return self._run_sync(self.drive_client.open_read(path))
 
+    def open_read_ranged(self, path, length):
+        return self._run_sync(self.drive_client.open_read_ranged([(path, length)]))
+
+    def is_versioned_file(self, path):
+        try:
+            return FileManager.is_versioned_file(self._get_metadata(path))
+        except DriveNotFoundException:
+            return False
+
+    def get_latest_version(self, path):
+        return self.version_cache.get(os.path.normpath(path))
+
+    def open_read_versioned(self, path):
+        version = self.get_latest_version(path)
+        if any(version.transforms):
+            raise ValueError(f'Cannot serve transformed file {path}')
+        return self._run_sync(self._open_read_parts(version.get_parts()))
+
+    def open_write_versioned(self, path):
+        if self.get_file_type(path) == EntryType.File and not self.is_versioned_file(path):
+            # a plain object can't stay next to the versioned directory
+            self.remove(path)
+        return WriterWithCallback(VersionedFileWriter(self, path), lambda: self._clear_cache(path))
+
     def open_write(self, path):
         temp = self._run_sync(self.drive_client.open_write(path))
         return WriterWithCallback(temp, lambda: self._clear_cache(path))
@@ -97,15 +164,42 @@ class MyCloudDavClient:
 
     def _clear_cache(self, path: str):
         dirname = get_uri_parent(path)
-        normed = os.path.normpath(dirname)
-        if normed in self.metadata_cache:
-            del self.metadata_cache[normed]
+        self.metadata_cache.invalidate(os.path.normpath(dirname))
+        # drops negative entries of a created path and listings below a
+        # moved or removed directory
+        self.metadata_cache.invalidate(os.path.normpath(path), recursive=True)
+        self.version_cache.invalidate(os.path.normpath(path), recursive=True)
+
+    async def _read_latest_version(self, path: str):
+        file_manager = FileManager(
+            self.drive_client.request_executor, [], ProgressReporter())
+        metadata = await file_manager.read_file_metadata(BasicRemotePath(path))
+        if metadata is None or metadata.get_latest_version() is None:
+            raise DriveNotFoundException
+        return metadata.get_latest_version()
+
+    async def _open_read_parts(self, parts):
+        # parts of older versions aren't all cut at the recorded chunk size,
+        # the lengths are taken from the listing of their directories
+        lengths = {}
+        for directory in {os.path.dirname(part) for part in parts}:
+            metadata = await self.drive_client.ls(directory)
+            lengths.update({os.path.join(directory, file.name): file.length
+                            for file in metadata.files})
+        if any(part not in lengths for part in parts):
+            raise DriveNotFoundException
+        return await self.drive_client.open_read_ranged(
+            [(part, lengths[part]) for part in parts])
+
+    async def _write_versioned(self, path: str, pipe: BytePipe):
+        # parts are cut and uploaded one at a time, the body is never
+        # held in memory as a whole. The pipe is awaited and hashed as it
+        # is read, so the loop isn't blocked on the server thread
+        file_manager = FileManager(
+            self.drive_client.request_executor, [], ProgressReporter())
+        upstream = HashingUpStream(pipe)
+        await file_manager.write_file_single_pass(upstream, BasicRemotePath(path))
 
     def _get_metadata(self, path: str):
         path = os.path.normpath(path)
-        if path in self.metadata_cache:
-            return self.metadata_cache[path]
-        metadata = self._run_sync(
-            self.drive_client.ls(path))
-        self.metadata_cache[path] = metadata
-        return metadata
+        return self.metadata_cache.get(path)
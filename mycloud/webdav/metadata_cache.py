@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from mycloud.constants import (WEBDAV_METADATA_CACHE_NEGATIVE_TTL,
+                               WEBDAV_METADATA_CACHE_SIZE,
+                               WEBDAV_METADATA_CACHE_STALE_TTL,
+                               WEBDAV_METADATA_CACHE_TTL)
+from mycloud.drive import DriveNotFoundException
+from mycloud.mycloudapi.requests.drive import MyCloudMetadata
+
+
+@dataclass
+class _CacheEntry:
+    metadata: MyCloudMetadata
+    stored_at: float
+    ttl: float
+
+
+class MetadataCache:
+
+    def __init__(self,
+                 fetch: Callable[[str], Awaitable[MyCloudMetadata]],
+                 loop: asyncio.AbstractEventLoop,
+                 max_entries: int = WEBDAV_METADATA_CACHE_SIZE,
+                 ttl: float = WEBDAV_METADATA_CACHE_TTL,
+                 stale_ttl: float = WEBDAV_METADATA_CACHE_STALE_TTL,
+                 negative_ttl: float = WEBDAV_METADATA_CACHE_NEGATIVE_TTL):
+        self._fetch = fetch
+        self._loop = loop
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._stale_ttl = stale_ttl
+        self._negative_ttl = negative_ttl
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, path: str) -> MyCloudMetadata:
+        stale = None
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                age = time.monotonic() - entry.stored_at
+                if age <= entry.ttl:
+                    self.hits += 1
+                    self._entries.move_to_end(path)
+                    return MetadataCache._unwrap(entry)
+                if entry.metadata is not None and age <= entry.ttl + self._stale_ttl:
+                    self.stale_hits += 1
+                    self._entries.move_to_end(path)
+                    stale = entry.metadata
+                else:
+                    del self._entries[path]
+            if stale is None:
+                self.misses += 1
+            generation = self._generation
+
+        if stale is not None:
+            # serve the stale listing, the next request sees the refreshed one
+            self._schedule_refresh(path, generation)
+            return stale
+
+        future = asyncio.run_coroutine_threadsafe(
+            self._fetch(path), self._loop)
+        try:
+            metadata = future.result()
+        except DriveNotFoundException:
+            self._store(path, None, generation)
+            raise
+        self._store(path, metadata, generation)
+        return metadata
+
+    def invalidate(self, path: str, recursive=False):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(path, None)
+            if recursive:
+                prefix = path.rstrip('/') + '/'
+                for key in [key for key in self._entries if key.startswith(prefix)]:
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+    def _schedule_refresh(self, path: str, generation: int):
+        with self._lock:
+            if path in self._refreshing:
+                return
+            self._refreshing.add(path)
+        future = asyncio.run_coroutine_threadsafe(
+            self._fetch(path), self._loop)
+        future.add_done_callback(
+            lambda done: self._refreshed(path, generation, done))
+
+    def _refreshed(self, path: str, generation: int, future):
+        with self._lock:
+            self._refreshing.discard(path)
+        try:
+            self._store(path, future.result(), generation)
+        except DriveNotFoundException:
+            self._store(path, None, generation)
+        except Exception as ex:
+            logging.warning(f'Failed to refresh metadata of {path}: {ex}')
+
+    def _store(self, path: str, metadata: MyCloudMetadata, generation: int):
+        with self._lock:
+            # a write invalidated entries while the listing was in flight,
+            # the listing might not contain it
+            if generation != self._generation:
+                return
+            ttl = self._ttl if metadata is not None else self._negative_ttl
+            self._entries[path] = _CacheEntry(metadata, time.monotonic(), ttl)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    @staticmethod
+    def _unwrap(entry: _CacheEntry):
+        if entry.metadata is None:
+            raise DriveNotFoundException
+        return entry.metadata
@@ -56,7 +56,11 @@ class WebdavServer:
         }
 
         server = wsgi.Server(**server_args)
-        server.start()
+        try:
+            server.start()
+        finally:
+            server.stop()
+            self.client.close()
 
     def _validate_configure_authenticator(self, validate):
         user = self._config['myCloudUser']
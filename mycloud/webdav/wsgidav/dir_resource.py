@@ -37,9 +37,19 @@ class DirResource(DAVCollection):
     def support_recursive_delete(self):
         return True
 
-    def support_recursive_move(self):
+    def support_recursive_move(self, dest_path):
         return True
 
+    def move_recursive(self, dest_path):
+        self.dav_client.move(self.path, dest_path)
+
+    def copy_move_single(self, dest_path, is_move):
+        if is_move:
+            self.move_recursive(dest_path)
+            return
+        # members are copied one by one by wsgidav after the collection
+        self.dav_client.mkdirs(dest_path)
+
     def support_ranges(self):
         return False
 
@@ -1,8 +1,8 @@
 import inject
 import os
 from wsgidav.dav_provider import DAVNonCollection
-from wsgidav.dav_error import DAVError
-from mycloud.webdav.client import MyCloudDavClient, FileEntry
+from wsgidav.dav_error import DAVError, HTTP_FORBIDDEN
+from mycloud.webdav.client import MyCloudDavClient, DirEntry, FileEntry
 from mycloud.common import to_unix
 from mycloud.constants import MY_CLOUD_BIG_FILE_CHUNK_SIZE
 
@@ -33,16 +33,22 @@ class FileResource(DAVNonCollection):
         return self._file_entry.etag
 
     def support_ranges(self):
-        return False
+        return True
 
     def get_content(self):
-        return self.dav_client.open_read(self.path)
+        if self.dav_client.is_versioned_file(self.path):
+            try:
+                return self.dav_client.open_read_versioned(self.path)
+            except ValueError:
+                raise DAVError(HTTP_FORBIDDEN)
+        return self.dav_client.open_read_ranged(self.path, self.get_content_length())
 
     def begin_write(self, content_type):
-        length = int(self.environ['CONTENT_LENGTH'])
-        if length > MY_CLOUD_BIG_FILE_CHUNK_SIZE:
-            # TODO: lfs
-            raise DAVError(413)
+        length = self.environ.get('CONTENT_LENGTH')
+        # bodies of unknown length might exceed the size of a single object
+        if not length or int(length) > MY_CLOUD_BIG_FILE_CHUNK_SIZE or \
+                self.dav_client.is_versioned_file(self.path):
+            return self.dav_client.open_write_versioned(self.path)
 
         return self.dav_client.open_write(self.path)
 
@@ -74,6 +80,11 @@ class FileResource(DAVNonCollection):
         if any(res):
             return res[0]
 
+        versioned = list(filter(lambda x: os.path.normpath(x.path) == os.path.normpath(self.path),
+                                metadata.dirs))
+        if any(versioned):
+            return self._versioned_file_entry(versioned[0])
+
         return FileEntry(
             creation_time=None,
             etag=None,
@@ -83,3 +94,15 @@ class FileResource(DAVNonCollection):
             modification_time=None,
             name=os.path.basename(os.path.normpath(self.path)),
             path=self.path)
+
+    def _versioned_file_entry(self, directory: DirEntry):
+        version = self.dav_client.get_latest_version(self.path)
+        return FileEntry(
+            creation_time=directory.creation_time,
+            etag=version.get_identifier(),
+            extension=os.path.splitext(directory.name)[1],
+            length=version.get_property('size') or 0,
+            mime='application/octet-stream',
+            modification_time=directory.modification_time,
+            name=directory.name,
+            path=self.path)
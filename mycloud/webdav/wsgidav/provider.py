@@ -1,5 +1,3 @@
-from pympler import muppy, summary
-import pandas as pd
 import inject
 import asyncio
 from wsgidav.dav_provider import DAVProvider
@@ -0,0 +1,106 @@
+import asyncio
+import os
+
+import pytest
+
+from mycloud.drive.filesync import downsync_file, upsync_file
+from mycloud.drive.filesync.progress import ProgressTracker
+from mycloud.drive.filesystem import BasicRemotePath, FileMetadata
+from mycloud.drive.streamapi.transforms import AES256GCMTransform
+from mycloud.mycloudapi import ObjectResourceBuilder
+
+RECORD_SIZE = 32
+
+
+def _transform(method, data, chunk_size):
+    result = b''
+    for offset in range(0, max(len(data), 1), chunk_size):
+        result += method(data[offset:offset + chunk_size],
+                         last=offset + chunk_size >= len(data))
+    return result
+
+
+@pytest.mark.parametrize('size', [0, RECORD_SIZE, 10 * RECORD_SIZE + 5])
+def test_records_round_trip_independent_of_chunk_size(size):
+    plain = os.urandom(size)
+    transform = AES256GCMTransform('test', RECORD_SIZE)
+    encrypted = _transform(transform.up_transform, plain, 100)
+    for chunk_size in (1, 7, len(encrypted)):
+        transform.reset_state()
+        assert _transform(transform.down_transform, encrypted, chunk_size) == plain
+
+
+def test_decryption_starts_at_any_record():
+    plain = os.urandom(10 * RECORD_SIZE + 5)
+    transform = AES256GCMTransform('test', RECORD_SIZE)
+    encrypted = transform.up_transform(plain, last=True)
+
+    transform.seek(encrypted[:transform.get_header_size()], 3)
+    decrypted = transform.down_transform(
+        encrypted[transform.get_record_offset(3):], last=True)
+    assert decrypted == plain[3 * RECORD_SIZE:]
+
+
+def test_tampered_and_truncated_data_is_rejected():
+    transform = AES256GCMTransform('test', RECORD_SIZE)
+    encrypted = bytearray(transform.up_transform(os.urandom(4 * RECORD_SIZE), last=True))
+
+    truncated = encrypted[:transform.get_record_offset(2)]
+    transform.reset_state()
+    with pytest.raises(ValueError):
+        transform.down_transform(truncated, last=True)
+
+    encrypted[transform.get_record_offset(1)] ^= 1
+    transform.reset_state()
+    with pytest.raises(ValueError):
+        transform.down_transform(encrypted, last=True)
+
+
+def test_parts_are_bound_to_their_context():
+    transform = AES256GCMTransform('test', RECORD_SIZE)
+    transform.bind(b'version/0')
+    encrypted = transform.up_transform(os.urandom(4 * RECORD_SIZE), last=True)
+
+    transform.reset_state()
+    transform.bind(b'version/1')
+    with pytest.raises(ValueError):
+        transform.down_transform(encrypted, last=True)
+
+
+def _upsync(fake_drive, source, data, single_pass=False):
+    source.write_bytes(data)
+    asyncio.run(upsync_file(fake_drive, ObjectResourceBuilder(str(source.parent), '/backup'),
+                            str(source), ProgressTracker(), 'secret', part_size=4096,
+                            single_pass=single_pass, cipher='gcm'))
+
+
+def _downsync(fake_drive, restored):
+    asyncio.run(downsync_file(fake_drive, ObjectResourceBuilder(str(restored.parent), '/backup'),
+                              BasicRemotePath('/backup/file.bin'), ProgressTracker(), 'secret'))
+
+
+@pytest.mark.parametrize('single_pass', [False, True])
+def test_downsync_uses_the_transforms_of_the_version(fake_drive, tmp_path, single_pass):
+    source = tmp_path / 'source' / 'file.bin'
+    source.parent.mkdir()
+    data = os.urandom(3 * 4096 + 10)
+    _upsync(fake_drive, source, data, single_pass)
+    metadata = FileMetadata.from_json(
+        fake_drive.objects['/Drive/backup/file.bin/mycloud_metadata.json'].decode())
+    assert metadata.get_latest_version().transforms == [AES256GCMTransform.TRANSFORM_NAME]
+
+    restored = tmp_path / 'restored' / 'file.bin'
+    _downsync(fake_drive, restored)
+    assert restored.read_bytes() == data
+
+
+def test_swapped_parts_are_rejected(fake_drive, tmp_path):
+    source = tmp_path / 'source' / 'file.bin'
+    source.parent.mkdir()
+    _upsync(fake_drive, source, os.urandom(3 * 4096 + 10))
+    first, second = sorted(key for key in fake_drive.objects if key.endswith('.partial'))[:2]
+    fake_drive.objects[first], fake_drive.objects[second] = \
+        fake_drive.objects[second], fake_drive.objects[first]
+
+    with pytest.raises(ValueError):
+        _downsync(fake_drive, tmp_path / 'restored' / 'file.bin')
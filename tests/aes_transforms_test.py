@@ -18,3 +18,29 @@ def test_aes_transform_padding_is_applied():
     first_down = transform.down_transform(first)
     second_down = transform.down_transform(second_with_padding, last=True)
     assert first_down + second_down == first_bytes + second_bytes
+
+
+def _transform_in_chunks(transform, data, chunk_sizes, down=False):
+    method = transform.down_transform if down else transform.up_transform
+    result = b''
+    offset = 0
+    for chunk_size in chunk_sizes:
+        chunk = data[offset:offset + chunk_size]
+        offset += chunk_size
+        result += method(memoryview(chunk), last=offset >= len(data))
+    return result
+
+
+def test_aes_transform_is_independent_of_chunk_boundaries():
+    plain = os.urandom(5 * AES.block_size + 3)
+    transform = AES256CryptoTransform('test')
+    encrypted = _transform_in_chunks(transform, plain, [1, 7, 40, 35])
+
+    # the format is plain CBC with the IV in front and PKCS#7 padding
+    cipher = AES.new(transform._key, AES.MODE_CBC, encrypted[:AES.block_size])
+    decrypted = cipher.decrypt(encrypted[AES.block_size:])
+    assert decrypted[:len(plain)] == plain
+
+    for chunk_sizes in ([len(encrypted)], [3, 13, 16, 17, 63], [16] * 7):
+        transform.reset_state()
+        assert _transform_in_chunks(transform, encrypted, chunk_sizes, down=True) == plain
@@ -0,0 +1,68 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from mycloud.common import BytePipe
+
+
+def test_threaded_writer_and_async_reader_exchange_all_bytes():
+    data = os.urandom(100000)
+    pipe = BytePipe(4096)
+
+    def produce():
+        for index in range(0, len(data), 1000):
+            pipe.put(data[index:index + 1000])
+        pipe.close()
+
+    async def consume():
+        chunks = []
+        while True:
+            chunk = await pipe.get_async(3000)
+            if not chunk:
+                return b''.join(chunks)
+            chunks.append(chunk)
+
+    writer = threading.Thread(target=produce)
+    writer.start()
+    assert asyncio.run(consume()) == data
+    writer.join()
+
+
+def test_writer_blocks_until_buffer_has_room():
+    pipe = BytePipe(10)
+    pipe.put(b'0123456789')
+    written = threading.Event()
+
+    def produce():
+        pipe.put(b'abc')
+        written.set()
+
+    writer = threading.Thread(target=produce)
+    writer.start()
+    time.sleep(0.05)
+    assert not written.is_set()
+    assert pipe.read(5) == b'01234'
+    writer.join(timeout=5)
+    assert written.is_set()
+    pipe.close()
+    assert pipe.read() == b'56789abc'
+
+
+def test_abort_wakes_blocked_async_writer():
+    pipe = BytePipe(4)
+
+    async def produce():
+        await pipe.put_async(b'1234')
+        await pipe.put_async(b'5')
+
+    async def run():
+        writer = asyncio.ensure_future(produce())
+        await asyncio.sleep(0.01)
+        pipe.abort(IOError('upload failed'))
+        await writer
+
+    with pytest.raises(IOError):
+        asyncio.run(run())
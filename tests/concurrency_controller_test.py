@@ -0,0 +1,162 @@
+import asyncio
+
+import inject
+
+from mycloud.drive import DriveClient
+from mycloud.mycloudapi import (AdaptiveLimiter, ConcurrencyController,
+                                MyCloudRequestExecutor)
+from mycloud.mycloudapi.auth import AuthMode
+from mycloud.mycloudapi.requests import TrafficClass
+from mycloud.mycloudapi.requests.drive import (GetObjectRequest,
+                                               MetadataRequest,
+                                               PutObjectRequest)
+
+
+def test_limit_grows_additively_and_backs_off_once_per_round_trip():
+    now = [0.0]
+    limiter = AdaptiveLimiter(4, 8, clock=lambda: now[0])
+    for _ in range(4):
+        limiter.record_success(1.0)
+    # about one more slot per window of limit requests
+    assert limiter.limit == 4
+    limiter.record_success(1.0)
+    assert limiter.limit == 5
+
+    limiter.record_throttled()
+    limiter.record_throttled()
+    assert limiter.limit == 3
+    now[0] = 2.0
+    limiter.record_throttled()
+    assert limiter.limit == 2
+
+    # slow responses hold the limit instead of growing it
+    for _ in range(20):
+        limiter.record_success(10.0)
+    assert limiter.limit == 2
+
+
+def test_requests_wait_for_a_free_slot():
+    limiter = AdaptiveLimiter(2, 2)
+    running = []
+    peak = []
+
+    async def request():
+        async with limiter.slot():
+            running.append(None)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.pop()
+
+    async def run():
+        await asyncio.gather(*[request() for _ in range(6)])
+
+    asyncio.run(run())
+    assert max(peak) == 2
+    assert limiter.in_flight == 0
+
+
+def test_requests_are_split_into_traffic_classes():
+    controller = ConcurrencyController()
+    assert MetadataRequest('/').get_traffic_class() == TrafficClass.Metadata
+    assert GetObjectRequest('/a').get_traffic_class() == TrafficClass.Data
+    assert PutObjectRequest('/a', None).get_traffic_class() == TrafficClass.Data
+    assert controller.get_limiter(TrafficClass.Metadata) is not \
+        controller.get_limiter(TrafficClass.Data)
+
+
+class _Authenticator:
+    auth_mode = AuthMode.Password
+
+    async def get_token(self):
+        return 'token'
+
+
+class _Content:
+
+    def __init__(self):
+        self.callbacks = []
+
+    def on_eof(self, callback):
+        self.callbacks.append(callback)
+
+
+class _Body:
+
+    def __init__(self):
+        self.status = 200
+        self.headers = {}
+        self.content_length = 10
+        self.content = _Content()
+
+    def release(self):
+        pass
+
+
+class _BodyExecutor(MyCloudRequestExecutor):
+
+    async def _send(self, request):
+        return _Body()
+
+
+def test_data_slot_is_held_until_the_body_is_done():
+    limiter = AdaptiveLimiter(2, 2)
+    executor = _BodyExecutor(_Authenticator(), concurrency_controller=ConcurrencyController({
+        TrafficClass.Metadata: AdaptiveLimiter(2, 2), TrafficClass.Data: limiter}))
+
+    async def run():
+        released = await executor.execute(GetObjectRequest('/a.bin'))
+        read = await executor.execute(GetObjectRequest('/b.bin'))
+        assert limiter.in_flight == 2
+        released.release()
+        released.release()
+        assert limiter.in_flight == 1
+        for callback in read.result.content.callbacks:
+            callback()
+        assert limiter.in_flight == 0
+
+    asyncio.run(run())
+
+
+class _StreamedContent(_Content):
+
+    def __init__(self, data: bytes):
+        super().__init__()
+        self._data = data
+
+    async def iter_chunked(self, size: int):
+        for offset in range(0, len(self._data), size):
+            yield self._data[offset:offset + size]
+        for callback in self.callbacks:
+            callback()
+
+
+class _CopyExecutor(MyCloudRequestExecutor):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.uploaded = {}
+
+    async def _send(self, request):
+        response = _Body()
+        if isinstance(request, PutObjectRequest):
+            self.uploaded[request.object_resource] = b''.join(
+                [chunk async for chunk in request.get_data_generator()])
+            response.status = 201
+        else:
+            response.content = _StreamedContent(b'content')
+        return response
+
+
+def test_streamed_copy_does_not_wait_for_its_own_slot():
+    limiter = AdaptiveLimiter(1, 1)
+    executor = _CopyExecutor(_Authenticator(), concurrency_controller=ConcurrencyController({
+        TrafficClass.Metadata: AdaptiveLimiter(1, 1), TrafficClass.Data: limiter}))
+    inject.clear_and_configure(
+        lambda binder: binder.bind(MyCloudRequestExecutor, executor))
+    try:
+        asyncio.run(asyncio.wait_for(
+            DriveClient()._copy_file_streamed('/a.bin', '/b.bin'), 5))
+    finally:
+        inject.clear()
+    assert executor.uploaded['/Drive/b.bin'] == b'content'
+    assert limiter.in_flight == 0
@@ -0,0 +1,47 @@
+import asyncio
+
+from mycloud.common import ByteSemaphore, run_concurrently
+
+
+async def _items(count):
+    for item in range(count):
+        yield item
+
+
+def test_run_concurrently_bounds_running_jobs():
+    running = 0
+    max_running = 0
+    processed = []
+
+    async def worker(item):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        processed.append(item)
+        running -= 1
+
+    asyncio.run(run_concurrently(_items(20), worker, jobs=4))
+    assert sorted(processed) == list(range(20))
+    assert max_running == 4
+
+
+def test_byte_semaphore_limits_held_bytes():
+    held = 0
+    max_held = 0
+
+    async def run():
+        budget = ByteSemaphore(100)
+
+        async def worker(size):
+            nonlocal held, max_held
+            async with budget.hold(size) as acquired:
+                held += acquired
+                max_held = max(max_held, held)
+                await asyncio.sleep(0.01)
+                held -= acquired
+
+        await asyncio.gather(*[worker(size) for size in [60, 60, 30, 500]])
+
+    asyncio.run(run())
+    assert max_held <= 100
@@ -0,0 +1,221 @@
+import asyncio
+import json
+
+import inject
+import pytest
+
+from mycloud.common import set_hash_cache
+from mycloud.common.hash_cache import HashCache
+from mycloud.mycloudapi import MyCloudRequestExecutor
+from mycloud.mycloudapi.requests.drive import (CopyRequest, DeleteObjectRequest,
+                                               DirectoryListRequest,
+                                               GetObjectRequest, MetadataRequest,
+                                               PutObjectRequest, RenameRequest)
+from mycloud.mycloudapi.response import MyCloudResponse
+
+TIMESTAMP = '2019-01-01T00:00:00Z'
+
+
+class _Content:
+
+    def __init__(self, body: bytes, chunks: list = None, chunk_size: int = None):
+        self._body = body
+        self._chunks = chunks
+        self._chunk_size = chunk_size
+        self._position = 0
+        self.consumed = 0
+
+    async def read(self, length: int):
+        length = min(length, self._chunk_size or length)
+        data = self._body[self._position:self._position + length]
+        self._position += len(data)
+        return data
+
+    async def iter_chunked(self, size: int):
+        size = self._chunk_size or size
+        chunks = self._chunks
+        if chunks is None:
+            chunks = [self._body[index:index + size]
+                      for index in range(0, len(self._body), size)]
+        for chunk in chunks:
+            self.consumed += 1
+            yield chunk
+
+
+class _Result:
+
+    def __init__(self, status: int, body: bytes = b'', headers: dict = None, chunks: list = None,
+                 chunk_size: int = None):
+        self.status = status
+        self.headers = headers or {}
+        self.content = _Content(body, chunks, chunk_size)
+        self._body = body
+
+    async def text(self):
+        return self._body.decode()
+
+    def release(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeDrive:
+    """In-memory stand-in for the storage API, keyed by sanitized paths."""
+
+    def __init__(self):
+        self.objects = {}
+        self.directories = {'/Drive/'}
+        self.server_side_copy = True
+        self.undeletable = set()
+        self.unwritable = set()
+        self.unreadable = set()
+        self.requests = []
+        self.listings = []
+        # size of the chunks bodies arrive in, the requested one if None
+        self.network_chunk_size = None
+        self.honour_ranges = True
+
+    async def close(self):
+        pass
+
+    async def execute(self, request):
+        # lets concurrent requests interleave like on the network
+        await asyncio.sleep(0)
+        self.requests.append(request)
+        handler = getattr(self, '_' + type(request).__name__)
+        return MyCloudResponse(request, await handler(request))
+
+    async def _MetadataRequest(self, request: MetadataRequest):
+        path = request.object_resource
+        if path not in self.directories:
+            return _Result(404)
+        files = [key for key in self.objects if key.rsplit('/', 1)[0] + '/' == path]
+        dirs = [key for key in self.directories
+                if key != path and key[:-1].rsplit('/', 1)[0] + '/' == path]
+        body = {
+            'Name': path, 'Path': path, 'CreationTime': TIMESTAMP, 'ModificationTime': TIMESTAMP,
+            'Files': [{'Name': key.rsplit('/', 1)[1], 'Path': key, 'Length': len(self.objects[key]),
+                       'ETag': '', 'Extension': '', 'Mime': '',
+                       'CreationTime': TIMESTAMP, 'ModificationTime': TIMESTAMP} for key in files],
+            'Directories': [{'Name': key[:-1].rsplit('/', 1)[1], 'Path': key, 'CreationTime': TIMESTAMP,
+                             'ModificationTime': TIMESTAMP} for key in dirs]
+        }
+        return _Result(200, json.dumps(body).encode())
+
+    async def _DirectoryListRequest(self, request: DirectoryListRequest):
+        path = request._object_resource
+        if path not in self.directories:
+            return _Result(404)
+        # the files of a directory are listed together, one item per chunk
+        files = sorted((key for key in self.objects if key.startswith(path)),
+                       key=lambda key: key.rsplit('/', 1))
+        items = [json.dumps({'Path': key, 'Length': len(self.objects[key])}).encode()
+                 for key in files]
+        chunks = [b'['] + [chunk for index, item in enumerate(items)
+                           for chunk in ([b','] if index else []) + [item]] + [b']']
+        result = _Result(200, b''.join(chunks), chunks=chunks)
+        self.listings.append(result.content)
+        return result
+
+    async def _GetObjectRequest(self, request: GetObjectRequest):
+        if request.object_resource not in self.objects or \
+                request.object_resource in self.unreadable:
+            return _Result(404)
+        body = self.objects[request.object_resource]
+        if request.byte_range is None or not self.honour_ranges:
+            return _Result(200, body, chunk_size=self.network_chunk_size)
+        start, end = request.byte_range
+        if start >= len(body):
+            return _Result(416, headers={'Content-Range': f'bytes */{len(body)}'})
+        end = len(body) - 1 if end is None else min(end, len(body) - 1)
+        return _Result(206, body[start:end + 1],
+                       {'Content-Range': f'bytes {start}-{end}/{len(body)}'},
+                       chunk_size=self.network_chunk_size)
+
+    async def _PutObjectRequest(self, request: PutObjectRequest):
+        path = request.object_resource
+        if path in self.unwritable:
+            return _Result(500)
+        if path.endswith('/'):
+            self._add_directory(path)
+            return _Result(201)
+        generator = request.get_data_generator()
+        if generator is None:
+            body = b''
+        elif hasattr(generator, '__aiter__'):
+            body = b''.join([chunk async for chunk in generator])
+        else:
+            body = b''.join(generator)
+        self._add_directory(path.rsplit('/', 1)[0] + '/')
+        self.objects[path] = body
+        return _Result(201, headers={'ETag': f'"{len(body)}"'})
+
+    async def _DeleteObjectRequest(self, request: DeleteObjectRequest):
+        path = request.object_resource
+        if path in self.undeletable:
+            return _Result(500)
+        if path in self.objects:
+            del self.objects[path]
+            return _Result(204)
+        if path not in self.directories:
+            return _Result(404)
+        if any(key.startswith(path) for key in self.objects) or \
+                any(key != path and key.startswith(path) for key in self.directories):
+            return _Result(500)
+        self.directories.remove(path)
+        return _Result(204)
+
+    async def _CopyRequest(self, request: CopyRequest):
+        if not self.server_side_copy:
+            return _Result(404)
+        source, destination = request._source, request._destination
+        for key in list(self.objects):
+            if key == source or key.startswith(source if source.endswith('/') else source + '/'):
+                self.objects[destination + key[len(source):]] = self.objects[key]
+        for key in list(self.directories):
+            if key.startswith(source):
+                self._add_directory(destination + key[len(source):])
+        return _Result(200)
+
+    async def _RenameRequest(self, request: RenameRequest):
+        source, destination = request._source, request._destination
+        if source not in self.objects and source not in self.directories:
+            return _Result(404)
+        for key in list(self.objects):
+            if key == source or (source.endswith('/') and key.startswith(source)):
+                self.objects[destination + key[len(source):]] = self.objects.pop(key)
+        for key in list(self.directories):
+            if key.startswith(source):
+                self.directories.remove(key)
+                self._add_directory(destination + key[len(source):])
+        if destination.endswith('/'):
+            self._add_directory(destination)
+        else:
+            self._add_directory(destination.rsplit('/', 1)[0] + '/')
+        return _Result(200)
+
+    def _add_directory(self, path: str):
+        while path != '/Drive/':
+            self.directories.add(path)
+            path = path[:-1].rsplit('/', 1)[0] + '/'
+
+
+@pytest.fixture
+def fake_drive():
+    drive = FakeDrive()
+    inject.clear_and_configure(
+        lambda binder: binder.bind(MyCloudRequestExecutor, drive))
+    yield drive
+    inject.clear()
+
+
+@pytest.fixture(autouse=True)
+def hash_cache(tmp_path):
+    # keeps hashes of test files out of the user's data directory
+    cache = HashCache(str(tmp_path / 'hashes.sqlite'))
+    set_hash_cache(cache)
+    yield cache
+    cache.close()
+    set_hash_cache(None)
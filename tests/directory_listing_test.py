@@ -0,0 +1,39 @@
+import asyncio
+
+from mycloud.drive.filesystem import BasicRemotePath, FileManager
+from mycloud.drive.streamapi import ProgressReporter
+from mycloud.mycloudapi.requests.drive import DirectoryListRequest, ListType
+
+VERSIONED_FILES = ['/backup/a.bin', '/backup/dir/b.bin', '/backup/dir/deeper/c.bin']
+
+
+def test_bulk_listing_yields_versioned_files_while_listing(fake_drive):
+    for path in VERSIONED_FILES:
+        fake_drive.objects[f'/Drive{path}/mycloud_metadata.json'] = b'{}'
+        for index in range(3):
+            fake_drive.objects[f'/Drive{path}/0123456789/{index:08d}.partial'] = b'x'
+    fake_drive.objects['/Drive/backup/dir/plain.txt'] = b'x'
+    fake_drive._add_directory('/Drive/backup/dir/deeper/')
+
+    async def run():
+        found = []
+        consumed = []
+        file_manager = FileManager(fake_drive, [], ProgressReporter())
+        async for path in file_manager.read_directory(BasicRemotePath('/backup'), recursive=True, deep=True):
+            found.append(path.calculate_remote())
+            consumed.append(fake_drive.listings[0].consumed)
+        return found, consumed
+
+    found, consumed = asyncio.run(run())
+    assert sorted(found) == VERSIONED_FILES
+    # the first file is known long before the end of the listing
+    assert consumed[0] < consumed[-1]
+
+
+def test_missing_directory_lists_nothing(fake_drive):
+    async def run():
+        response = await fake_drive.execute(
+            DirectoryListRequest('/missing', ListType.File))
+        return [item async for item in await response.formatted()]
+
+    assert asyncio.run(run()) == []
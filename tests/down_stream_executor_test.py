@@ -0,0 +1,36 @@
+import asyncio
+import os
+import tempfile
+
+from mycloud.drive.streamapi import (CloudStreamAccessor, DefaultDownStream,
+                                     DownStreamExecutor)
+from mycloud.drive.streamapi import down
+from mycloud.drive.streamapi.transforms import AES256CryptoTransform
+
+
+def _encrypt(data: bytes):
+    transform = AES256CryptoTransform('test')
+    return transform.up_transform(data, last=True)
+
+
+def test_parts_are_written_to_their_offsets(fake_drive, monkeypatch):
+    monkeypatch.setattr(down, 'CHUNK_SIZE', 48)
+    # deliberately not aligned to the AES block size
+    fake_drive.network_chunk_size = 20
+    plain_parts = [os.urandom(112), os.urandom(112), os.urandom(50)]
+    accessor_base = '/file.bin/v'
+    part_files = []
+    for index, plain in enumerate(plain_parts):
+        part_file = CloudStreamAccessor(
+            accessor_base, None).get_part_file(index)
+        part_files.append(part_file)
+        fake_drive.objects['/Drive' + part_file] = _encrypt(plain)
+
+    with tempfile.NamedTemporaryFile() as local:
+        accessor = CloudStreamAccessor(
+            accessor_base, DefaultDownStream(open(local.name, 'wb')))
+        accessor.add_transform(AES256CryptoTransform('test'))
+        executor = DownStreamExecutor(fake_drive, part_concurrency=3)
+        asyncio.run(executor.download_stream(accessor, part_files))
+        with open(local.name, 'rb') as restored:
+            assert restored.read() == b''.join(plain_parts)
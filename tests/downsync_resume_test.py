@@ -0,0 +1,96 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from mycloud.constants import DOWNLOAD_PROGRESS_EXTENSION
+from mycloud.drive.filesync import downsync_file, upsync_file
+from mycloud.drive.filesync.progress import ProgressTracker
+from mycloud.drive.filesystem import BasicRemotePath, FileMetadata
+from mycloud.mycloudapi import ObjectResourceBuilder
+from mycloud.mycloudapi.requests.drive import GetObjectRequest
+
+PART_SIZE = 4096
+
+
+def test_interrupted_download_resumes_from_progress_file(fake_drive, tmp_path):
+    source = tmp_path / 'source' / 'file.bin'
+    source.parent.mkdir()
+    data = os.urandom(PART_SIZE * 4 + 10)
+    source.write_bytes(data)
+    asyncio.run(upsync_file(fake_drive, ObjectResourceBuilder(str(source.parent), '/backup'),
+                            str(source), ProgressTracker(), part_size=PART_SIZE))
+
+    restored = tmp_path / 'restored' / 'file.bin'
+    restore_builder = ObjectResourceBuilder(str(restored.parent), '/backup')
+    part_files = sorted(key for key in fake_drive.objects if key.endswith('.partial'))
+    fake_drive.unreadable.add(part_files[2])
+
+    def downsync():
+        asyncio.run(downsync_file(fake_drive, restore_builder,
+                                  BasicRemotePath('/backup/file.bin'), ProgressTracker()))
+
+    with pytest.raises(ValueError):
+        downsync()
+    progress = json.loads((restored.parent / ('file.bin' + DOWNLOAD_PROGRESS_EXTENSION)).read_text())
+    assert progress['parts'] in (1, 2)
+    assert progress['chunk_size'] == PART_SIZE
+    if hasattr(os, 'posix_fallocate'):
+        assert restored.stat().st_size == len(data)
+
+    fake_drive.unreadable.clear()
+    fake_drive.requests.clear()
+    downsync()
+    assert restored.read_bytes() == data
+    assert os.listdir(restored.parent) == ['file.bin']
+    fetched = [request.object_resource for request in fake_drive.requests
+               if isinstance(request, GetObjectRequest)]
+    assert part_files[0] not in fetched
+
+
+def test_progress_of_another_version_is_discarded(fake_drive, tmp_path):
+    source = tmp_path / 'source' / 'file.bin'
+    source.parent.mkdir()
+    source_builder = ObjectResourceBuilder(str(source.parent), '/backup')
+    source.write_bytes(os.urandom(PART_SIZE * 4))
+    asyncio.run(upsync_file(fake_drive, source_builder, str(source),
+                            ProgressTracker(), part_size=PART_SIZE))
+
+    restored = tmp_path / 'restored' / 'file.bin'
+    restore_builder = ObjectResourceBuilder(str(restored.parent), '/backup')
+    part_files = sorted(key for key in fake_drive.objects if key.endswith('.partial'))
+    fake_drive.unreadable.add(part_files[2])
+    with pytest.raises(ValueError):
+        asyncio.run(downsync_file(fake_drive, restore_builder,
+                                  BasicRemotePath('/backup/file.bin'), ProgressTracker()))
+
+    # a new version with the same parts count replaces the one half downloaded
+    fake_drive.unreadable.clear()
+    data = os.urandom(PART_SIZE * 4)
+    source.write_bytes(data)
+    asyncio.run(upsync_file(fake_drive, source_builder, str(source),
+                            ProgressTracker(), part_size=PART_SIZE))
+    asyncio.run(downsync_file(fake_drive, restore_builder,
+                              BasicRemotePath('/backup/file.bin'), ProgressTracker()))
+    assert restored.read_bytes() == data
+
+
+def test_download_is_cut_to_the_uploaded_length(fake_drive, tmp_path):
+    source = tmp_path / 'source' / 'file.bin'
+    source.parent.mkdir()
+    data = os.urandom(PART_SIZE * 2 + 10)
+    source.write_bytes(data)
+    asyncio.run(upsync_file(fake_drive, ObjectResourceBuilder(str(source.parent), '/backup'),
+                            str(source), ProgressTracker(), part_size=PART_SIZE))
+
+    # e.g. a log file that grew while it was uploaded
+    metadata_file = '/Drive/backup/file.bin/mycloud_metadata.json'
+    metadata = FileMetadata.from_json(fake_drive.objects[metadata_file].decode())
+    metadata.get_latest_version().add_property('size', len(data) + 1000)
+    fake_drive.objects[metadata_file] = FileMetadata.to_json(metadata).encode()
+
+    restored = tmp_path / 'restored' / 'file.bin'
+    asyncio.run(downsync_file(fake_drive, ObjectResourceBuilder(str(restored.parent), '/backup'),
+                              BasicRemotePath('/backup/file.bin'), ProgressTracker()))
+    assert restored.read_bytes() == data
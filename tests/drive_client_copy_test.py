@@ -0,0 +1,35 @@
+import asyncio
+
+from mycloud.drive import DriveClient
+from mycloud.mycloudapi.requests.drive import CopyRequest
+
+
+def _populate(fake_drive):
+    fake_drive.objects['/Drive/photos/a.jpg'] = b'a' * 100
+    fake_drive.objects['/Drive/photos/2019/b.jpg'] = b'b' * 100
+    fake_drive._add_directory('/Drive/photos/2019/')
+    fake_drive._add_directory('/Drive/photos/empty/')
+
+
+def test_copy_uses_server_side_command(fake_drive):
+    _populate(fake_drive)
+    asyncio.run(DriveClient().copy('/photos', '/copy'))
+    assert fake_drive.objects['/Drive/copy/2019/b.jpg'] == b'b' * 100
+    assert not any(type(request).__name__ == 'GetObjectRequest'
+                   for request in fake_drive.requests)
+
+
+def test_copy_falls_back_to_streamed_directory_copy(fake_drive):
+    _populate(fake_drive)
+    fake_drive.server_side_copy = False
+    client = DriveClient()
+    asyncio.run(client.copy('/photos', '/copy'))
+    assert fake_drive.objects['/Drive/copy/a.jpg'] == b'a' * 100
+    assert fake_drive.objects['/Drive/copy/2019/b.jpg'] == b'b' * 100
+    assert '/Drive/copy/empty/' in fake_drive.directories
+
+    asyncio.run(client.copy('/photos/a.jpg', '/c.jpg'))
+    assert fake_drive.objects['/Drive/c.jpg'] == b'a' * 100
+    copy_requests = [request for request in fake_drive.requests
+                     if isinstance(request, CopyRequest)]
+    assert len(copy_requests) == 1
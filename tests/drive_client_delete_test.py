@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+from mycloud.drive import DriveClient, DriveFailedToDeleteException
+from mycloud.mycloudapi.requests.drive import DeleteObjectRequest
+
+
+def _populate(fake_drive):
+    for index in range(20):
+        fake_drive.objects[f'/Drive/backup/old/{index:08d}.partial'] = b'x'
+    fake_drive.objects['/Drive/backup/old/nested/deeper/a.bin'] = b'a'
+    fake_drive.objects['/Drive/backup/b.bin'] = b'b'
+    fake_drive._add_directory('/Drive/backup/old/nested/deeper/')
+    fake_drive._add_directory('/Drive/backup/empty/')
+    fake_drive._add_directory('/Drive/keep/')
+
+
+def test_delete_removes_tree_bottom_up(fake_drive):
+    _populate(fake_drive)
+    asyncio.run(DriveClient().delete('/backup'))
+    assert fake_drive.objects == {}
+    assert fake_drive.directories == {'/Drive/', '/Drive/keep/'}
+    # only the first attempt on the root fails, every directory is empty
+    # by the time it is deleted
+    directory_deletes = [request for request in fake_drive.requests
+                         if isinstance(request, DeleteObjectRequest)
+                         and request.object_resource.endswith('/')]
+    assert len(directory_deletes) == 6
+
+
+def test_delete_reports_failures_and_skips_blocked_parents(fake_drive):
+    _populate(fake_drive)
+    fake_drive.undeletable.add('/Drive/backup/old/nested/deeper/a.bin')
+
+    with pytest.raises(DriveFailedToDeleteException):
+        asyncio.run(DriveClient().delete('/backup'))
+    assert set(fake_drive.objects) == {'/Drive/backup/old/nested/deeper/a.bin'}
+    assert '/Drive/backup/empty/' not in fake_drive.directories
+    # parents of the failed file are given up without a retry
+    assert [request for request in fake_drive.requests
+            if isinstance(request, DeleteObjectRequest)
+            and request.object_resource == '/Drive/backup/old/'] == []
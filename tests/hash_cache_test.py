@@ -0,0 +1,48 @@
+import hashlib
+import os
+
+from mycloud.common import sha256_file
+from mycloud.common.hash_cache import HashCache
+from mycloud.constants import CHUNK_SIZE
+
+
+def test_hash_cache_returns_digest_for_unchanged_file(tmp_path):
+    local_file = tmp_path / 'file.bin'
+    local_file.write_bytes(b'content')
+    stats = os.stat(local_file)
+
+    cache = HashCache(str(tmp_path / 'hashes.sqlite'))
+    cache.put(str(local_file), stats, 'digest')
+    cache.close()
+
+    reopened = HashCache(str(tmp_path / 'hashes.sqlite'))
+    assert reopened.get(str(local_file), stats) == 'digest'
+
+
+def test_hash_cache_misses_for_modified_file(tmp_path):
+    local_file = tmp_path / 'file.bin'
+    local_file.write_bytes(b'content')
+    cache = HashCache(str(tmp_path / 'hashes.sqlite'))
+    cache.put(str(local_file), os.stat(local_file), 'digest')
+
+    local_file.write_bytes(b'modified content')
+    assert cache.get(str(local_file), os.stat(local_file)) is None
+
+
+def test_hash_cache_evicts_entries_not_used_recently(tmp_path):
+    local_file = tmp_path / 'file.bin'
+    local_file.write_bytes(b'content')
+    stats = os.stat(local_file)
+    cache = HashCache(str(tmp_path / 'hashes.sqlite'), max_age=-1)
+    cache.put(str(local_file), stats, 'digest')
+    cache.close()
+
+    assert HashCache(str(tmp_path / 'hashes.sqlite'),
+                     max_age=-1).get(str(local_file), stats) is None
+
+
+def test_sha256_file_hashes_past_zero_blocks(tmp_path):
+    local_file = tmp_path / 'file.bin'
+    content = bytes(CHUNK_SIZE) + b'content'
+    local_file.write_bytes(content)
+    assert sha256_file(str(local_file)) == hashlib.sha256(content).hexdigest()
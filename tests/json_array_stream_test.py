@@ -0,0 +1,30 @@
+import asyncio
+import json
+
+import pytest
+
+from mycloud.mycloudapi.helper import iterate_json_array
+
+
+def _parse(payload: bytes, chunk_size: int):
+    async def chunks():
+        for index in range(0, len(payload), chunk_size):
+            yield payload[index:index + chunk_size]
+
+    async def collect():
+        return [item async for item in iterate_json_array(chunks())]
+    return asyncio.run(collect())
+
+
+def test_items_are_parsed_across_chunk_boundaries():
+    items = [{'Path': '/Drive/ä/{}'.format(index), 'Length': index * 1000}
+             for index in range(50)] + [12345, 'text', None]
+    payload = json.dumps(items, ensure_ascii=False).encode()
+    for chunk_size in (1, 3, 7, len(payload)):
+        assert _parse(payload, chunk_size) == items
+
+
+def test_empty_and_truncated_arrays():
+    assert _parse(b' [ ] ', 2) == []
+    with pytest.raises(ValueError):
+        _parse(b'[{"Path": "/Drive/a"}, {"Pa', 4)
@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from mycloud.drive import DriveNotFoundException
+from mycloud.mycloudapi.requests.drive import MyCloudMetadata
+from mycloud.webdav.metadata_cache import MetadataCache
+
+
+class _Drive:
+
+    def __init__(self):
+        self.listed = []
+        self.missing = set()
+
+    async def ls(self, path: str):
+        self.listed.append(path)
+        if path in self.missing:
+            raise DriveNotFoundException
+        return MyCloudMetadata([], [], datetime.min, datetime.min, str(len(self.listed)), path)
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    yield loop
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def test_entries_are_served_from_cache_and_evicted_least_recently_used(loop):
+    drive = _Drive()
+    cache = MetadataCache(drive.ls, loop, max_entries=2)
+    cache.get('/a')
+    cache.get('/b')
+    cache.get('/a')
+    cache.get('/c')
+    cache.get('/b')
+    assert drive.listed == ['/a', '/b', '/c', '/b']
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 4, 2)
+
+
+def test_stale_entries_are_served_while_revalidating(loop):
+    drive = _Drive()
+    cache = MetadataCache(drive.ls, loop, ttl=0, stale_ttl=60)
+    first = cache.get('/a')
+    time.sleep(0.01)
+    assert cache.get('/a') is first
+
+    deadline = time.monotonic() + 5
+    while len(drive.listed) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    assert cache.get('/a') is not first
+    assert cache.stale_hits == 2
+
+
+def test_missing_directories_are_cached_until_invalidated(loop):
+    drive = _Drive()
+    drive.missing.add('/a')
+    cache = MetadataCache(drive.ls, loop)
+    for _ in range(2):
+        with pytest.raises(DriveNotFoundException):
+            cache.get('/a')
+    assert drive.listed == ['/a']
+
+    drive.missing.clear()
+    cache.invalidate('/', recursive=True)
+    assert cache.get('/a').path == '/a'
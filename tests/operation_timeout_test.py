@@ -0,0 +1,18 @@
+import threading
+
+import pytest
+
+from mycloud.common import TimeoutException
+from mycloud.common.operation_timeout import _operation_timeout
+from mycloud.constants import IO_WORKER_COUNT
+
+
+def test_stuck_operations_dont_block_later_ones():
+    unblock = threading.Event()
+    try:
+        for _ in range(IO_WORKER_COUNT + 1):
+            with pytest.raises(TimeoutException):
+                _operation_timeout(lambda values: unblock.wait(), 0.01, {})
+        assert _operation_timeout(lambda values: values['value'], 5, {'value': 42}) == 42
+    finally:
+        unblock.set()
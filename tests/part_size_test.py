@@ -0,0 +1,22 @@
+from mycloud.constants import (CHUNK_SIZE, MIN_PART_SIZE,
+                               MY_CLOUD_BIG_FILE_CHUNK_SIZE,
+                               PART_TARGET_DURATION)
+from mycloud.drive.streamapi import BandwidthMeter, choose_part_size
+
+MIB = 1024 * 1024
+
+
+def test_part_size_spreads_files_over_part_jobs():
+    assert choose_part_size(0) == MIN_PART_SIZE
+    assert choose_part_size(400 * MIB, part_concurrency=4) == 100 * MIB
+    assert choose_part_size(100 * 1024 * MIB) == MY_CLOUD_BIG_FILE_CHUNK_SIZE
+    assert choose_part_size(401 * MIB, part_concurrency=4) % CHUNK_SIZE == 0
+
+
+def test_part_size_is_bounded_by_measured_bandwidth():
+    meter = BandwidthMeter()
+    meter.record(10 * MIB, 10)
+    meter.record(0, 1)
+    assert meter.bytes_per_second == MIB
+    part_size = choose_part_size(100 * 1024 * MIB, meter.bytes_per_second)
+    assert part_size == PART_TARGET_DURATION * MIB
@@ -0,0 +1,42 @@
+import asyncio
+import io
+import os
+import threading
+
+import pytest
+
+from mycloud.drive.drive_client import RangedReadStream
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    yield loop
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+@pytest.mark.parametrize('honour_ranges', [True, False])
+def test_ranges_map_onto_segments(fake_drive, loop, honour_ranges):
+    first, second = os.urandom(100), os.urandom(50)
+    fake_drive.objects.update({'/Drive/a/0': first, '/Drive/a/1': second})
+    fake_drive.honour_ranges = honour_ranges
+    # bodies arrive in short reads
+    fake_drive.network_chunk_size = 7
+
+    async def open_stream():
+        return RangedReadStream(fake_drive, [('/a/0', 100), ('/a/1', 50)])
+    stream = asyncio.run_coroutine_threadsafe(open_stream(), loop).result()
+
+    stream.seek(90)
+    assert stream.read(20) == (first + second)[90:110]
+    assert stream.read() == second[10:]
+    assert stream.read(10) == b''
+    assert [request.byte_range for request in fake_drive.requests] == [(90, 99), (0, 49)]
+
+    stream.seek(-5, io.SEEK_END)
+    assert stream.read() == second[-5:]
+    stream.close()
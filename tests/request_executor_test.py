@@ -0,0 +1,32 @@
+import asyncio
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from mycloud.mycloudapi import MyCloudRequestExecutor
+from mycloud.mycloudapi.requests.drive import PutObjectRequest
+
+
+def test_put_streams_generator_body():
+    received = []
+
+    async def handle(request):
+        received.append(await request.read())
+        return web.Response(status=201)
+
+    async def run():
+        app = web.Application()
+        app.router.add_put('/upload', handle)
+        async with TestServer(app) as server:
+            async with aiohttp.ClientSession() as session:
+                def body():
+                    yield b'first '
+                    yield b'second'
+                request = PutObjectRequest('/file.bin', body)
+                response = await MyCloudRequestExecutor._execute_put(
+                    session, request, str(server.make_url('/upload')), {})
+                return response.status
+
+    assert asyncio.run(run()) == 201
+    assert received == [b'first second']
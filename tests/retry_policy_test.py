@@ -0,0 +1,86 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from mycloud.mycloudapi import MyCloudRequestExecutor, RetryBudget, RetryPolicy
+from mycloud.mycloudapi.auth import AuthMode
+from mycloud.mycloudapi.requests.drive import GetObjectRequest, PutObjectRequest
+
+
+class _Authenticator:
+    auth_mode = AuthMode.Password
+
+    async def get_token(self):
+        return 'token'
+
+    def invalidate_token(self):
+        pass
+
+
+class _Response:
+
+    def __init__(self, status: int, headers: dict = None):
+        self.status = status
+        self.headers = headers or {}
+
+    def release(self):
+        pass
+
+
+class _ScriptedExecutor(MyCloudRequestExecutor):
+
+    def __init__(self, outcomes, retry_policy: RetryPolicy):
+        super().__init__(_Authenticator(), retry_policy=retry_policy)
+        self.outcomes = list(outcomes)
+        self.bodies = []
+
+    async def _send(self, request):
+        generator = request.get_data_generator()
+        if generator is not None:
+            self.bodies.append(b''.join(generator))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def _policy(**kwargs):
+    return RetryPolicy(base_delay=0, jitter=lambda: 1, **kwargs)
+
+
+def test_delay_grows_exponentially_and_honours_retry_after():
+    policy = RetryPolicy(base_delay=1, max_delay=10, jitter=lambda: 1)
+    assert [policy.get_delay(attempt) for attempt in range(5)] == [1, 2, 4, 8, 10]
+    assert policy.get_delay(0, retry_after=5) == 5
+    assert policy.get_delay(0, retry_after=600) == 10
+    assert RetryPolicy.parse_retry_after('7') == 7
+    assert RetryPolicy.parse_retry_after('Thu, 01 Jan 1970 00:00:00 GMT') == 0
+    assert RetryPolicy.parse_retry_after('soon') is None
+
+
+def test_throttled_request_is_retried_with_a_rewound_body():
+    executor = _ScriptedExecutor(
+        [_Response(429, {'Retry-After': '0'}), aiohttp.ClientConnectionError(), _Response(201)],
+        _policy())
+    request = PutObjectRequest('/file.bin', lambda: iter([b'da', b'ta']))
+    response = asyncio.run(executor.execute(request))
+    assert response.result.status == 201
+    assert executor.bodies == [b'data'] * 3
+
+
+def test_retries_are_bounded_by_attempts_budget_and_body():
+    executor = _ScriptedExecutor([_Response(503)] * 3, _policy(retries=2))
+    response = asyncio.run(executor.execute(GetObjectRequest('/file.bin')))
+    assert response.result.status == 503
+    assert executor.outcomes == []
+
+    budget = RetryBudget(size=1)
+    executor = _ScriptedExecutor([_Response(503)] * 3, _policy(budget=budget))
+    asyncio.run(executor.execute(GetObjectRequest('/file.bin')))
+    assert len(executor.outcomes) == 1
+
+    executor = _ScriptedExecutor([aiohttp.ClientConnectionError()], _policy())
+    with pytest.raises(aiohttp.ClientConnectionError):
+        asyncio.run(executor.execute(
+            PutObjectRequest('/file.bin', iter([b'data']))))
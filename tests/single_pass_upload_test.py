@@ -0,0 +1,125 @@
+import asyncio
+import hashlib
+import importlib
+import os
+import tempfile
+
+import pytest
+
+from mycloud.common import BytePipe, set_hash_cache
+from mycloud.common.hash_cache import HashCache
+from mycloud.constants import STAGING_VERSION_PREFIX
+from mycloud.drive.filesync import UploadManifest, upsync_file
+from mycloud.drive.filesync.progress import ProgressTracker
+from mycloud.drive.filesystem import BasicRemotePath, FileManager, FileMetadata
+from mycloud.drive.streamapi import HashingUpStream, ProgressReporter
+from mycloud.mycloudapi import ObjectResourceBuilder
+from mycloud.mycloudapi.requests.drive import PutObjectRequest, RenameRequest
+
+
+def _write_single_pass(drive, data: bytes):
+    file_manager = FileManager(drive, [], ProgressReporter())
+    with tempfile.NamedTemporaryFile() as local:
+        local.write(data)
+        local.flush()
+        upstream = HashingUpStream(open(local.name, 'rb'))
+        return asyncio.run(file_manager.write_file_single_pass(
+            upstream, BasicRemotePath('/file.bin')))
+
+
+def test_single_pass_upload_commits_hashed_version(fake_drive):
+    data = os.urandom(10000)
+    committed = _write_single_pass(fake_drive, data)
+    digested = hashlib.sha256(data).hexdigest()
+    assert committed.get_identifier() == digested[:10]
+
+    metadata = FileMetadata.from_json(
+        fake_drive.objects['/Drive/file.bin/mycloud_metadata.json'].decode())
+    version = metadata.get_version(digested[:10])
+    assert version.get_property('hash') == digested
+    assert b''.join(fake_drive.objects['/Drive' + part]
+                    for part in version.get_parts()) == data
+    assert not any(STAGING_VERSION_PREFIX in key for key in fake_drive.objects)
+
+
+def test_single_pass_upload_keeps_existing_version(fake_drive):
+    data = os.urandom(100)
+    committed = _write_single_pass(fake_drive, data)
+    metadata = fake_drive.objects['/Drive/file.bin/mycloud_metadata.json']
+    again = _write_single_pass(fake_drive, data)
+    assert again.get_identifier() == committed.get_identifier()
+    assert again.get_parts() == committed.get_parts()
+    assert fake_drive.objects['/Drive/file.bin/mycloud_metadata.json'] == metadata
+    assert sum(isinstance(request, RenameRequest) for request in fake_drive.requests) == 1
+    assert not any(STAGING_VERSION_PREFIX in key for key in fake_drive.objects)
+
+
+class _FailingUpStream(HashingUpStream):
+
+    def read(self, length: int):
+        if self.bytes_read >= 4096:
+            raise OSError('Disk went away')
+        return super().read(length)
+
+
+def test_failed_single_pass_upload_removes_staged_parts(fake_drive, tmp_path):
+    local_file = tmp_path / 'file.bin'
+    local_file.write_bytes(os.urandom(10000))
+    file_manager = FileManager(fake_drive, [], ProgressReporter(), 1)
+    with open(local_file, 'rb') as stream:
+        with pytest.raises(Exception):
+            asyncio.run(file_manager.write_file_single_pass(
+                _FailingUpStream(stream), BasicRemotePath('/file.bin'), part_size=4096))
+    assert any(isinstance(request, PutObjectRequest) for request in fake_drive.requests)
+    assert not any(STAGING_VERSION_PREFIX in key for key in fake_drive.objects)
+    assert not any(STAGING_VERSION_PREFIX in key for key in fake_drive.directories)
+
+
+def test_single_pass_upload_awaits_pipe_on_the_loop(fake_drive):
+    data = os.urandom(10000)
+    file_manager = FileManager(fake_drive, [], ProgressReporter())
+
+    async def write():
+        pipe = BytePipe(1024)
+
+        async def feed():
+            # runs on the same loop, a blocking read would never see it
+            for offset in range(0, len(data), 1000):
+                await pipe.put_async(data[offset:offset + 1000])
+            pipe.close()
+
+        feeding = asyncio.ensure_future(feed())
+        version = await file_manager.write_file_single_pass(
+            HashingUpStream(pipe), BasicRemotePath('/file.bin'), part_size=4096)
+        await feeding
+        return version
+
+    version = asyncio.run(write())
+    assert version.get_property('hash') == hashlib.sha256(data).hexdigest()
+    assert version.get_property('size') == len(data)
+    assert b''.join(fake_drive.objects['/Drive' + part]
+                    for part in version.get_parts()) == data
+
+
+def test_single_pass_upsync_skips_version_uploaded_elsewhere(fake_drive, tmp_path, monkeypatch):
+    local_file = tmp_path / 'local' / 'file.bin'
+    local_file.parent.mkdir()
+    local_file.write_bytes(os.urandom(10000))
+    resource_builder = ObjectResourceBuilder(str(local_file.parent), '/backup')
+
+    def upsync(manifest=None):
+        asyncio.run(upsync_file(fake_drive, resource_builder, str(local_file),
+                                ProgressTracker(), single_pass=True, manifest=manifest))
+    upsync()
+
+    # e.g. another machine, which hasn't hashed the file yet
+    set_hash_cache(HashCache(str(tmp_path / 'other.sqlite')))
+    monkeypatch.setattr(importlib.import_module(
+        'mycloud.common.sha256_file'), 'CACHED_HASHES', {})
+    manifest = UploadManifest(str(tmp_path / 'manifest.sqlite'))
+    fake_drive.requests.clear()
+    upsync(manifest)
+    assert not any(isinstance(request, PutObjectRequest) for request in fake_drive.requests)
+    remote_file = resource_builder.build_remote_file(str(local_file))
+    assert manifest.get(remote_file).version == \
+        hashlib.sha256(local_file.read_bytes()).hexdigest()[:10]
@@ -0,0 +1,55 @@
+import asyncio
+from datetime import datetime
+
+from mycloud.drive import TreeWalker
+from mycloud.mycloudapi.requests.drive import (DirEntry, FileEntry,
+                                               MyCloudMetadata)
+
+TREE = {
+    '/root/': (['/root/a/', '/root/b/'], ['/root/file']),
+    '/root/a/': (['/root/a/deep/'], ['/root/a/one', '/root/a/two']),
+    '/root/a/deep/': ([], ['/root/a/deep/three']),
+    '/root/b/': ([], ['/root/b/four']),
+}
+
+
+def _metadata(path: str):
+    dirs, files = TREE[path]
+    return MyCloudMetadata(
+        dirs=[DirEntry(datetime.min, datetime.min, d, d) for d in dirs],
+        files=[FileEntry(datetime.min, '', '', 1, '', datetime.min, f, f)
+               for f in files],
+        modification_time=datetime.min, creation_time=datetime.min,
+        name=path, path=path)
+
+
+def _walk(**kwargs):
+    running = 0
+    most_running = 0
+
+    async def lister(path: str):
+        nonlocal running, most_running
+        running += 1
+        most_running = max(most_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return _metadata(path) if path in TREE else None
+
+    async def collect():
+        return [item.path async for item in TreeWalker(lister, **kwargs).walk('/root/')]
+    return asyncio.run(collect()), most_running
+
+
+def test_walker_lists_whole_tree_with_bounded_parallelism():
+    paths, most_running = _walk(jobs=2)
+    assert sorted(paths) == sorted(
+        [path for dirs, files in TREE.values() for path in dirs + files])
+    assert most_running == 2
+
+
+def test_walker_honours_depth_and_prefix():
+    paths, _ = _walk(max_depth=0)
+    assert sorted(paths) == ['/root/a/', '/root/b/', '/root/file']
+
+    paths, _ = _walk(prefix='/root/a/deep')
+    assert sorted(paths) == ['/root/a/deep/', '/root/a/deep/three']
@@ -0,0 +1,51 @@
+import asyncio
+import os
+import tempfile
+
+from mycloud.drive.filesystem import BasicRemotePath, BasicStringVersion
+from mycloud.drive.filesystem.versioned_stream_accessor import \
+    VersionedCloudStreamAccessor
+from mycloud.drive.streamapi import DefaultUpStream, UpStreamExecutor
+from mycloud.drive.streamapi import up
+from mycloud.drive.streamapi.transforms import AES256CryptoTransform
+
+
+def _upload(drive, data: bytes, part_concurrency: int, monkeypatch):
+    monkeypatch.setattr(up, 'CHUNK_SIZE', 1024)
+    with tempfile.NamedTemporaryFile() as local:
+        local.write(data)
+        local.flush()
+        accessor = VersionedCloudStreamAccessor(
+            BasicRemotePath('/file.bin'), BasicStringVersion('v'),
+            DefaultUpStream(open(local.name, 'rb')))
+        accessor.add_transform(AES256CryptoTransform('test'))
+        asyncio.run(UpStreamExecutor(
+            drive, part_concurrency=part_concurrency, part_size=4096).upload_stream(accessor))
+    return drive.objects, accessor.get_accessed_file_parts()
+
+
+def test_concurrent_parts_are_recorded_in_order(fake_drive, monkeypatch):
+    data = os.urandom(4096 * 3 + 100)
+    uploaded, parts = _upload(fake_drive, data, 3, monkeypatch)
+    assert parts == sorted(parts)
+    assert len(parts) == 4
+
+    transform = AES256CryptoTransform('test')
+    restored = b''
+    for part in parts:
+        transform.reset_state()
+        restored += transform.down_transform(
+            uploaded['/Drive' + part], last=True)
+    assert restored == data
+
+
+def test_sequential_parts_have_exact_part_size(fake_drive, monkeypatch):
+    data = os.urandom(4096 * 2 + 1)
+    uploaded, parts = _upload(fake_drive, data, 1, monkeypatch)
+    transform = AES256CryptoTransform('test')
+    lengths = []
+    for part in parts:
+        transform.reset_state()
+        lengths.append(len(transform.down_transform(
+            uploaded['/Drive' + part], last=True)))
+    assert lengths == [4096, 4096, 1]
@@ -0,0 +1,73 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+from mycloud.drive.filesync import UploadJournal, downsync_file, upsync_file
+from mycloud.drive.filesync.progress import ProgressTracker
+from mycloud.drive.filesystem import BasicRemotePath
+from mycloud.mycloudapi import ObjectResourceBuilder
+from mycloud.mycloudapi.requests.drive import PutObjectRequest
+
+PART_SIZE = 4096
+
+
+def _upsync(fake_drive, local_file, journal, part_size=PART_SIZE, password=None, cipher='cbc'):
+    resource_builder = ObjectResourceBuilder(str(local_file.parent), '/backup')
+    asyncio.run(upsync_file(fake_drive, resource_builder, str(local_file),
+                            ProgressTracker(), password, part_jobs=1, journal=journal,
+                            part_size=part_size, cipher=cipher))
+
+
+def _part_puts(fake_drive, index: int):
+    return [request for request in fake_drive.requests
+            if isinstance(request, PutObjectRequest)
+            and request.object_resource.endswith(f'{index:08d}.partial')]
+
+
+def test_interrupted_upload_resumes_after_last_verified_part(fake_drive, tmp_path):
+    local_file = tmp_path / 'local' / 'file.bin'
+    local_file.parent.mkdir()
+    data = os.urandom(PART_SIZE * 3 + 10)
+    local_file.write_bytes(data)
+    journal = UploadJournal(str(tmp_path / 'journal.sqlite'))
+
+    version = hashlib.sha256(data).hexdigest()[:10]
+    part_file = f'/Drive/backup/file.bin/{version}/{{:08d}}.partial'.format
+    fake_drive.unwritable.add(part_file(2))
+    with pytest.raises(ValueError):
+        _upsync(fake_drive, local_file, journal)
+    assert [part.index for part in journal.get_parts('/backup/file.bin', version)] == [0, 1]
+
+    # the second part was cut off, it is the only one uploaded again
+    fake_drive.unwritable.clear()
+    fake_drive.objects[part_file(1)] = fake_drive.objects[part_file(1)][:100]
+    # the resumed upload keeps the part size it was started with
+    _upsync(fake_drive, local_file, journal, part_size=PART_SIZE * 2)
+    assert len(_part_puts(fake_drive, 0)) == 1
+    assert len(_part_puts(fake_drive, 1)) == 2
+    assert b''.join(fake_drive.objects[part_file(index)]
+                    for index in range(4)) == data
+    assert journal.get_parts('/backup/file.bin', version) == []
+
+
+@pytest.mark.parametrize('password, cipher', [(None, 'cbc'), ('secret', 'cbc'), ('secret', 'gcm')])
+def test_unjournaled_resume_keeps_the_size_of_the_listed_parts(fake_drive, tmp_path, password, cipher):
+    local_file = tmp_path / 'local' / 'file.bin'
+    local_file.parent.mkdir()
+    data = os.urandom(PART_SIZE * 5 + 10)
+    local_file.write_bytes(data)
+
+    version = hashlib.sha256(data).hexdigest()[:10]
+    fake_drive.unwritable.add(f'/Drive/backup/file.bin/{version}/00000003.partial')
+    with pytest.raises(ValueError):
+        _upsync(fake_drive, local_file, None, PART_SIZE, password, cipher)
+    fake_drive.unwritable.clear()
+    _upsync(fake_drive, local_file, None, PART_SIZE * 2, password, cipher)
+    assert len(_part_puts(fake_drive, 0)) == 1
+
+    restored = tmp_path / 'restored' / 'file.bin'
+    asyncio.run(downsync_file(fake_drive, ObjectResourceBuilder(str(restored.parent), '/backup'),
+                              BasicRemotePath('/backup/file.bin'), ProgressTracker(), password))
+    assert restored.read_bytes() == data
@@ -0,0 +1,52 @@
+import asyncio
+import os
+
+from mycloud.drive.filesync import UploadManifest, upsync_file
+from mycloud.drive.filesync.progress import ProgressTracker
+from mycloud.drive.filesystem import FileMetadata, Version
+from mycloud.mycloudapi import ObjectResourceBuilder
+from mycloud.mycloudapi.requests.drive import PutObjectRequest
+
+
+def _prepare(tmp_path, revalidate_after: float):
+    local_file = tmp_path / 'local' / 'file.bin'
+    local_file.parent.mkdir()
+    local_file.write_bytes(b'content')
+    resource_builder = ObjectResourceBuilder(str(local_file.parent), '/backup')
+    remote_file = resource_builder.build_remote_file(str(local_file))
+    manifest = UploadManifest(
+        str(tmp_path / 'manifest.sqlite'), revalidate_after)
+    manifest.put(remote_file, str(local_file), os.stat(local_file), 'version', [])
+    return local_file, resource_builder, remote_file, manifest
+
+
+def _upsync(executor, resource_builder, local_file, manifest, encryption_pwd=None):
+    asyncio.run(upsync_file(executor, resource_builder, str(local_file),
+                            ProgressTracker(), encryption_pwd, manifest=manifest))
+
+
+def test_unchanged_file_is_skipped_without_requests(fake_drive, tmp_path):
+    local_file, resource_builder, _, manifest = _prepare(tmp_path, 60)
+    _upsync(fake_drive, resource_builder, local_file, manifest)
+    assert fake_drive.requests == []
+
+
+def test_stale_entry_is_revalidated_against_remote_metadata(fake_drive, tmp_path):
+    local_file, resource_builder, remote_file, manifest = _prepare(
+        tmp_path, -1)
+    metadata = FileMetadata()
+    metadata.update_version(Version('version', remote_file))
+    fake_drive.objects['/Drive' + remote_file + '/mycloud_metadata.json'] = \
+        FileMetadata.to_json(metadata).encode()
+    verified_at = manifest.get(remote_file).verified_at
+
+    _upsync(fake_drive, resource_builder, local_file, manifest)
+    assert len(fake_drive.requests) == 1
+    assert manifest.get(remote_file).verified_at > verified_at
+
+
+def test_file_is_uploaded_again_with_another_cipher(fake_drive, tmp_path):
+    local_file, resource_builder, remote_file, manifest = _prepare(tmp_path, 60)
+    _upsync(fake_drive, resource_builder, local_file, manifest, 'secret')
+    assert any(isinstance(request, PutObjectRequest) for request in fake_drive.requests)
+    assert manifest.get(remote_file).transforms == ['aes256_transform']
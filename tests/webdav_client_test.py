@@ -0,0 +1,33 @@
+import pytest
+
+from mycloud.drive.filesystem import FileMetadata, Version
+from mycloud.webdav.client import MyCloudDavClient
+
+
+@pytest.fixture
+def dav_client(fake_drive):
+    client = MyCloudDavClient()
+    yield client
+    client.close()
+
+
+def test_versioned_read_uses_listed_part_lengths(fake_drive, dav_client):
+    # unencrypted parts of older uploads are longer than the chunk size
+    parts = [b'a' * 30, b'b' * 30, b'c' * 5]
+    part_files = ['/file.bin/0123456789/{:08d}.partial'.format(index)
+                  for index in range(len(parts))]
+    for part_file, data in zip(part_files, parts):
+        fake_drive.objects['/Drive' + part_file] = data
+    fake_drive._add_directory('/Drive/file.bin/0123456789/')
+    # no size property is recorded
+    version = Version('0123456789', '/file.bin')
+    version.add_property('chunk_size', 20)
+    for part_file in part_files:
+        version.add_part_file(part_file)
+    metadata = FileMetadata()
+    metadata.update_version(version)
+    fake_drive.objects['/Drive/file.bin/mycloud_metadata.json'] = \
+        FileMetadata.to_json(metadata).encode()
+
+    stream = dav_client.open_read_versioned('/file.bin')
+    assert stream.read() == b''.join(parts)